@@ -0,0 +1,89 @@
+"""
+Synthetic inputs for the benchmarks, so that they run without S3 or the Hugging Face Hub.
+"""
+import os
+import numpy as np
+
+LAT_RANGE = (41.1280, 42.5680)
+LON_RANGE = (-88.7176, -87.2873)
+LIDAR_LAT = 41.70101404798476
+LIDAR_LON = -87.99577278662817
+
+
+def lake_breeze_reflectivity(sweep, azimuths, ranges):
+    """
+    Clear air noise with a thin line of about 20 dBZ, 30 km from the radar, north of it.
+    """
+    rng = np.random.default_rng(sweep)
+    data = rng.normal(-10., 5., (len(azimuths), len(ranges)))
+    line = np.abs(ranges[np.newaxis] - 30000. - 50. * (azimuths[:, np.newaxis] - 45.)) < 2000.
+    data[line & (azimuths[:, np.newaxis] < 90.)] = 20.
+    return data
+
+
+def write_radar_files(directory, n_files, elevations=(0.5,)):
+    """
+    Write Level II volumes five minutes apart and return their paths.
+    """
+    from adam.testing import make_level2_volume
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(directory, f'KLOT20250715_18{5 * i:02d}00_V06')
+        with open(path, 'wb') as f:
+            f.write(make_level2_volume(start_time=f'2025-07-15T18:{5 * i:02d}:00', elevations=elevations,
+                                       reflectivity=lake_breeze_reflectivity))
+        paths.append(path)
+    return paths
+
+
+def radar_image(n_frames=1, seed=0):
+    """
+    A RadarImage with a random preprocessed image and a lake breeze mask in every frame.
+    """
+    import torch
+    import adam
+    from adam.io.get_radar_scan import _latlon_to_xy
+    rad_image = adam.io.RadarImage()
+    rad_image.lat_range = LAT_RANGE
+    rad_image.lon_range = LON_RANGE
+    rad_image.grid_lat = np.linspace(LAT_RANGE[1], LAT_RANGE[0], 256)
+    rad_image.grid_lon = np.linspace(LON_RANGE[0], LON_RANGE[1], 256)
+    rad_image.grid_x, rad_image.grid_y = _latlon_to_xy(
+        rad_image.grid_lat, rad_image.grid_lon, np.mean(LAT_RANGE), np.mean(LON_RANGE))
+    generator = torch.Generator().manual_seed(seed)
+    rad_image.pytorch_image = torch.randn(n_frames, 3, 256, 256, generator=generator)
+    masks = np.zeros((n_frames, 256, 256), dtype=np.int64)
+    for i in range(n_frames):
+        masks[i, 120 + i:150 + i, 60:200] = 1
+    rad_image.lakebreeze_mask = masks if n_frames > 1 else masks[0]
+    rad_image.times = np.datetime64('2025-07-15T18:00:00') + np.arange(n_frames) * np.timedelta64(5, 'm')
+    return rad_image
+
+
+def speckled_masks(n_frames, seed=0):
+    """
+    Masks with a lake breeze and random speckles.
+    """
+    rng = np.random.default_rng(seed)
+    masks = (rng.random((n_frames, 256, 256)) > 0.98).astype(np.int64)
+    masks[:, 120:150, 60:200] = 1
+    return masks
+
+
+def use_random_models():
+    """
+    Make the model functions use the model architectures with random weights instead of
+    downloading the trained weights. The models are built once per process.
+    """
+    import torch
+    from adam.model import predict_lake_breeze
+    models = {}
+
+    def load(model_name, device='cpu'):
+        if (model_name, device) not in models:
+            torch.manual_seed(0)
+            models[(model_name, device)] = predict_lake_breeze._build_model(model_name).eval().to(device)
+        return models[(model_name, device)]
+
+    predict_lake_breeze._load_model = load
+    return load
@@ -0,0 +1,58 @@
+"""
+Benchmarks of the startup cost of ADAM: the time and memory to import each subpackage and
+its main entry point in a fresh interpreter.
+"""
+import json
+import subprocess
+import sys
+
+IMPORTS = [
+    "import adam",
+    "from adam.io import RadarImage",
+    "from adam.io import preprocess_radar_image",
+    "from adam.model import infer_lake_breeze",
+    "from adam.util import azimuth_point",
+    "from adam.triggering import make_scan_file",
+    "from adam.triggering import dispatch_triggers",
+    "from adam.vis import quick_look",
+    "from adam.vis import visualize_lake_breeze",
+    "from adam.realtime import LakeBreezeMonitor",
+]
+
+HEAVY_MODULES = ['torch', 'torchvision', 'pyart', 'cartopy', 'boto3', 'dask', 'matplotlib',
+                 'paramiko', 'xarray', 'scipy']
+
+_PROBE = """
+import json, resource, sys
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+{statement}
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps(dict(rss=(after - before) / 1024.,
+                      heavy=[m for m in {heavy!r} if m in sys.modules])))
+"""
+
+
+def _probe(statement):
+    code = _PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class ImportSuite:
+    """
+    The time, peak memory and heavy dependencies of importing each entry point.
+    """
+    params = IMPORTS
+    param_names = ['statement']
+    timeout = 120
+
+    def timeraw_import(self, statement):
+        return statement
+
+    def track_import_rss(self, statement):
+        return _probe(statement)['rss']
+    track_import_rss.unit = 'MB'
+
+    def track_heavy_modules(self, statement):
+        return len(_probe(statement)['heavy'])
+    track_heavy_modules.unit = 'modules'
@@ -0,0 +1,104 @@
+"""
+Benchmarks of the radar preprocessing.
+"""
+import shutil
+import tempfile
+import time
+
+from ._synthetic import write_radar_files
+
+
+class PreprocessSuite:
+    """
+    Rendering one radar volume into the model input.
+    """
+    # Each call takes a second or more, so only a few samples are taken
+    number = 1
+    repeat = 3
+    timeout = 300
+
+    def setup(self):
+        import pyart
+        self.directory = tempfile.mkdtemp()
+        self.path = write_radar_files(self.directory, 1)[0]
+        self.radar = pyart.io.read(self.path)
+
+    def teardown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def time_preprocess_radar_image(self):
+        from adam.io import preprocess_radar_image
+        preprocess_radar_image(self.radar)
+
+    def time_preprocess_file(self):
+        from adam.io.get_radar_scan import _preprocess
+        from adam.io.sites import get_site
+        site = get_site('KLOT')
+        _preprocess(self.path, site.lat_range, site.lon_range)
+
+    def peakmem_preprocess_radar_image(self):
+        from adam.io import preprocess_radar_image
+        preprocess_radar_image(self.radar)
+
+
+class PreprocessBatchSuite:
+    """
+    Rendering a batch of radar volumes, serially and in parallel.
+    """
+    # Each call takes a second or more, so only a few samples are taken
+    number = 1
+    repeat = 3
+    params = ([False, True], [4, 12])
+    param_names = ['parallel', 'n_files']
+    timeout = 600
+
+    def setup(self, parallel, n_files):
+        self.directory = tempfile.mkdtemp()
+        self.paths = write_radar_files(self.directory, n_files)
+
+    def teardown(self, parallel, n_files):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def time_preprocess_radar_image_batch(self, parallel, n_files):
+        from adam.io import preprocess_radar_image_batch
+        preprocess_radar_image_batch(self.paths, parallel=parallel)
+
+    def peakmem_preprocess_radar_image_batch(self, parallel, n_files):
+        from adam.io import preprocess_radar_image_batch
+        preprocess_radar_image_batch(self.paths, parallel=parallel)
+
+    def track_scans_per_second(self, parallel, n_files):
+        from adam.io import preprocess_radar_image_batch
+        start = time.perf_counter()
+        preprocess_radar_image_batch(self.paths, parallel=parallel)
+        return n_files / (time.perf_counter() - start)
+    track_scans_per_second.unit = 'scans/s'
+
+
+class FetchSuite:
+    """
+    Finding, downloading and rendering a volume from a local stand-in for the NEXRAD bucket, with
+    and without network latency.
+    """
+    number = 1
+    repeat = 3
+    params = [0., 0.05]
+    param_names = ['latency']
+    timeout = 300
+
+    def setup(self, latency):
+        from adam.testing import LocalS3Server, write_synthetic_archive
+        self.directory = tempfile.mkdtemp()
+        write_synthetic_archive(self.directory, n_volumes=12)
+        self.server = LocalS3Server(self.directory, latency=latency).start()
+        self.endpoint = self.server.endpoint()
+        self.endpoint.__enter__()
+
+    def teardown(self, latency):
+        self.endpoint.__exit__(None, None, None)
+        self.server.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def time_fetch_and_preprocess(self, latency):
+        from adam.io import preprocess_radar_image
+        preprocess_radar_image('KLOT', '2025-07-15T18:30:00')
@@ -0,0 +1,195 @@
+"""
+Benchmarks of the lake breeze inference, with random model weights.
+"""
+import time
+
+from ._synthetic import radar_image, use_random_models
+
+MODELS = ['lakebreeze_model_fcn_resnet50_no_augmentation', 'lakebreeze_best_model_fcn_resnet50']
+
+
+class InferenceSuite:
+    """
+    Inference on one scan.
+    """
+    # Each call takes a second or more, so only a few samples are taken
+    number = 1
+    repeat = 3
+    params = MODELS
+    param_names = ['model_name']
+    timeout = 300
+
+    def setup(self, model_name):
+        use_random_models()(model_name)
+        self.rad_image = radar_image(1)
+
+    def time_infer_lake_breeze(self, model_name):
+        from adam.model import infer_lake_breeze
+        infer_lake_breeze(self.rad_image, model_name=model_name)
+
+    def peakmem_infer_lake_breeze(self, model_name):
+        from adam.model import infer_lake_breeze
+        infer_lake_breeze(self.rad_image, model_name=model_name)
+
+
+class InferenceBatchSuite:
+    """
+    Inference on batches of scans.
+    """
+    # Each call takes a second or more, so only a few samples are taken
+    number = 1
+    repeat = 3
+    params = [1, 4, 8]
+    param_names = ['batch_size']
+    timeout = 600
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+
+    def setup(self, batch_size):
+        use_random_models()(self.model_name)
+        self.rad_image = radar_image(batch_size)
+
+    def time_infer_lake_breeze_batch(self, batch_size):
+        from adam.model import infer_lake_breeze_batch
+        infer_lake_breeze_batch(self.rad_image, model_name=self.model_name)
+
+    def peakmem_infer_lake_breeze_batch(self, batch_size):
+        from adam.model import infer_lake_breeze_batch
+        infer_lake_breeze_batch(self.rad_image, model_name=self.model_name)
+
+    def track_scans_per_second(self, batch_size):
+        from adam.model import infer_lake_breeze_batch
+        start = time.perf_counter()
+        infer_lake_breeze_batch(self.rad_image, model_name=self.model_name)
+        return batch_size / (time.perf_counter() - start)
+    track_scans_per_second.unit = 'scans/s'
+
+
+class ImageDtypeSuite:
+    """
+    Inference on a batch of normalized float32 images and of uint8 images normalized in the model.
+    """
+    number = 1
+    repeat = 3
+    params = ['float32', 'uint8']
+    param_names = ['dtype']
+    timeout = 600
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+
+    def setup(self, dtype):
+        import torch
+        use_random_models()(self.model_name)
+        self.rad_image = radar_image(8)
+        if dtype == 'uint8':
+            self.rad_image.pytorch_image = torch.randint(0, 256, (8, 3, 256, 256), dtype=torch.uint8)
+
+    def time_infer_lake_breeze_batch(self, dtype):
+        from adam.model import infer_lake_breeze_batch
+        infer_lake_breeze_batch(self.rad_image, model_name=self.model_name)
+
+    def track_image_bytes(self, dtype):
+        return self.rad_image.pytorch_image.nbytes
+    track_image_bytes.unit = 'bytes'
+
+
+class InferenceCacheSuite:
+    """
+    Repeated inference on scans that are already in the inference cache.
+    """
+    params = [1, 8]
+    param_names = ['batch_size']
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+
+    def setup(self, batch_size):
+        from adam.model import InferenceCache, infer_lake_breeze_batch
+        use_random_models()(self.model_name)
+        self.rad_image = radar_image(batch_size)
+        self.rad_image.source = [f"s3://unidata-nexrad-level2/KLOT_{i}" for i in range(batch_size)]
+        self.cache = InferenceCache()
+        infer_lake_breeze_batch(self.rad_image, model_name=self.model_name, cache=self.cache)
+
+    def time_infer_lake_breeze_batch_cached(self, batch_size):
+        from adam.model import infer_lake_breeze_batch
+        infer_lake_breeze_batch(self.rad_image, model_name=self.model_name, cache=self.cache)
+
+
+class ModelServerSuite:
+    """
+    Throughput of concurrent clients that share a model server, against separate processes that
+    each load their own model.
+    """
+    number = 1
+    repeat = 3
+    params = ['server', 'processes']
+    param_names = ['mode']
+    timeout = 600
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+    n_clients = 4
+    n_scans = 2
+
+    def setup(self, mode):
+        import tempfile
+        import torch
+        from adam.model import ModelServer
+        use_random_models()(self.model_name)
+        self.images = torch.randint(0, 256, (self.n_clients, 1, 3, 256, 256), dtype=torch.uint8)
+        self.server = None
+        if mode == 'server':
+            self.tmpdir = tempfile.TemporaryDirectory()
+            self.server = ModelServer(f"{self.tmpdir.name}/model.sock", models=[self.model_name],
+                                      max_wait=0.02).start()
+
+    def teardown(self, mode):
+        if self.server is not None:
+            self.server.stop()
+            self.tmpdir.cleanup()
+
+    def track_scans_per_second(self, mode):
+        if mode == 'server':
+            import threading
+            from adam.model import ModelClient
+            client = ModelClient(self.server.address)
+            times = [None] * self.n_clients
+
+            def run(i):
+                times[i] = _run_client(lambda x: client.infer(x, model_name=self.model_name),
+                                       self.images[i], self.n_scans)
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(self.n_clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            import multiprocessing
+            context = multiprocessing.get_context('fork')
+            queue = context.Queue()
+            barrier = context.Barrier(self.n_clients)
+            processes = [context.Process(target=_own_model_client,
+                                         args=(self.model_name, self.images[i], self.n_scans, barrier, queue))
+                         for i in range(self.n_clients)]
+            for process in processes:
+                process.start()
+            times = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+        start = min(x[0] for x in times)
+        end = max(x[1] for x in times)
+        return self.n_clients * self.n_scans / (end - start)
+    track_scans_per_second.unit = 'scans/s'
+
+
+def _run_client(infer, image, n_scans):
+    start = time.perf_counter()
+    for _ in range(n_scans):
+        infer(image)
+    return start, time.perf_counter()
+
+
+def _own_model_client(model_name, image, n_scans, barrier, queue):
+    # A separate process with its own copy of the model
+    from adam.model import infer_lake_breeze
+    from adam.io import RadarImage
+    use_random_models()(model_name)
+    rad_image = RadarImage()
+    rad_image.pytorch_image = image
+    barrier.wait()
+    queue.put(_run_client(lambda x: infer_lake_breeze(rad_image, model_name=model_name), image, n_scans))
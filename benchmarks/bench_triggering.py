@@ -0,0 +1,49 @@
+"""
+Benchmarks of the lidar scan generation and upload.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+class ScanFileSuite:
+    """
+    Writing CSM scan files of increasing size.
+    """
+    params = [10, 360]
+    param_names = ['n_azimuths']
+
+    def setup(self, n_azimuths):
+        self.directory = tempfile.mkdtemp()
+        self.azimuths = np.linspace(0, 360, n_azimuths, endpoint=False)
+        self.elevations = np.array([1., 3., 5.])
+
+    def teardown(self, n_azimuths):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def time_make_scan_file(self, n_azimuths):
+        from adam.triggering import make_scan_file
+        make_scan_file(self.elevations, self.azimuths, os.path.join(self.directory, 'scan.txt'))
+
+    def time_build_scan(self, n_azimuths):
+        from adam.triggering import build_scan
+        build_scan(self.elevations, self.azimuths)
+
+
+class SendScanSuite:
+    """
+    Uploading a scan to a fake lidar.
+    """
+    def setup(self):
+        from adam.triggering import build_scan
+        from adam.testing import FakeSSHClient
+        self.scan = build_scan([1., 3., 5.], np.linspace(0, 360, 36, endpoint=False))
+        self.client = FakeSSHClient()
+
+    def teardown(self):
+        self.client.close()
+
+    def time_send_scan(self):
+        from adam.triggering import send_scan
+        send_scan(self.scan, 'lidar', 'user', 'password', client=self.client)
@@ -0,0 +1,55 @@
+"""
+Benchmarks of the mask post-processing and instrument steering.
+"""
+from ._synthetic import LIDAR_LAT, LIDAR_LON, radar_image, speckled_masks
+
+
+class SpeckleFilterSuite:
+    """
+    Removing speckles from one mask and from a day of masks.
+    """
+    params = [1, 288]
+    param_names = ['n_frames']
+
+    def setup(self, n_frames):
+        self.masks = speckled_masks(n_frames)
+
+    def time_filter_speckles(self, n_frames):
+        from adam.util import filter_speckles
+        filter_speckles(self.masks.copy() if n_frames > 1 else self.masks[0].copy(), 20)
+
+    def peakmem_filter_speckles(self, n_frames):
+        from adam.util import filter_speckles
+        filter_speckles(self.masks.copy() if n_frames > 1 else self.masks[0].copy(), 20)
+
+
+class AggregateSuite:
+    """
+    Summing a day of masks, over all of them and over a time window.
+    """
+    def setup(self):
+        self.rad_image = radar_image(288)
+
+    def time_aggregate(self):
+        self.rad_image.aggregate()
+
+    def time_aggregate_window(self):
+        self.rad_image.aggregate('2025-07-15T20:00:00', '2025-07-15T22:00:00')
+
+
+class SteeringSuite:
+    """
+    Pointing a lidar at the lake breeze.
+    """
+    def setup(self):
+        self.rad_image = radar_image(1)
+        self.batch = radar_image(48)
+
+    def time_azimuth_point(self):
+        from adam.util import azimuth_point
+        self.rad_image.lakebreeze_mask = self.batch.lakebreeze_mask[0].copy()
+        azimuth_point(LIDAR_LON, LIDAR_LAT, self.rad_image)
+
+    def time_azimuth_point_batch(self):
+        from adam.util import azimuth_point_batch
+        azimuth_point_batch(LIDAR_LON, LIDAR_LAT, self.batch)
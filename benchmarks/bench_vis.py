@@ -0,0 +1,44 @@
+"""
+Benchmarks of the visualization.
+"""
+import shutil
+import tempfile
+
+from ._synthetic import radar_image, write_radar_files
+
+
+class VisualizeSuite:
+    """
+    Drawing the lake breeze over a radar volume, and the quick-look thumbnail.
+    """
+    timeout = 300
+
+    def setup(self):
+        import pyart
+        from adam.vis import QuickLookRenderer
+        self.directory = tempfile.mkdtemp()
+        self.rad_image = radar_image(1)
+        self.rad_image.pyart_object = pyart.io.read(write_radar_files(self.directory, 1)[0])
+        self.renderer = QuickLookRenderer()
+
+    def teardown(self):
+        import matplotlib.pyplot as plt
+        plt.close('all')
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def time_visualize_lake_breeze(self):
+        import matplotlib.pyplot as plt
+        from adam.vis import visualize_lake_breeze
+        fig, ax = visualize_lake_breeze(self.rad_image)
+        plt.close(fig)
+
+    def time_quick_look(self):
+        from adam.vis import quick_look
+        quick_look(self.rad_image)
+
+    def time_quick_look_frame(self):
+        """
+        The thumbnail that the real-time monitor draws after every scan, with a renderer that is
+        reused between scans. The target is under 0.1 s per frame.
+        """
+        self.renderer.to_png(self.rad_image)
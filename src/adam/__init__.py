@@ -3,12 +3,12 @@
 __author__ = """Robert Jackson, Bhupendra Raut, Seongha Park, Troy Arcomano, Scott Collis"""
 __version__ = '0.4.0'
 
+from ._lazy import attach
 
-from . import io  # noqa
-from . import model   # noqa
-from . import vis  # noqa
-from . import util  # noqa
-from . import testing # noqa
-from . import triggering  # noqa
+# The subpackages are imported on first use, so that importing adam does not import
+# torch, Py-ART and cartopy for a script that only needs part of the package.
+__getattr__, __dir__, __all__ = attach(
+    __name__, submodules=['io', 'model', 'vis', 'util', 'testing', 'triggering', 'realtime', 'metrics'],
+    attributes={'metrics': ['profile']})
 
 
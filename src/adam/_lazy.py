@@ -0,0 +1,48 @@
+import importlib
+
+
+def attach(package_name, submodules=(), attributes=None):
+    """
+    Make the subpackages and attributes of a package load on first use with a module level
+    __getattr__ (PEP 562), so that importing the package does not import heavy dependencies
+    that the caller may never need.
+
+    Parameters
+    ----------
+    package_name: str
+        The name of the package, usually __name__.
+    submodules: list of str
+        The submodules to import when they are first accessed as attributes.
+    attributes: dict
+        Maps the name of each submodule to the list of attributes that it provides. These
+        submodules can also be accessed as attributes.
+
+    Returns
+    -------
+    __getattr__, __dir__: functions
+        The module level functions to assign in the package.
+    __all__: list of str
+        The public names of the package.
+    """
+    attr_to_module = {attr: module for module, attrs in (attributes or {}).items() for attr in attrs}
+    names = sorted(set(submodules) | set(attr_to_module))
+    submodules = set(submodules) | set(attributes or {})
+
+    def __getattr__(name):
+        package = importlib.import_module(package_name)
+        if name in attr_to_module:
+            module = importlib.import_module(f"{package_name}.{attr_to_module[name]}")
+            value = getattr(module, name)
+        elif name in submodules:
+            value = importlib.import_module(f"{package_name}.{name}")
+        else:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        # Cache the value so that __getattr__ is only called once per name. This also replaces a
+        # submodule that has the same name as the attribute it provides.
+        setattr(package, name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(package_name))) | set(names))
+
+    return __getattr__, __dir__, names
@@ -11,6 +11,28 @@ This module handles the preprocessing of radar data.
     :toctree: generated/
 
     RadarImage
+    RadarSite
+    RADAR_SITES
+    get_site
+    register_site
     preprocess_radar_image
+    preprocess_radar_image_batch
+    preprocess_radar_sites
+    source_key
+    RENDERER_VERSION
+    NexradChunkSource
+    Sweep0Assembler
+    read_nexrad_sweep0
 """
-from .get_radar_scan import RadarImage, preprocess_radar_image, preprocess_radar_image_batch
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, attributes={
+    'radar_image': ['RadarImage'],
+    'get_radar_scan': ['preprocess_radar_image', 'preprocess_radar_image_batch', 'preprocess_radar_sites',
+                       'RENDERER_VERSION'],
+    'sources': ['source_key'],
+    'sites': ['RadarSite', 'RADAR_SITES', 'get_site', 'register_site'],
+    'nexrad_chunks': ['NexradChunkSource'],
+    'level2': ['Sweep0Assembler'],
+    'range_reader': ['read_nexrad_sweep0'],
+})
@@ -1,4 +1,6 @@
+import io
 import boto3
+import fsspec
 import pyart
 import numpy as np
 import cmweather
@@ -8,130 +10,34 @@ import os
 import cartopy.crs as ccrs
 import dask.bag as db
 import tempfile
+import threading
 
 from glob import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta 
 from botocore import UNSIGNED
 from torchvision.io import decode_image
 from torchvision import transforms
 from botocore.config import Config
 
-class RadarImage(object):
-    """
-    This class contains the basic data for predicting the lake-breeze front location
-    from radar. It includes parameters for storing the radar data for later analysis
-    in Py-ART and for inference in the lake-breeze prediction model.
-
-    Parameters
-    ----------
-    pyart_object: :py:meth:`pyart.core.Radar` or str
-        The PyART radar object that stores the radar data. This could also be a link
-        to the radar scan file (useful for batch processing to preserve memory).
-    lat_range: 2-tuple
-        The minimum and maximum latitude of the inference domain.
-    lon_range: 2-tuple
-        The minimum and maximum longitude of the inference domain.
-    grid_lat: ndarray
-        The latitude of each point in the inference domain.
-    grid_lon: ndarray
-        The longitude of each point in the inference domain.
-    pytorch_image: :py:meth:`torch.Tensor`
-        The tensor containing the preprocessed radar scan for inference.
-    lakebreeze_mask: 256 x 256 ndarray
-        The inferred lake breeze mask, where 1 = lakebreeze and 0 = not a lake breeze. 
-    times: list of np.datetime64('s')
-        The epoch time of the radar scans.
-    """
-    pyart_object = None
-    lat_range = None
-    lon_range = None
-    grid_lat = None
-    grid_lon = None
-    pytorch_image = None
-    lakebreeze_mask = None
-    aggregated_mask = None
-    times = None
-    
-    def __getitem__(self, key):
-        """
-        Allows for indexing into the RadarImage object to get the lake breeze mask
-        for a specific time.
-        
-        Parameters
-        ----------
-        key: int or np.datetime64('s')
-            The index or time to retrieve the lake breeze mask for.
-
-        Returns
-        -------
-        mask: ndarray
-            The lake breeze mask for the specified time.
-        """
-        if len(self.lakebreeze_mask.shape) == 2:
-            return self.lakebreeze_mask
-        if isinstance(key, int):
-            return self.lakebreeze_mask[key]
-        elif isinstance(key, np.datetime64):
-            return self.aggregate(start_time=key, end_time=key)
-        elif isinstance(key, str):
-            key = np.datetime64(key)
-            return self.aggregate(start_time=key, end_time=key)
-        elif isinstance(key, slice):
-            return self.lakebreeze_mask[key]
-        elif isinstance(key, list) or isinstance(key, np.ndarray):
-            if all(isinstance(x, int) for x in key):
-                return [self.lakebreeze_mask[x] for x in key]
-            elif all(isinstance(x, (str, np.datetime64)) for x in key):
-                masks = []
-                for time in key:
-                    if isinstance(time, str):
-                        time = np.datetime64(time)
-                    masks.append(self.aggregate(start_time=time, end_time=time))
-                return masks
-            else:
-                raise TypeError("All keys in the list must be of the same type: int, str, or np.datetime64('s').")
-        else:
-            raise TypeError("Key must be an int, np.datetime64('s'), str, or slice.")
-        
-    def aggregate(self, start_time=None, end_time=None):
-        """
-        This function aggregates the lake breeze mask over a specified time period.
-        If no time period is specified, it returns the sum of all of the masks.
-
-        Parameters
-        ----------
-        start_time: str or np.datetime64('s')
-            The start time for aggregation.
-        end_time: str np.datetime64('s')
-            The end time for aggregation.
-
-        Returns
-        -------
-        aggregated_mask: RadarImage
-            The aggregated lake breeze mask.
-        """
-        if start_time is None and end_time is None:
-            self.aggregated_mask = np.sum(self.lakebreeze_mask, axis=0)
-            return self.aggregated_mask
-
-        mask = self.lakebreeze_mask.copy()
-        if isinstance(start_time, str):
-            start_time = np.datetime64(start_time)
-        if isinstance(end_time, str):
-            end_time = np.datetime64(end_time)
-        if (start_time is None) ^ (end_time is None):
-            raise ValueError("Both start_time and end_time must be specified for aggregation.")
-        indices = np.where((self.times >= start_time) & (self.times <= end_time))[0]
-        if len(indices) == 0:
-            raise ValueError("No data available for the specified time range.")
-        mask = mask[indices]
-        self.aggregated_mask = np.sum(mask, axis=0)
-        return self.aggregated_mask
+from .sites import RadarSite, get_site
+from .range_reader import read_nexrad_sweep0
+from .radar_image import RadarImage
+from ..metrics import span
 
+_RENDER_LOCK = threading.Lock()
+IMAGE_SHAPE = (3, 256, 256)
+# The version of the rendering in _render_image. Bump it whenever the rendered images change,
+# so that lake breeze masks cached from the old images are not reused.
+RENDERER_VERSION = 1
+# The ImageNet normalization of the rendered 0-255 RGB images that the models were trained on
+IMAGE_MEAN = (0.485, 0.456, 0.406)
+IMAGE_STD = (0.229, 0.224, 0.225)
 
 def preprocess_radar_image(radar, rad_time=None, lat_range=(41.1280, 42.5680),
                            lon_range=(-88.7176, -87.2873),
-                           bucket_name='unidata-nexrad-level2'):
+                           bucket_name='unidata-nexrad-level2', partial_download=False,
+                           dtype='float32'):
     """
     This module will preprocess the NEXRAD radar data for inference into the lake-breeze
     prediction model of ADAM.
@@ -139,10 +45,11 @@ def preprocess_radar_image(radar, rad_time=None, lat_range=(41.1280, 42.5680),
     Parameters
     ----------
     radar: str or :py:meth:`pyart.core.radar` object
-        The 4-letter code for the radar to obtain the scan from. For Chicago, use KLOT.
+        The 4-letter code for the radar to obtain the scan from. For Chicago, use KLOT. This can
+        also be the path or S3 URL of a radar volume.
     rad_time: ISO-format datestring
         The date/time string in YYYY-MM-DDTHH:MM:SS format for the radar scan. If None, then ADAM will
-        get the latest scan. This is not used if radar is a :py:meth:`pyart.core.radar` object or string.
+        get the latest scan. This is not used if radar is a :py:meth:`pyart.core.radar` object or a path.
     lat_range: 2-tuple of floats
         The minimum and maximum latitude of the domain in degrees. Default is a centered
         domain around the KLOT Chicago area radar.
@@ -151,6 +58,14 @@ def preprocess_radar_image(radar, rad_time=None, lat_range=(41.1280, 42.5680),
         domain around the KLOT Chicago area radar.
     bucket_name: str
         The NEXRAD S3 bucket to use. Default is 'unidata-nexrad-level2'.
+    partial_download: bool
+        If True, only download the leading part of the volume that holds the lowest sweep using
+        :py:meth:`adam.io.read_nexrad_sweep0`. The pyart_object of the RadarImage then only
+        contains the lowest sweep.
+    dtype: str or :py:meth:`torch.dtype`
+        'float32' for the normalized image, or 'uint8' to keep the rendered RGB image as bytes,
+        which takes a quarter of the memory. The models normalize uint8 images themselves, so
+        both give the same lake breeze masks.
 
     Returns
     -------
@@ -158,87 +73,30 @@ def preprocess_radar_image(radar, rad_time=None, lat_range=(41.1280, 42.5680),
         The :py:meth:`RadarImage` object containing the radar scan, pre-processed image,
         and grid.
     """
+    dtype = _image_dtype(dtype)
+    source = None
     if isinstance(radar, str):
-        if rad_time is None:
-            right_now = datetime.utcnow()
-        else:
-            right_now = datetime.strptime(rad_time, "%Y-%m-%dT%H:%M:%S")
-        yesterday = right_now - timedelta(days=1)
-        year = right_now.year
-        month = right_now.month
-        day = right_now.day
-
-        s3 = boto3.client('s3', config=Config(signature_version=UNSIGNED))
-        bucket_name = 'unidata-nexrad-level2'
-        radar = "KLOT"
-        prefix = f'{year}/{month:02d}/{day:02d}/{radar}'
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        file_list = [x['Key'] for x in response['Contents']]
-        
-        # Find yesterday's scans
-        prefix = f'{yesterday.year}/{yesterday.month:02d}/{yesterday.day:02d}/{radar}'
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-        file_list = file_list + [x['Key'] for x in response['Contents']]
-        time_list = []
-        for filepath in file_list:
-            name = filepath.split("/")[-1]
-            if name[-3:] == "MDM":
-                time_list.append(
-                    datetime.strptime(name, f"{radar}%Y%m%d_%H%M%S_V06_MDM"))
-            else:
-                time_list.append(
-                    datetime.strptime(name, f"{radar}%Y%m%d_%H%M%S_V06"))
-
-        time_list = np.array(time_list)
-        path = f"s3://{bucket_name}/" + file_list[np.argmin(np.abs(time_list - right_now))]
-        cur_radar = pyart.io.read_nexrad_archive(path)
+        path = radar if _is_volume_path(radar) else _find_nexrad_scan(radar, rad_time, bucket_name)
+        cur_radar = _read_volume(path, partial_download)
+        # Archive volumes never change once written, so their URL identifies them
+        if '://' in path:
+            source = path
     elif isinstance(radar, pyart.core.Radar):
         cur_radar = radar
-    elif isinstance(radar, str):
-        cur_radar = pyart.io.read(str)
     else:
         raise ValueError("The radar input must be a string or a PyART radar object.")
 
-    disp = pyart.graph.RadarMapDisplay(cur_radar)
-    fig, ax = plt.subplots(1, 1, figsize=(2.56, 2.56),
-            subplot_kw=dict(projection=ccrs.PlateCarree(), frameon=False))
-
-    disp.plot_ppi_map('reflectivity', sweep=0, min_lon=lon_range[0],
-            ax=ax, max_lon=lon_range[1], min_lat=lat_range[0], max_lat=lat_range[1],
-            embellish=False, vmin=-20, vmax=60, cmap='HomeyerRainbow',
-            add_grid_lines=False, colorbar_flag=False, title_flag=False)
-    ax.set_axis_off()
-    fig.tight_layout(pad=0, w_pad=0, h_pad=0)
-    with tempfile.NamedTemporaryFile(mode='w+b') as temp_file:
-        fig.savefig(temp_file, dpi=100)
-        plt.close(fig)
-        # Transform image
-        image = decode_image(temp_file.name)
-    image = image[:3, :, :].float()
-    transform = transforms.Compose([
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-        ])
-    image = torch.stack([transform(image)])
-    lats = np.linspace(lat_range[1], lat_range[0], image.shape[3])
-    lons = np.linspace(lon_range[0], lon_range[1], image.shape[2])
-
-    rad_image = RadarImage()
+    image = _render_image(cur_radar, lat_range, lon_range, dtype)
+    rad_image = _grid_radar_image(lat_range, lon_range, image.shape)
     rad_image.pytorch_image = image
-    rad_image.lat_range = lat_range
-    rad_image.lon_range = lon_range
     rad_image.pyart_object = cur_radar
-    rad_image.grid_lat = lats
-    rad_image.grid_lon = lons
-    center_lat = (rad_image.lat_range[0] + rad_image.lat_range[1]) / 2.
-    center_lon = (rad_image.lon_range[0] + rad_image.lon_range[1]) / 2.
-    rad_image.grid_x, rad_image.grid_y = _latlon_to_xy(
-        rad_image.grid_lat, rad_image.grid_lon, center_lat, center_lon)
+    rad_image.source = source
     rad_image.times = [np.datetime64(cur_radar.time["units"].split()[2])]
     
     return rad_image
 
 def preprocess_radar_image_batch(file, lat_range=(41.1280, 42.5680),
-                           lon_range=(-88.7176, -87.2873), parallel=False):
+                           lon_range=(-88.7176, -87.2873), parallel=False, dtype='float32'):
     """
     This module will preprocess the NEXRAD radar data for inference into the lake-breeze
     prediction model of ADAM.
@@ -254,7 +112,11 @@ def preprocess_radar_image_batch(file, lat_range=(41.1280, 42.5680),
         The minimum and maximum longitude of the domain in degrees. Default is a centered
         domain around the KLOT Chicago area radar.
     parallel: bool
-        If true, enable parallel preprocessing for large radar datasets using Dask.
+        If true, enable parallel preprocessing for large radar datasets using Dask. The Dask workers
+        write their images directly into a batch tensor in shared memory.
+    dtype: str or :py:meth:`torch.dtype`
+        'float32' for normalized images, or 'uint8' for the rendered RGB images. See
+        :py:meth:`preprocess_radar_image`.
 
     Returns
     -------
@@ -267,61 +129,202 @@ def preprocess_radar_image_batch(file, lat_range=(41.1280, 42.5680),
         files = sorted(glob(file))
     else:
         files = file
-    _pprocess = lambda x: _preprocess(x, lat_range, lon_range)
+    shape = (len(files),) + IMAGE_SHAPE
+    dtype = _image_dtype(dtype)
 
     if parallel:
-        arr = db.from_sequence(files).map(_pprocess).compute()
-        images = [x[0] for x in arr]
-        times = [x[1] for x in arr]
+        # The workers write their images straight into a shared memory batch, so only the
+        # times are pickled back and no concatenation is needed.
+        buffer_path = _shared_buffer_path()
+        with open(buffer_path, 'wb') as buffer_file:
+            buffer_file.truncate(int(np.prod(shape)) * dtype.itemsize)
+        try:
+            images = torch.from_file(buffer_path, shared=True, size=int(np.prod(shape)),
+                                     dtype=dtype).view(shape)
+            _pprocess = lambda x: _preprocess_into(x[1], lat_range, lon_range, buffer_path, shape, x[0], dtype)
+            times = db.from_sequence(list(enumerate(files))).map(_pprocess).compute()
+        finally:
+            # The mapping stays valid after the file is removed
+            os.remove(buffer_path)
     else:
-        arr = map(_pprocess, files)
-        images = [x[0] for x in arr]
-        times = [x[1] for x in arr]
+        images = torch.empty(shape, dtype=dtype)
+        times = []
+        for i, rad_file in enumerate(files):
+            image, rad_time = _preprocess(rad_file, lat_range, lon_range, dtype)
+            images[i] = image[0]
+            times.append(rad_time)
 
-    images = torch.concat(images, axis=0)
-    lats = np.linspace(lat_range[1], lat_range[0], images.shape[3])
-    lons = np.linspace(lon_range[0], lon_range[1], images.shape[2])
-    rad_image = RadarImage()
+    rad_image = _grid_radar_image(lat_range, lon_range, images.shape)
     rad_image.pytorch_image = images
+    rad_image.pyart_object = files
+    rad_image.times = times
+    return rad_image
+
+def preprocess_radar_sites(sites, rad_time=None, bucket_name='unidata-nexrad-level2', max_workers=None,
+                           partial_download=False, dtype='float32'):
+    """
+    This module will fetch and preprocess the latest (or closest to rad_time) scans from several
+    NEXRAD sites concurrently. The S3 listing, download, and decoding for each site runs in its own
+    thread, so the time per cycle is close to that of the slowest site rather than the sum of all sites.
+
+    Parameters
+    ----------
+    sites: str, :py:meth:`adam.io.RadarSite`, or list
+        The sites to process. Strings are looked up in :py:data:`adam.io.RADAR_SITES`.
+    rad_time: ISO-format datestring
+        The date/time string in YYYY-MM-DDTHH:MM:SS format for the radar scans. If None, then ADAM will
+        get the latest scans.
+    bucket_name: str
+        The NEXRAD S3 bucket to use. Default is 'unidata-nexrad-level2'.
+    max_workers: int or None
+        The maximum number of sites to fetch at once. Default is one worker per site.
+    partial_download: bool
+        If True, only download the lowest sweep of each volume with HTTP range requests.
+    dtype: str or :py:meth:`torch.dtype`
+        'float32' for normalized images, or 'uint8' for the rendered RGB images. See
+        :py:meth:`preprocess_radar_image`.
+
+    Returns
+    -------
+    images: dict of :py:meth:`adam.io.RadarImage`
+        The preprocessed images keyed by radar code.
+    """
+    if isinstance(sites, (str, RadarSite)):
+        sites = [sites]
+    sites = [get_site(x) for x in sites]
+    if max_workers is None:
+        max_workers = len(sites)
+
+    def _process_site(site):
+        return preprocess_radar_image(site.radar, rad_time, lat_range=site.lat_range,
+                                      lon_range=site.lon_range, bucket_name=bucket_name,
+                                      partial_download=partial_download, dtype=dtype)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        images = list(executor.map(_process_site, sites))
+    return {site.radar: image for site, image in zip(sites, images)}
+
+def _grid_radar_image(lat_range, lon_range, shape):
+    # A RadarImage with the grid of the domain for images of the given shape
+    rad_image = RadarImage()
     rad_image.lat_range = lat_range
     rad_image.lon_range = lon_range
-    rad_image.pyart_object = files
-    rad_image.grid_lat = lats
-    rad_image.grid_lon = lons
-    center_lat = (rad_image.lat_range[0] + rad_image.lat_range[1]) / 2.
-    center_lon = (rad_image.lon_range[0] + rad_image.lon_range[1]) / 2.
+    rad_image.grid_lat = np.linspace(lat_range[1], lat_range[0], shape[-1])
+    rad_image.grid_lon = np.linspace(lon_range[0], lon_range[1], shape[-2])
+    center_lat = (lat_range[0] + lat_range[1]) / 2.
+    center_lon = (lon_range[0] + lon_range[1]) / 2.
     rad_image.grid_x, rad_image.grid_y = _latlon_to_xy(
         rad_image.grid_lat, rad_image.grid_lon, center_lat, center_lon)
-    rad_image.times = times
     return rad_image
 
-def _preprocess(rad_file, lat_range, lon_range):
-    radar = pyart.io.read(rad_file)
-    disp = pyart.graph.RadarMapDisplay(radar)
-    fig, ax = plt.subplots(1, 1, figsize=(2.56, 2.56),
-            subplot_kw=dict(projection=ccrs.PlateCarree(), frameon=False))
+def _is_volume_path(radar):
+    # Radar codes are looked up in the archive, anything else is read directly
+    return '://' in radar or os.path.exists(radar)
 
-    disp.plot_ppi_map('reflectivity', sweep=0, min_lon=lon_range[0],
-            ax=ax, max_lon=lon_range[1], min_lat=lat_range[0], max_lat=lat_range[1],
-            embellish=False, vmin=-20, vmax=60, cmap='HomeyerRainbow',
-            add_grid_lines=False, colorbar_flag=False, title_flag=False)
-    ax.set_axis_off()
-    fig.tight_layout(pad=0, w_pad=0, h_pad=0)
-    with tempfile.NamedTemporaryFile(mode='w+b' ) as temp_file:
-        fig.savefig(temp_file, dpi=100)
-        plt.close(fig)
-        # Transform image
-        image = decode_image(temp_file.name)
-    # Transform image
-    image = image[:3, :, :].float()
-    transform = transforms.Compose([
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-        ])
-    image = torch.stack([transform(image)])
+def _read_volume(path, partial_download=False):
+    if partial_download:
+        return read_nexrad_sweep0(path)
+    if '://' not in path:
+        with span('decode'):
+            return pyart.io.read(path)
+    # Download and decode separately so that the metrics can tell them apart
+    with span('download'):
+        with fsspec.open(path, mode='rb', compression='infer', anon=True) as f:
+            data = f.read()
+    with span('decode'):
+        return pyart.io.read_nexrad_archive(io.BytesIO(data))
+
+def _preprocess_into(rad_file, lat_range, lon_range, buffer_path, shape, index, dtype=torch.float32):
+    image, rad_time = _preprocess(rad_file, lat_range, lon_range, dtype)
+    if tuple(image.shape[1:]) != tuple(shape[1:]):
+        raise ValueError(f"The image of {rad_file} has shape {tuple(image.shape[1:])}, expected {shape[1:]}.")
+    batch = np.memmap(buffer_path, dtype=image.numpy().dtype, mode='r+', shape=shape)
+    batch[index] = image[0].numpy()
+    batch.flush()
+    del batch
+    return rad_time
+
+def _shared_buffer_path():
+    # /dev/shm is RAM backed on Linux; elsewhere fall back to a regular temporary file
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    handle, path = tempfile.mkstemp(prefix='adam_batch_', suffix='.bin', dir=directory)
+    os.close(handle)
+    return path
+
+def _image_dtype(dtype):
+    # The models take normalized float32 images or raw uint8 RGB images
+    dtypes = {'float32': torch.float32, 'uint8': torch.uint8}
+    dtype = dtypes.get(dtype, dtype)
+    if dtype not in dtypes.values():
+        raise ValueError(f"The image dtype must be 'float32' or 'uint8', got {dtype}.")
+    return dtype
+
+def _preprocess(rad_file, lat_range, lon_range, dtype=torch.float32):
+    with span('decode'):
+        radar = pyart.io.read(rad_file)
+    image = _render_image(radar, lat_range, lon_range, dtype)
     rad_time = np.datetime64(radar.time["units"].split()[2])
     del radar
     return image, rad_time
 
+def _find_nexrad_scan(radar, rad_time=None, bucket_name='unidata-nexrad-level2'):
+    if rad_time is None:
+        right_now = datetime.utcnow()
+    else:
+        right_now = datetime.strptime(rad_time, "%Y-%m-%dT%H:%M:%S")
+    yesterday = right_now - timedelta(days=1)
+
+    # Each thread in preprocess_radar_sites needs its own session
+    s3 = boto3.session.Session().client('s3', config=Config(signature_version=UNSIGNED))
+    file_list = []
+    for day in [right_now, yesterday]:
+        prefix = f'{day.year}/{day.month:02d}/{day.day:02d}/{radar}'
+        with span('s3_list', radar=radar):
+            response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
+        file_list = file_list + [x['Key'] for x in response.get('Contents', [])]
+    if len(file_list) == 0:
+        raise ValueError(f"No scans from {radar} found in {bucket_name} near {right_now}.")
+
+    time_list = []
+    for filepath in file_list:
+        name = filepath.split("/")[-1]
+        if name[-3:] == "MDM":
+            time_list.append(
+                datetime.strptime(name, f"{radar}%Y%m%d_%H%M%S_V06_MDM"))
+        else:
+            time_list.append(
+                datetime.strptime(name, f"{radar}%Y%m%d_%H%M%S_V06"))
+
+    time_list = np.array(time_list)
+    return f"s3://{bucket_name}/" + file_list[np.argmin(np.abs(time_list - right_now))]
+
+def _render_image(radar, lat_range, lon_range, dtype=torch.float32):
+    # pyplot keeps global state, so renders from different threads must not overlap
+    with _RENDER_LOCK, span('render'):
+        disp = pyart.graph.RadarMapDisplay(radar)
+        fig, ax = plt.subplots(1, 1, figsize=(2.56, 2.56),
+                subplot_kw=dict(projection=ccrs.PlateCarree(), frameon=False))
+
+        disp.plot_ppi_map('reflectivity', sweep=0, min_lon=lon_range[0],
+                ax=ax, max_lon=lon_range[1], min_lat=lat_range[0], max_lat=lat_range[1],
+                embellish=False, vmin=-20, vmax=60, cmap='HomeyerRainbow',
+                add_grid_lines=False, colorbar_flag=False, title_flag=False)
+        ax.set_axis_off()
+        fig.tight_layout(pad=0, w_pad=0, h_pad=0)
+        with tempfile.NamedTemporaryFile(mode='w+b') as temp_file:
+            fig.savefig(temp_file, dpi=100)
+            plt.close(fig)
+            # Transform image
+            image = decode_image(temp_file.name)
+    if _image_dtype(dtype) == torch.uint8:
+        # The model normalizes the image in its first layer
+        return torch.stack([image[:3, :, :]])
+    image = image[:3, :, :].float()
+    transform = transforms.Compose([
+            transforms.Normalize(list(IMAGE_MEAN), list(IMAGE_STD))
+        ])
+    return torch.stack([transform(image)])
+
 def _latlon_to_xy(lat, lon, lat0=0, lon0=0):
     R = 6371000  # Earth's radius in meters
     x = np.radians(lon - lon0) * R * np.cos(np.radians(lat0))
@@ -0,0 +1,147 @@
+import bz2
+import struct
+
+VOLUME_HEADER_SIZE = 24
+CONTROL_WORD_SIZE = 4
+CTM_HEADER_SIZE = 12
+MESSAGE_HEADER_SIZE = 16
+RECORD_SIZE = 2432
+
+# Radial status values in the Message 31 header
+END_OF_ELEVATION = 2
+END_OF_VOLUME = 4
+
+
+class Sweep0Assembler(object):
+    """
+    Incrementally assembles the lowest sweep of a NEXRAD Level II volume from the leading bytes
+    of the volume. Bytes can be fed in any sized pieces, such as real-time chunks or HTTP byte
+    ranges. Each compressed record is decompressed once as soon as it is complete, and the
+    assembler stops accepting data once the lowest sweep has ended.
+
+    Parameters
+    ----------
+    elevation_number: int
+        The elevation number in the Message 31 headers of the sweep to assemble. The lowest
+        sweep is elevation number 1.
+    """
+    def __init__(self, elevation_number=1):
+        self.elevation_number = elevation_number
+        self.complete = False
+        self.records = 0
+        self._buffer = bytearray()
+        self._pos = VOLUME_HEADER_SIZE
+        self._header = None
+
+    @property
+    def bytes_used(self):
+        """
+        The number of bytes of the volume consumed up to the end of the last complete record.
+        """
+        return self._pos if self._header is not None else 0
+
+    def bytes_needed(self):
+        """
+        The number of bytes the assembler needs to finish the record it is waiting on.
+        This is a lower bound that is useful for sizing the next range request.
+        """
+        if self.complete:
+            return 0
+        available = len(self._buffer) - self._pos
+        if available < CONTROL_WORD_SIZE:
+            return CONTROL_WORD_SIZE - available
+        record_size = abs(struct.unpack('>i', self._buffer[self._pos:self._pos + CONTROL_WORD_SIZE])[0])
+        return CONTROL_WORD_SIZE + record_size - available
+
+    def feed(self, data):
+        """
+        Add the next bytes of the volume.
+
+        Parameters
+        ----------
+        data: bytes
+            The bytes following those that were previously fed.
+
+        Returns
+        -------
+        complete: bool
+            True once the lowest sweep is complete.
+        """
+        if self.complete:
+            return True
+        self._buffer += data
+        if self._header is None:
+            if len(self._buffer) < VOLUME_HEADER_SIZE:
+                return False
+            self._header = bytes(self._buffer[:VOLUME_HEADER_SIZE])
+            if not self._header.startswith(b'AR2V'):
+                raise ValueError("The data is not a NEXRAD Level II archive volume.")
+        while not self.complete and len(self._buffer) - self._pos >= CONTROL_WORD_SIZE:
+            record_size = abs(struct.unpack('>i', self._buffer[self._pos:self._pos + CONTROL_WORD_SIZE])[0])
+            start = self._pos + CONTROL_WORD_SIZE
+            if len(self._buffer) < start + record_size:
+                break
+            record = bz2.decompress(self._buffer[start:start + record_size])
+            self._pos = start + record_size
+            self.records += 1
+            self.complete = _sweep_ended(record, self.elevation_number)
+        return self.complete
+
+    def getvalue(self):
+        """
+        Get the volume header and all of the complete compressed records fed so far.
+        This is a valid, truncated Level II file that Py-ART can read.
+
+        Returns
+        -------
+        data: bytes
+            The truncated volume.
+        """
+        return bytes(self._buffer[:self.bytes_used])
+
+
+def iter_message_headers(record):
+    """
+    Iterate over the messages in a decompressed Level II record.
+
+    Parameters
+    ----------
+    record: bytes
+        The decompressed record.
+
+    Yields
+    ------
+    msg_type: int
+        The message type.
+    radial_status: int or None
+        The radial status for Message 31, None for other messages.
+    elevation_number: int or None
+        The elevation number for Message 31, None for other messages.
+    """
+    pos = 0
+    while pos + CTM_HEADER_SIZE + MESSAGE_HEADER_SIZE <= len(record):
+        size, _, msg_type = struct.unpack_from('>HBB', record, pos + CTM_HEADER_SIZE)
+        if msg_type == 31:
+            msg31 = pos + CTM_HEADER_SIZE + MESSAGE_HEADER_SIZE
+            if msg31 + 23 > len(record):
+                return
+            radial_status, elevation_number = struct.unpack_from('>BB', record, msg31 + 21)
+            yield msg_type, radial_status, elevation_number
+            pos += CTM_HEADER_SIZE + 2 * size
+        else:
+            if msg_type == 0 and size == 0:
+                # Zero padding at the end of a record
+                return
+            yield msg_type, None, None
+            pos += RECORD_SIZE
+
+
+def _sweep_ended(record, elevation_number):
+    for msg_type, radial_status, elevation in iter_message_headers(record):
+        if msg_type != 31:
+            continue
+        if elevation > elevation_number:
+            return True
+        if elevation == elevation_number and radial_status in (END_OF_ELEVATION, END_OF_VOLUME):
+            return True
+    return False
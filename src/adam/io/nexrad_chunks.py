@@ -0,0 +1,162 @@
+import io
+import logging
+import os
+import time
+import boto3
+import pyart
+
+from botocore import UNSIGNED
+from botocore.config import Config
+
+from .level2 import Sweep0Assembler
+
+MAX_VOLUME_NUMBER = 999
+
+
+class NexradChunkSource(object):
+    """
+    Follows the NEXRAD real-time chunk stream of one radar and returns the lowest sweep of each
+    volume as soon as its chunks have arrived, instead of waiting minutes for the whole volume
+    to appear in the archive bucket.
+
+    The chunks are read either from the 'unidata-nexrad-level2-chunks' bucket or from a local
+    directory with the same layout, <radar>/<volume number>/<YYYYMMDD-HHMMSS>-<chunk number>-<S|I|E>.
+    Volume numbers run from 1 to 999 and then wrap around.
+
+    This class has the same poll/read interface as :py:meth:`adam.realtime.S3ScanSource`, so it
+    can be used as the source of :py:meth:`adam.realtime.LakeBreezeMonitor`.
+
+    Parameters
+    ----------
+    radar: str
+        The 4-letter code of the radar.
+    path: str or None
+        A local directory to read the chunks from. If None, chunks are read from S3.
+    bucket_name: str
+        The S3 bucket to read the chunks from.
+    volume_timeout: float
+        If no new chunk of the current volume arrives for this many seconds and the next volume
+        has started, the current volume is given up on, so that a volume whose end chunk never
+        arrives does not stall the source.
+    """
+    def __init__(self, radar, path=None, bucket_name='unidata-nexrad-level2-chunks', volume_timeout=900.):
+        self.radar = radar
+        self.path = path
+        self.bucket_name = bucket_name
+        self.volume_timeout = volume_timeout
+        self.volume = None
+        self._assembler = None
+        self._chunks = []
+        self._done = {}
+        if path is None:
+            self._s3 = boto3.session.Session().client('s3', config=Config(signature_version=UNSIGNED))
+
+    def poll(self):
+        """
+        Fetch any new chunks of the current volume.
+
+        Returns
+        -------
+        volumes: list of str
+            The names of the volumes whose lowest sweep was completed by this poll.
+        """
+        if self.volume is None:
+            self.volume = self._find_latest_volume()
+            if self.volume is None:
+                return []
+            self._start_volume(self.volume)
+
+        completed = []
+        while True:
+            new_chunks = [x for x in self._list_chunks(self.volume) if x not in self._chunks]
+            if len(new_chunks) > 0:
+                self._last_chunk_time = time.monotonic()
+            for chunk in sorted(new_chunks):
+                self._chunks.append(chunk)
+                if self._assembler.complete:
+                    continue
+                self._assembler.feed(self._get_chunk(self.volume, chunk))
+                if self._assembler.complete:
+                    start_time = '-'.join(self._chunks[0].split('-')[:2])
+                    name = f"{self.radar}/{self.volume}/{start_time}"
+                    self._done[name] = self._assembler.getvalue()
+                    completed.append(name)
+                    logging.info(f"Sweep 0 of {name} assembled from {len(self._chunks)} chunks.")
+            ended = len(self._chunks) > 0 and self._chunks[-1].endswith('-E')
+            timed_out = time.monotonic() - self._last_chunk_time > self.volume_timeout
+            if not ended and not timed_out:
+                break
+            # The volume has ended, so move on to the next one
+            next_volume = self.volume % MAX_VOLUME_NUMBER + 1
+            if len(self._list_chunks(next_volume)) == 0:
+                break
+            if not ended:
+                logging.warning(f"No new chunks of {self.radar}/{self.volume} for {self.volume_timeout} s "
+                                f"and volume {next_volume} has started, so moving on without its end chunk.")
+            self._start_volume(next_volume)
+        return completed
+
+    def read(self, name):
+        """
+        Read the assembled lowest sweep of a volume.
+
+        Parameters
+        ----------
+        name: str
+            The volume name returned by :py:meth:`NexradChunkSource.poll`.
+
+        Returns
+        -------
+        radar: :py:meth:`pyart.core.Radar`
+            The radar object containing only the lowest sweep.
+        """
+        return pyart.io.read_nexrad_archive(io.BytesIO(self._done.pop(name)), scans=[0])
+
+    def _start_volume(self, volume):
+        self.volume = volume
+        self._chunks = []
+        self._assembler = Sweep0Assembler()
+        self._last_chunk_time = time.monotonic()
+
+    def _list_chunks(self, volume):
+        if self.path is not None:
+            volume_path = os.path.join(self.path, self.radar, str(volume))
+            if not os.path.isdir(volume_path):
+                return []
+            return sorted(x for x in os.listdir(volume_path) if x[-2:] in ('-S', '-I', '-E'))
+        prefix = f"{self.radar}/{volume}/"
+        kwargs = dict(Bucket=self.bucket_name, Prefix=prefix)
+        if self.volume == volume and len(self._chunks) > 0:
+            kwargs['StartAfter'] = prefix + self._chunks[-1]
+        response = self._s3.list_objects_v2(**kwargs)
+        chunks = [x['Key'][len(prefix):] for x in response.get('Contents', [])]
+        return self._chunks + chunks if 'StartAfter' in kwargs else chunks
+
+    def _get_chunk(self, volume, chunk):
+        if self.path is not None:
+            with open(os.path.join(self.path, self.radar, str(volume), chunk), 'rb') as f:
+                return f.read()
+        response = self._s3.get_object(Bucket=self.bucket_name, Key=f"{self.radar}/{volume}/{chunk}")
+        return response['Body'].read()
+
+    def _find_latest_volume(self):
+        # Chunk names start with the volume start time, so the latest chunk of all is in the
+        # latest volume. One listing of the radar prefix finds it.
+        if self.path is not None:
+            radar_path = os.path.join(self.path, self.radar)
+            if not os.path.isdir(radar_path):
+                return None
+            keys = [f"{self.radar}/{volume}/{chunk}" for volume in os.listdir(radar_path) if volume.isdigit()
+                    for chunk in self._list_chunks(int(volume))]
+        else:
+            paginator = self._s3.get_paginator('list_objects_v2')
+            keys = [item['Key'] for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{self.radar}/")
+                    for item in page.get('Contents', [])]
+        candidates = []
+        for key in keys:
+            parts = key.split('/')
+            if len(parts) == 3 and parts[1].isdigit():
+                candidates.append((parts[2], int(parts[1])))
+        if len(candidates) == 0:
+            return None
+        return max(candidates)[1]
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class RadarImage(object):
+    """
+    This class contains the basic data for predicting the lake-breeze front location
+    from radar. It includes parameters for storing the radar data for later analysis
+    in Py-ART and for inference in the lake-breeze prediction model.
+
+    Parameters
+    ----------
+    pyart_object: :py:meth:`pyart.core.Radar` or str
+        The PyART radar object that stores the radar data. This could also be a link
+        to the radar scan file (useful for batch processing to preserve memory).
+    lat_range: 2-tuple
+        The minimum and maximum latitude of the inference domain.
+    lon_range: 2-tuple
+        The minimum and maximum longitude of the inference domain.
+    grid_lat: ndarray
+        The latitude of each point in the inference domain.
+    grid_lon: ndarray
+        The longitude of each point in the inference domain.
+    pytorch_image: :py:meth:`torch.Tensor`
+        The tensor containing the preprocessed radar scan for inference, either the normalized
+        float32 image or the uint8 RGB image that the model normalizes itself.
+    lakebreeze_mask: 256 x 256 ndarray
+        The inferred lake breeze mask, where 1 = lakebreeze and 0 = not a lake breeze. 
+    times: list of np.datetime64('s')
+        The epoch time of the radar scans.
+    source: str, list of str or None
+        What the image was made from, to look up cached results: the S3 URL of an archive volume,
+        or a key from :py:meth:`adam.io.source_key`. A batch has one per frame. If None, the
+        source is worked out from pyart_object when it is needed.
+    """
+    pyart_object = None
+    lat_range = None
+    lon_range = None
+    grid_lat = None
+    grid_lon = None
+    pytorch_image = None
+    lakebreeze_mask = None
+    aggregated_mask = None
+    times = None
+    source = None
+    
+    def __getitem__(self, key):
+        """
+        Allows for indexing into the RadarImage object to get the lake breeze mask
+        for a specific time.
+        
+        Parameters
+        ----------
+        key: int or np.datetime64('s')
+            The index or time to retrieve the lake breeze mask for.
+
+        Returns
+        -------
+        mask: ndarray
+            The lake breeze mask for the specified time.
+        """
+        if len(self.lakebreeze_mask.shape) == 2:
+            return self.lakebreeze_mask
+        if isinstance(key, int):
+            return self.lakebreeze_mask[key]
+        elif isinstance(key, np.datetime64):
+            return self.aggregate(start_time=key, end_time=key)
+        elif isinstance(key, str):
+            key = np.datetime64(key)
+            return self.aggregate(start_time=key, end_time=key)
+        elif isinstance(key, slice):
+            return self.lakebreeze_mask[key]
+        elif isinstance(key, list) or isinstance(key, np.ndarray):
+            if all(isinstance(x, int) for x in key):
+                return [self.lakebreeze_mask[x] for x in key]
+            elif all(isinstance(x, (str, np.datetime64)) for x in key):
+                masks = []
+                for time in key:
+                    if isinstance(time, str):
+                        time = np.datetime64(time)
+                    masks.append(self.aggregate(start_time=time, end_time=time))
+                return masks
+            else:
+                raise TypeError("All keys in the list must be of the same type: int, str, or np.datetime64('s').")
+        else:
+            raise TypeError("Key must be an int, np.datetime64('s'), str, or slice.")
+        
+    def aggregate(self, start_time=None, end_time=None):
+        """
+        This function aggregates the lake breeze mask over a specified time period.
+        If no time period is specified, it returns the sum of all of the masks.
+
+        Parameters
+        ----------
+        start_time: str or np.datetime64('s')
+            The start time for aggregation.
+        end_time: str np.datetime64('s')
+            The end time for aggregation.
+
+        Returns
+        -------
+        aggregated_mask: RadarImage
+            The aggregated lake breeze mask.
+        """
+        if start_time is None and end_time is None:
+            self.aggregated_mask = np.sum(self.lakebreeze_mask, axis=0)
+            return self.aggregated_mask
+
+        mask = self.lakebreeze_mask.copy()
+        if isinstance(start_time, str):
+            start_time = np.datetime64(start_time)
+        if isinstance(end_time, str):
+            end_time = np.datetime64(end_time)
+        if (start_time is None) ^ (end_time is None):
+            raise ValueError("Both start_time and end_time must be specified for aggregation.")
+        indices = np.where((self.times >= start_time) & (self.times <= end_time))[0]
+        if len(indices) == 0:
+            raise ValueError("No data available for the specified time range.")
+        mask = mask[indices]
+        self.aggregated_mask = np.sum(mask, axis=0)
+        return self.aggregated_mask
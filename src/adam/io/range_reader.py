@@ -0,0 +1,86 @@
+import io
+import logging
+import time
+import urllib.error
+import urllib.request
+import pyart
+
+from .level2 import Sweep0Assembler
+from ..metrics import span
+
+
+def read_nexrad_sweep0(url, block_size=262144, timeout=30., return_stats=False):
+    """
+    Read only the lowest sweep of a NEXRAD Level II archive volume using HTTP range requests.
+    The volume header and the leading compressed records are downloaded in blocks, each record is
+    decompressed as soon as it is complete, and the download stops once the lowest sweep has ended.
+    This transfers a fraction of the 5-15 MB that a full download of the volume takes.
+
+    Parameters
+    ----------
+    url: str
+        The HTTP(S) URL of the volume. S3 paths like s3://unidata-nexrad-level2/<key> are
+        converted to the public HTTPS endpoint of the bucket.
+    block_size: int
+        The minimum number of bytes to request at once.
+    timeout: float
+        The timeout in seconds of each request.
+    return_stats: bool
+        If True, also return a dictionary with the bytes transferred, the number of requests,
+        and the wall time.
+
+    Returns
+    -------
+    radar: :py:meth:`pyart.core.Radar`
+        The radar object containing only the lowest sweep.
+    stats: dict
+        Only returned if return_stats is True.
+    """
+    url = _to_http_url(url)
+    start = time.perf_counter()
+    assembler = Sweep0Assembler()
+    offset = 0
+    requests = 0
+    transferred = 0
+    with span('download', partial=True):
+        while not assembler.complete:
+            size = max(block_size, assembler.bytes_needed())
+            data, whole_file, nbytes = _get_range(url, offset, size, timeout)
+            requests += 1
+            transferred += nbytes
+            offset += len(data)
+            assembler.feed(data)
+            if whole_file or len(data) < size:
+                break
+    if not assembler.complete:
+        logging.warning(f"{url} ended before the lowest sweep was complete.")
+    with span('decode', partial=True):
+        radar = pyart.io.read_nexrad_archive(io.BytesIO(assembler.getvalue()), scans=[0])
+    stats = dict(bytes_transferred=transferred, requests=requests,
+                 wall_time=time.perf_counter() - start, complete=assembler.complete)
+    logging.info(f"Read the lowest sweep of {url} with {requests} requests and {transferred} bytes.")
+    if return_stats:
+        return radar, stats
+    return radar
+
+
+def _to_http_url(url):
+    if url.startswith("s3://"):
+        bucket, key = url[5:].split("/", 1)
+        return f"https://{bucket}.s3.amazonaws.com/{key}"
+    return url
+
+
+def _get_range(url, offset, size, timeout):
+    request = urllib.request.Request(url, headers={"Range": f"bytes={offset}-{offset + size - 1}"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read()
+            # A server that ignores the Range header sends the whole file with status 200
+            if response.status == 200:
+                return data[offset:], True, len(data)
+            return data, False, len(data)
+    except urllib.error.HTTPError as e:
+        if e.code == 416:
+            return b'', True, 0
+        raise
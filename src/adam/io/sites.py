@@ -0,0 +1,76 @@
+class RadarSite(object):
+    """
+    This class describes a NEXRAD site that ADAM can monitor. It stores the radar code,
+    the inference domain around the radar, and the instruments inside the domain that
+    can be steered from the lake breeze mask.
+
+    Parameters
+    ----------
+    radar: str
+        The 4-letter code of the NEXRAD radar (e.g. KLOT).
+    lat_range: 2-tuple of floats
+        The minimum and maximum latitude of the inference domain in degrees.
+    lon_range: 2-tuple of floats
+        The minimum and maximum longitude of the inference domain in degrees.
+    instruments: dict
+        A dictionary whose keys are instrument names and whose values are (lat, lon) tuples.
+    """
+    def __init__(self, radar, lat_range, lon_range, instruments=None):
+        self.radar = radar
+        self.lat_range = tuple(lat_range)
+        self.lon_range = tuple(lon_range)
+        if instruments is None:
+            instruments = {}
+        self.instruments = dict(instruments)
+
+    def __repr__(self):
+        return (f"RadarSite(radar={self.radar!r}, lat_range={self.lat_range}, "
+                f"lon_range={self.lon_range}, instruments={list(self.instruments)})")
+
+
+def _domain_around(lat, lon, half_lat=0.72, half_lon=0.71515):
+    return (lat - half_lat, lat + half_lat), (lon - half_lon, lon + half_lon)
+
+
+RADAR_SITES = {
+    'KLOT': RadarSite('KLOT', (41.1280, 42.5680), (-88.7176, -87.2873),
+                      instruments={'atmos_lidar': (41.70101404798476, -87.99577278662817)}),
+    'KMKX': RadarSite('KMKX', *_domain_around(42.9678, -88.5506)),
+    'KGRR': RadarSite('KGRR', *_domain_around(42.8939, -85.5449)),
+    'KIWX': RadarSite('KIWX', *_domain_around(41.3586, -85.7000)),
+}
+
+
+def get_site(radar):
+    """
+    Get a site from the ADAM site registry.
+
+    Parameters
+    ----------
+    radar: str or :py:meth:`adam.io.RadarSite`
+        The 4-letter code of the radar. If a :py:meth:`RadarSite` is given, it is returned unchanged.
+
+    Returns
+    -------
+    site: :py:meth:`adam.io.RadarSite`
+        The registered site.
+    """
+    if isinstance(radar, RadarSite):
+        return radar
+    try:
+        return RADAR_SITES[radar.upper()]
+    except KeyError:
+        raise ValueError(f"{radar} is not a registered radar site. "
+                         f"Available sites are {list(RADAR_SITES)}.")
+
+
+def register_site(site):
+    """
+    Add a site to the ADAM site registry, replacing any site with the same radar code.
+
+    Parameters
+    ----------
+    site: :py:meth:`adam.io.RadarSite`
+        The site to register.
+    """
+    RADAR_SITES[site.radar.upper()] = site
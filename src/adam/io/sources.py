@@ -0,0 +1,43 @@
+import hashlib
+import os
+import numpy as np
+
+
+def source_key(radar, field='reflectivity'):
+    """
+    Get a key that identifies a radar volume, for caching the results made from it.
+
+    Parameters
+    ----------
+    radar: str or :py:meth:`pyart.core.Radar`
+        The volume. S3 and HTTP URLs of archive volumes are their own key, since archive
+        volumes never change. Local files are keyed by a hash of their contents, and radar
+        objects by a hash of the lowest sweep of the field.
+    field: str
+        The field of a radar object to hash.
+
+    Returns
+    -------
+    key: str
+        The key, such as 's3://unidata-nexrad-level2/2025/07/15/KLOT/KLOT20250715_180000_V06'
+        or 'blake2b:<hex digest>'.
+    """
+    if isinstance(radar, (str, os.PathLike)):
+        radar = os.fspath(radar)
+        if '://' in radar:
+            return radar
+        digest = hashlib.blake2b(digest_size=20)
+        with open(radar, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return f"blake2b:{digest.hexdigest()}"
+    if hasattr(radar, 'fields'):
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(str(radar.metadata.get('instrument_name', '')).encode())
+        digest.update(radar.time['units'].encode())
+        rays = radar.get_slice(0)
+        data = radar.fields[field]['data'][rays]
+        digest.update(np.ascontiguousarray(np.ma.getdata(data)).tobytes())
+        digest.update(np.packbits(np.ma.getmaskarray(data)).tobytes())
+        return f"blake2b:{digest.hexdigest()}"
+    raise TypeError("The radar must be a path, a URL or a Py-ART radar object.")
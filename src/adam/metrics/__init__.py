@@ -0,0 +1,36 @@
+"""
+===============================================
+ADAM Metrics (:mod:`adam.metrics`)
+===============================================
+
+.. currentmodule:: adam.metrics
+
+This module times the stages of the ADAM pipeline and exports the measurements as
+structured logs and in the Prometheus text format. Recording is off unless the
+ADAM_METRICS environment variable is set to 1 or :py:meth:`enable` is called.
+:py:meth:`profile` breaks the time and memory of each stage down further.
+
+.. autosummary::
+    :toctree: generated/
+
+    MetricsRegistry
+    METRICS
+    span
+    timed
+    inc
+    observe
+    enable
+    disable
+    enabled
+    peak_rss
+    Profiler
+    profile
+"""
+
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, attributes={
+    'instrumentation': ['MetricsRegistry', 'METRICS', 'DEFAULT_BUCKETS', 'span', 'timed', 'inc', 'observe',
+                        'enable', 'disable', 'enabled', 'peak_rss'],
+    'profiling': ['Profiler', 'profile', 'OTHER_STAGE'],
+})
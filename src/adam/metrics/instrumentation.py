@@ -0,0 +1,457 @@
+import functools
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The upper bounds in seconds of the stage histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 120., float('inf'))
+
+_logger = logging.getLogger('adam.metrics')
+
+
+class _Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.
+        self.count = 0
+        self.max = 0.
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+
+class _Span(object):
+    __slots__ = ['registry', 'name', 'labels', 'start', 'stages']
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        # Only the profilers that saw the span start are told that it ended
+        self.stages = [(profiler, profiler.enter_stage(self.name)) for profiler in self.registry.profilers]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        seconds = time.perf_counter() - self.start
+        labels = self.labels if exc_type is None else dict(self.labels, error=exc_type.__name__)
+        self.registry.observe(self.name, seconds, **labels)
+        for profiler, stage in reversed(self.stages):
+            profiler.exit_stage(stage)
+        return False
+
+
+class _NullSpan(object):
+    __slots__ = []
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_val, exc_tb): return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class MetricsRegistry(object):
+    """
+    Collects the timings of the processing stages, counters and gauges, and exports them as
+    structured logs and in the Prometheus text format. When the registry is disabled, spans and
+    counters return immediately, so the instrumentation costs next to nothing.
+
+    Parameters
+    ----------
+    enabled: bool
+        Whether to record metrics.
+    log: bool
+        If True, every span and counter increment is also logged as a JSON line to the
+        'adam.metrics' logger.
+    buckets: tuple of floats
+        The upper bounds in seconds of the stage histogram buckets.
+    namespace: str
+        The prefix of the exported metric names.
+    """
+    def __init__(self, enabled=False, log=False, buckets=DEFAULT_BUCKETS, namespace='adam'):
+        self.enabled = enabled
+        self.log = log
+        self.buckets = tuple(buckets)
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._server = None
+        # The active :py:meth:`adam.metrics.Profiler` sessions, which are told when each span
+        # starts and ends. The tuple is replaced under the lock rather than changed, so that
+        # spans in other threads can loop over it without taking the lock.
+        self.profilers = ()
+
+    def span(self, name, **labels):
+        """
+        Time a block of code as a stage.
+
+        Parameters
+        ----------
+        name: str
+            The name of the stage, such as 'download' or 'forward'.
+        labels:
+            Extra labels of the measurement, such as the radar.
+
+        Returns
+        -------
+        span: context manager
+            Records the duration of the block in the stage histogram when it exits.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def timed(self, name):
+        """
+        Decorate a function so that every call is timed as a stage.
+
+        Parameters
+        ----------
+        name: str
+            The name of the stage.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds, **labels):
+        """
+        Record a duration in the histogram of a stage.
+
+        Parameters
+        ----------
+        name: str
+            The name of the stage, or of a latency such as 'scan_latency'.
+        seconds: float
+            The duration in seconds.
+        labels:
+            Extra labels of the measurement.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+        if self.log:
+            _logger.info(json.dumps(dict(event='span', stage=name, seconds=seconds, **labels)))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increment a counter.
+
+        Parameters
+        ----------
+        name: str
+            The name of the counter, such as 'uploads'.
+        value: float
+            The amount to add.
+        labels:
+            Extra labels of the counter, such as the status.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self.log:
+            _logger.info(json.dumps(dict(event='counter', name=name, value=value, **labels)))
+
+    def set_gauge(self, name, value, **labels):
+        """
+        Set a gauge to a value.
+
+        Parameters
+        ----------
+        name: str
+            The name of the gauge.
+        value: float
+            The value.
+        labels:
+            Extra labels of the gauge.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def record_peak_rss(self):
+        """
+        Set the process_peak_rss_bytes gauge to the peak resident memory of the process.
+
+        Returns
+        -------
+        rss: int
+            The peak resident memory in bytes.
+        """
+        rss = peak_rss()
+        self.set_gauge('process_peak_rss_bytes', rss)
+        return rss
+
+    def snapshot(self):
+        """
+        Get the current metrics.
+
+        Returns
+        -------
+        metrics: dict
+            The 'stages' with the count, total, mean and maximum duration of each stage, and the
+            'counters' and 'gauges', keyed by name with the labels in braces.
+        """
+        with self._lock:
+            stages = {_display_name(name, labels): dict(count=h.count, total=h.sum, max=h.max,
+                                                        mean=h.sum / h.count if h.count else 0.)
+                      for (name, labels), h in self._histograms.items()}
+            counters = {_display_name(name, labels): value for (name, labels), value in self._counters.items()}
+            gauges = {_display_name(name, labels): value for (name, labels), value in self._gauges.items()}
+        return dict(stages=stages, counters=counters, gauges=gauges)
+
+    def to_prometheus(self):
+        """
+        Export the metrics in the Prometheus text format. The stage durations are exported as the
+        <namespace>_stage_seconds histogram with a stage label, the counters with a _total suffix,
+        and the gauges as they are.
+
+        Returns
+        -------
+        text: str
+            The metrics.
+        """
+        if self.enabled:
+            self.record_peak_rss()
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        if histograms:
+            lines += [f"# HELP {ns}_stage_seconds The duration of each processing stage.",
+                      f"# TYPE {ns}_stage_seconds histogram"]
+        for (name, labels), histogram in histograms:
+            labels = (('stage', name),) + labels
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{ns}_stage_seconds_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{ns}_stage_seconds_sum{_format_labels(labels)} {histogram.sum!r}")
+            lines.append(f"{ns}_stage_seconds_count{_format_labels(labels)} {histogram.count}")
+        for names, kind, suffix in [(counters, 'counter', '_total'), (gauges, 'gauge', '')]:
+            declared = set()
+            for (name, labels), value in names:
+                metric = f"{ns}_{name}{suffix}"
+                if metric not in declared:
+                    lines.append(f"# TYPE {metric} {kind}")
+                    declared.add(metric)
+                lines.append(f"{metric}{_format_labels(labels)} {value!r}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """
+        Write the metrics in the Prometheus text format to a file, for the textfile collector of
+        the node exporter. The file is replaced atomically.
+
+        Parameters
+        ----------
+        path: str
+            The file to write.
+        """
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_file, path)
+
+    def serve(self, port=9100, host='127.0.0.1'):
+        """
+        Serve the metrics in the Prometheus text format over HTTP from a background thread.
+
+        Parameters
+        ----------
+        port: int
+            The port to listen on. Use 0 for a free port.
+        host: str
+            The address to listen on.
+
+        Returns
+        -------
+        url: str
+            The URL of the metrics endpoint.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                _logger.debug(format % args)
+
+        self.stop_serving()
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def stop_serving(self):
+        """
+        Stop the metrics HTTP server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset(self):
+        """
+        Clear every metric.
+        """
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self._gauges = {}
+
+    def _add_profiler(self, profiler):
+        with self._lock:
+            self.profilers = self.profilers + (profiler,)
+
+    def _remove_profiler(self, profiler):
+        with self._lock:
+            self.profilers = tuple(p for p in self.profilers if p is not profiler)
+
+
+def peak_rss():
+    """
+    Get the peak resident memory of the process in bytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def _display_name(name, labels):
+    return name + _format_labels(labels)
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+# The registry that ADAM records into. It is enabled by setting ADAM_METRICS=1, and logs
+# every measurement when ADAM_METRICS_LOG=1.
+METRICS = MetricsRegistry(enabled=_env_flag('ADAM_METRICS'), log=_env_flag('ADAM_METRICS_LOG'))
+
+
+def span(name, **labels):
+    """
+    Time a block of code as a stage in the default registry. See :py:meth:`MetricsRegistry.span`.
+    """
+    if not METRICS.enabled:
+        return _NULL_SPAN
+    return _Span(METRICS, name, labels)
+
+
+def timed(name):
+    """
+    Decorate a function so that every call is timed as a stage in the default registry.
+    See :py:meth:`MetricsRegistry.timed`.
+    """
+    return METRICS.timed(name)
+
+
+def inc(name, value=1, **labels):
+    """
+    Increment a counter in the default registry. See :py:meth:`MetricsRegistry.inc`.
+    """
+    if METRICS.enabled:
+        METRICS.inc(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    """
+    Record a duration in the default registry. See :py:meth:`MetricsRegistry.observe`.
+    """
+    if METRICS.enabled:
+        METRICS.observe(name, seconds, **labels)
+
+
+def enable(log=False):
+    """
+    Start recording metrics in the default registry.
+
+    Parameters
+    ----------
+    log: bool
+        If True, also log every measurement as a JSON line to the 'adam.metrics' logger.
+    """
+    METRICS.enabled = True
+    METRICS.log = log
+
+
+def disable():
+    """
+    Stop recording metrics in the default registry.
+    """
+    METRICS.enabled = False
+
+
+@contextmanager
+def enabled(log=False):
+    """
+    Record metrics in the default registry while the block runs.
+
+    Parameters
+    ----------
+    log: bool
+        If True, also log every measurement as a JSON line.
+    """
+    previous = (METRICS.enabled, METRICS.log)
+    enable(log=log)
+    try:
+        yield METRICS
+    finally:
+        METRICS.enabled, METRICS.log = previous
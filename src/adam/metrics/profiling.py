@@ -0,0 +1,351 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+from collections import Counter
+
+from .instrumentation import METRICS
+
+# The stage of the code that runs outside of every span
+OTHER_STAGE = 'other'
+
+
+class Profiler(object):
+    """
+    Profiles a workload stage by stage. The stages are the spans of :py:meth:`adam.metrics.span`
+    around downloading, decoding, rendering, the forward pass, speckle filtering and so on,
+    so the time inside each stage can be broken down by function, torch operator and
+    memory allocation. Use it as a context manager around the workload:
+
+    .. code-block:: python
+
+        with adam.profile('profile_out'):
+            images = adam.io.preprocess_radar_image_batch(files)
+            adam.model.infer_lake_breeze_batch(images)
+
+    These files are written to output_dir when the block ends:
+
+    * stacks.folded: the sampled Python call stacks of every stage in the folded format of
+      flamegraph.pl, with the name of the stage in brackets at the root of each stack. Load it
+      into speedscope or run flamegraph.pl on it.
+    * <stage>.prof and all.prof: the cProfile statistics of each stage and of the whole
+      workload, for pstats or snakeviz. Each stage only includes the time spent outside of
+      the stages nested inside it.
+    * torch_trace.json, torch_ops.txt and torch_stacks.folded: the trace of the torch.profiler
+      for Perfetto or chrome://tracing with the stages as ranges, the operators that took the
+      most time, and the operator call stacks for flamegraph.pl.
+    * memory.txt: the peak memory allocated by Python and numpy in each stage, and the lines
+      that hold the most memory at the end of the workload, from tracemalloc.
+    * summary.json: the calls, wall time and memory of each stage.
+
+    The cProfile statistics and the memory are only collected for the stages that run in the
+    thread that started the profiler. The stack samples and torch ranges cover every thread.
+    Stages that run in other processes, such as those of a dask process pool, are not seen.
+
+    Parameters
+    ----------
+    output_dir: str
+        The directory to write the profiles to.
+    python: str or None
+        'cprofile' to collect the cProfile statistics of every stage, 'pyinstrument' to profile
+        the whole workload with pyinstrument instead and write pyinstrument.html and
+        pyinstrument.speedscope.json, or None to only sample the call stacks.
+    torch: bool
+        Whether to run the torch.profiler.
+    memory: bool
+        Whether to trace memory allocations with tracemalloc. This slows down code that makes
+        many small Python objects.
+    interval: float
+        The time in seconds between samples of the call stacks.
+    registry: :py:meth:`adam.metrics.MetricsRegistry` or None
+        The registry whose spans mark the stages. Default is :py:meth:`adam.metrics.METRICS`,
+        which is enabled while the profiler runs.
+    top: int
+        The number of torch operators and allocation sites to list.
+    """
+    def __init__(self, output_dir, python='cprofile', torch=True, memory=True, interval=0.005,
+                 registry=None, top=25):
+        if python not in ('cprofile', 'pyinstrument', None):
+            raise ValueError("python must be 'cprofile', 'pyinstrument' or None.")
+        self.output_dir = output_dir
+        self.python = python
+        self.torch = torch
+        self.memory = memory
+        self.interval = interval
+        self.registry = METRICS if registry is None else registry
+        self.top = top
+        self.stages = {}
+        self.wall_time = None
+        self._session = None
+
+    def start(self):
+        """
+        Start profiling.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.stages = {}
+        self._thread_id = threading.get_ident()
+        self._thread_stages = {}
+        self._torch_ranges = {}
+        self._frames = []
+        self._samples = Counter()
+        self._was_enabled = self.registry.enabled
+        self.registry.enabled = True
+        # The torch.profiler starts very slowly while tracemalloc is tracing, so start it first
+        self._torch_profiler = self._start_torch() if self.torch else None
+        self._started_tracemalloc = False
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self._started_tracemalloc = True
+        self._profiles = {}
+        self._pyinstrument = None
+        if self.python == 'cprofile':
+            self._profile_stack = [self._stage_profile(OTHER_STAGE)]
+            self._profile_stack[0].enable()
+        elif self.python == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                raise ImportError("pyinstrument is needed for python='pyinstrument'. Install it with "
+                                  "pip install pyinstrument, or use python='cprofile'.")
+            self._pyinstrument = pyinstrument.Profiler(interval=self.interval)
+            self._pyinstrument.start()
+        self._stop_sampling = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._session = object()
+        self.registry._add_profiler(self)
+        self._start = time.perf_counter()
+        return self
+
+    def stop(self):
+        """
+        Stop profiling and write the profiles to the output directory.
+
+        Returns
+        -------
+        summary: dict
+            The contents of summary.json.
+        """
+        self.wall_time = time.perf_counter() - self._start
+        self.registry._remove_profiler(self)
+        self._session = None
+        self._stop_sampling.set()
+        self._sampler.join()
+        if self.python == 'cprofile':
+            self._profile_stack[-1].disable()
+            self._write_cprofile()
+        elif self._pyinstrument is not None:
+            self._pyinstrument.stop()
+            self._write_pyinstrument()
+        if self.memory:
+            self._write_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        if self._torch_profiler is not None:
+            self._torch_profiler.stop()
+            self._write_torch()
+        self._write_stacks()
+        self.registry.enabled = self._was_enabled
+        summary = dict(wall_time=self.wall_time, samples=sum(self._samples.values()),
+                       stages=self.stages, files=sorted(set(os.listdir(self.output_dir)) | {'summary.json'}))
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        logging.info(f"Wrote the profiles of {len(self.stages)} stages to {self.output_dir}.")
+        return summary
+
+    def enter_stage(self, name):
+        """
+        Called by the spans of the registry when a stage starts.
+
+        Parameters
+        ----------
+        name: str
+            The name of the stage.
+
+        Returns
+        -------
+        stage: tuple or None
+            The stage to pass to :py:meth:`exit_stage` when it ends, or None if the profiler
+            is not running.
+        """
+        session = self._session
+        if session is None:
+            return None
+        thread_id = threading.get_ident()
+        self._thread_stages.setdefault(thread_id, []).append(name)
+        if self._torch_profiler is not None:
+            import torch
+            torch_range = torch.profiler.record_function(name)
+            torch_range.__enter__()
+            self._torch_ranges.setdefault(thread_id, []).append(torch_range)
+        if thread_id != self._thread_id:
+            return session, name
+        frame = dict(name=name, start=time.perf_counter(), memory=0, peak=0)
+        if self.memory:
+            # The peak is reset for each stage, so keep the peak so far for the outer stage
+            frame['memory'], peak = tracemalloc.get_traced_memory()
+            if self._frames:
+                self._frames[-1]['peak'] = max(self._frames[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+        if self.python == 'cprofile':
+            self._profile_stack[-1].disable()
+            self._profile_stack.append(self._stage_profile(name))
+            self._profile_stack[-1].enable()
+        self._frames.append(frame)
+        return session, name
+
+    def exit_stage(self, stage):
+        """
+        Called by the spans of the registry when a stage ends. Stages that started before the
+        profiler was started, or that end after it was stopped, are ignored.
+
+        Parameters
+        ----------
+        stage: tuple or None
+            The stage returned by :py:meth:`enter_stage`.
+        """
+        if stage is None or stage[0] is not self._session:
+            return
+        name = stage[1]
+        thread_id = threading.get_ident()
+        self._thread_stages[thread_id].pop()
+        if self._torch_profiler is not None:
+            self._torch_ranges[thread_id].pop().__exit__(None, None, None)
+        if thread_id != self._thread_id:
+            return
+        if self.python == 'cprofile':
+            self._profile_stack.pop().disable()
+            self._profile_stack[-1].enable()
+        frame = self._frames.pop()
+        stage = self.stages.setdefault(name, dict(calls=0, wall_time=0., memory_peak=0, memory_net=0))
+        stage['calls'] += 1
+        stage['wall_time'] += time.perf_counter() - frame['start']
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame['peak'])
+            stage['memory_peak'] = max(stage['memory_peak'], peak - frame['memory'])
+            stage['memory_net'] += current - frame['memory']
+            if self._frames:
+                self._frames[-1]['peak'] = max(self._frames[-1]['peak'], peak)
+
+    def _stage_profile(self, name):
+        if name not in self._profiles:
+            self._profiles[name] = cProfile.Profile()
+        return self._profiles[name]
+
+    def _start_torch(self):
+        try:
+            import torch
+        except ImportError:
+            logging.warning("torch is not installed, so the torch operators are not profiled.")
+            return None
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        profiler = torch.profiler.profile(activities=activities, record_shapes=True,
+                                          profile_memory=self.memory, with_stack=True)
+        profiler.start()
+        return profiler
+
+    def _sample(self):
+        sampler_id = threading.get_ident()
+        while not self._stop_sampling.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                stages = list(self._thread_stages.get(thread_id, ()))
+                if thread_id == sampler_id or (thread_id != self._thread_id and not stages):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                 f"{code.co_firstlineno})".replace(';', ','))
+                    frame = frame.f_back
+                root = [f"[{stage}]" for stage in stages] if stages else [f"[{OTHER_STAGE}]"]
+                self._samples[';'.join(root + stack[::-1])] += 1
+
+    def _write_stacks(self):
+        with open(os.path.join(self.output_dir, 'stacks.folded'), 'w') as f:
+            for stack, count in sorted(self._samples.items()):
+                f.write(f"{stack} {count}\n")
+
+    def _write_cprofile(self):
+        profiles = [p for p in self._profiles.values() if p.getstats()]
+        for name, profile in self._profiles.items():
+            if profile.getstats():
+                profile.dump_stats(os.path.join(self.output_dir, f"{_file_name(name)}.prof"))
+        if profiles:
+            pstats.Stats(*profiles).dump_stats(os.path.join(self.output_dir, 'all.prof'))
+
+    def _write_pyinstrument(self):
+        from pyinstrument.renderers import SpeedscopeRenderer
+        with open(os.path.join(self.output_dir, 'pyinstrument.html'), 'w') as f:
+            f.write(self._pyinstrument.output_html())
+        with open(os.path.join(self.output_dir, 'pyinstrument.speedscope.json'), 'w') as f:
+            f.write(self._pyinstrument.output(renderer=SpeedscopeRenderer()))
+
+    def _write_torch(self):
+        profiler = self._torch_profiler
+        if len(profiler.events()) == 0:
+            return
+        profiler.export_chrome_trace(os.path.join(self.output_dir, 'torch_trace.json'))
+        with open(os.path.join(self.output_dir, 'torch_ops.txt'), 'w') as f:
+            f.write(profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=self.top))
+        profiler.export_stacks(os.path.join(self.output_dir, 'torch_stacks.folded'), 'self_cpu_time_total')
+
+    def _write_memory(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, __file__)])
+        lines = ["Peak memory allocated in each stage", "",
+                 f"{'stage':<24}{'calls':>8}{'peak MB':>12}{'net MB':>12}"]
+        for name, stage in sorted(self.stages.items(), key=lambda x: -x[1]['memory_peak']):
+            lines.append(f"{name:<24}{stage['calls']:>8}{stage['memory_peak'] / 1e6:>12.2f}"
+                         f"{stage['memory_net'] / 1e6:>12.2f}")
+        lines += ["", f"The {self.top} lines that hold the most memory at the end", ""]
+        lines += [str(stat) for stat in snapshot.statistics('lineno')[:self.top]]
+        with open(os.path.join(self.output_dir, 'memory.txt'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def __enter__(self): return self.start()
+    def __exit__(self, exc_type, exc_val, exc_tb): self.stop()
+
+
+def profile(output_dir, python='cprofile', torch=True, memory=True, interval=0.005):
+    """
+    Profile a workload stage by stage with cProfile or pyinstrument, the torch.profiler and
+    tracemalloc, and write flamegraph-ready call stacks and a memory summary of each stage.
+    See :py:meth:`adam.metrics.Profiler` for the files that are written.
+
+    Parameters
+    ----------
+    output_dir: str
+        The directory to write the profiles to.
+    python: str or None
+        'cprofile', 'pyinstrument', or None to only sample the call stacks.
+    torch: bool
+        Whether to run the torch.profiler.
+    memory: bool
+        Whether to trace memory allocations with tracemalloc.
+    interval: float
+        The time in seconds between samples of the call stacks.
+
+    Returns
+    -------
+    profiler: :py:meth:`adam.metrics.Profiler`
+        The profiler, to use as a context manager.
+    """
+    return Profiler(output_dir, python=python, torch=torch, memory=memory, interval=interval)
+
+
+def _file_name(stage):
+    return re.sub(r'[^\w.-]', '_', stage)
@@ -12,5 +12,18 @@ This module handles the inference of lake breeze location from radar data.
 
     infer_lake_breeze
     infer_lake_breeze_batch
+    infer_lake_breeze_sites
+    infer_lake_breeze_scan
+    InferenceCache
+    ImageNormalization
+    ModelServer
+    ModelClient
 """
-from .predict_lake_breeze import infer_lake_breeze, infer_lake_breeze_batch
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, attributes={
+    'predict_lake_breeze': ['infer_lake_breeze', 'infer_lake_breeze_batch', 'infer_lake_breeze_sites',
+                            'infer_lake_breeze_scan', 'ImageNormalization'],
+    'inference_cache': ['InferenceCache'],
+    'server': ['ModelServer', 'ModelClient'],
+})
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+from collections import OrderedDict
+
+from ..io.get_radar_scan import RENDERER_VERSION
+from ..metrics import inc
+
+
+class InferenceCache(object):
+    """
+    A cache of the lake breeze masks inferred from radar scans, so that repeated requests for the
+    mask of the same scan, domain and model skip the download, the preprocessing and the model.
+    Pass it as the cache of :py:meth:`adam.model.infer_lake_breeze` and the other inference functions.
+
+    The masks are kept bit-packed in memory, about 8 kB for a 256 x 256 mask, and the least
+    recently used masks are evicted once max_entries is reached. With a path, the masks are also
+    written to disk, so that they survive restarts and can be shared between processes.
+
+    Parameters
+    ----------
+    max_entries: int
+        The maximum number of masks to keep in memory.
+    path: str or None
+        A directory to also keep the masks in. Masks that have been evicted from memory are
+        reloaded from here. Nothing is ever removed from the directory except by
+        :py:meth:`InferenceCache.clear`.
+    """
+    def __init__(self, max_entries=1024, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(source, lat_range, lon_range, model_name, area_threshold):
+        """
+        Make the key of a mask.
+
+        Parameters
+        ----------
+        source: str
+            The S3 URL of the radar volume, or another key from :py:meth:`adam.io.source_key`.
+        lat_range, lon_range: 2-tuples of floats
+            The domain of the mask.
+        model_name: str
+            The model that inferred the mask.
+        area_threshold: int
+            The area threshold of the speckle filter.
+
+        Returns
+        -------
+        key: str
+            The key, which also includes :py:data:`adam.io.RENDERER_VERSION`.
+        """
+        payload = json.dumps([source, [float(x) for x in lat_range], [float(x) for x in lon_range],
+                              RENDERER_VERSION, model_name, int(area_threshold)])
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a mask.
+
+        Parameters
+        ----------
+        key: str
+            The key from :py:meth:`InferenceCache.key`.
+
+        Returns
+        -------
+        entry: tuple or None
+            The mask and the time of the radar scan as a string, or None if the mask is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.path is not None:
+            entry = self._load(key)
+            if entry is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._insert(key, entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        inc('inference_cache', result='miss' if entry is None else 'hit')
+        if entry is None:
+            return None
+        bits, shape, dtype, time = entry
+        mask = np.unpackbits(bits, count=int(np.prod(shape))).reshape(shape).astype(dtype)
+        return mask, time
+
+    def put(self, key, mask, time=None):
+        """
+        Add a mask.
+
+        Parameters
+        ----------
+        key: str
+            The key from :py:meth:`InferenceCache.key`.
+        mask: ndarray
+            The filtered lake breeze mask, where 1 = lakebreeze and 0 = not a lake breeze.
+        time: str or np.datetime64 or None
+            The time of the radar scan.
+        """
+        mask = np.asarray(mask)
+        entry = (np.packbits(mask != 0), mask.shape, mask.dtype.str, None if time is None else str(time))
+        with self._lock:
+            self._insert(key, entry)
+        if self.path is not None:
+            self._save(key, entry)
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of lookups that found a mask.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def stats(self):
+        """
+        Get the statistics of the cache.
+
+        Returns
+        -------
+        stats: dict
+            The hits, misses, hits from disk, hit rate, the number of masks in memory and
+            the bytes that they take.
+        """
+        with self._lock:
+            nbytes = sum(entry[0].nbytes for entry in self._entries.values())
+            return dict(hits=self.hits, misses=self.misses, disk_hits=self.disk_hits,
+                        hit_rate=self.hit_rate, entries=len(self._entries), nbytes=nbytes)
+
+    def clear(self, disk=False):
+        """
+        Drop the masks in memory and reset the statistics.
+
+        Parameters
+        ----------
+        disk: bool
+            If True, also remove the masks on disk.
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+            self.hits = self.misses = self.disk_hits = 0
+        if disk and self.path is not None:
+            for name in os.listdir(self.path):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.path, name))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or (
+            self.path is not None and os.path.exists(self._file(key)))
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.npz")
+
+    def _save(self, key, entry):
+        bits, shape, dtype, time = entry
+        tmp_file = self._file(key) + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, bits=bits, shape=np.array(shape), dtype=dtype, time='' if time is None else time)
+        os.replace(tmp_file, self._file(key))
+
+    def _load(self, key):
+        try:
+            with np.load(self._file(key)) as data:
+                time = str(data['time'])
+                return (data['bits'], tuple(int(x) for x in data['shape']), str(data['dtype']),
+                        time if time else None)
+        except (OSError, KeyError, ValueError):
+            return None
@@ -5,9 +5,13 @@ from huggingface_hub import hf_hub_download
 from torch.nn import Identity 
 from torchvision.models.segmentation import fcn_resnet50
 from safetensors.torch import load_model
-from scipy.ndimage import label
+from functools import lru_cache
 
 from ..io import RadarImage
+from ..io.get_radar_scan import IMAGE_MEAN, IMAGE_STD
+from ..io.sources import source_key
+from ..util.mask_filters import filter_speckles
+from ..metrics import span
 
 # Identity layer needed for the lake-breeze detector model
 class Identity(torch.nn.Module):
@@ -17,10 +21,49 @@ class Identity(torch.nn.Module):
     def forward(self, x):
         return x
 
+class ImageNormalization(torch.nn.Module):
+    """
+    The first layer of the lake breeze models. It applies the ImageNet normalization to uint8 RGB
+    images from :py:meth:`adam.io.preprocess_radar_image` with dtype='uint8', with the same
+    float32 arithmetic as the preprocessing, so the masks are identical to those of float32 images.
+    Float images are taken to be normalized already and are passed through.
+    """
+    def __init__(self, mean=IMAGE_MEAN, std=IMAGE_STD):
+        super(ImageNormalization, self).__init__()
+        # Not part of the state dict, so the weights files load as before
+        self.register_buffer('mean', torch.tensor(mean, dtype=torch.float32).view(1, -1, 1, 1), persistent=False)
+        self.register_buffer('std', torch.tensor(std, dtype=torch.float32).view(1, -1, 1, 1), persistent=False)
+
+    def forward(self, x):
+        if x.is_floating_point():
+            return x
+        return (x.float() - self.mean) / self.std
+
+class LakeBreezeModel(torch.nn.Module):
+    """
+    A segmentation network with :py:meth:`ImageNormalization` in front of it, so that it takes
+    either normalized float32 images or uint8 RGB images. Only uint8 images are moved to the
+    device, which is a quarter of the bytes.
+
+    Parameters
+    ----------
+    network: :py:meth:`torch.nn.Module`
+        The segmentation network, which takes normalized images.
+    """
+    def __init__(self, network):
+        super(LakeBreezeModel, self).__init__()
+        self.normalize = ImageNormalization()
+        self.network = network
+
+    def forward(self, x):
+        return self.network(self.normalize(x))
+
 def infer_lake_breeze(radar_scan: RadarImage,
                     model_name='lakebreeze_model_fcn_resnet50_no_augmentation',
                     device='cpu',
-                    area_threshold=20):
+                    area_threshold=20,
+                    cache=None,
+                    server=None):
     """
     This module will infer the location of the lake breeze from a radar image.
 
@@ -41,56 +84,40 @@ def infer_lake_breeze(radar_scan: RadarImage,
     area_threshold: int
         The minimum continuous area in pixels for lake breeze segments. This helps
         remove false positive speckles that are identified by the model.
+    cache: :py:meth:`adam.model.InferenceCache` or None
+        If set, the mask is taken from the cache when the same scan has already been run
+        through the same model on the same domain, and added to the cache otherwise.
+    server: str or :py:meth:`adam.model.ModelClient` or None
+        If set, the image is sent to this :py:meth:`adam.model.ModelServer` instead of being run
+        through a model loaded in this process. A string is the address of the server. The
+        device is then chosen by the server.
 
     Returns
     -------
     radar_scan: :py:meth:`RadarImage`
         The RadarImage with the lake breeze mask.
     """ 
+    key = None
+    if cache is not None:
+        key = _cache_keys(cache, radar_scan, 1, model_name, area_threshold)[0]
+        cached = cache.get(key) if key is not None else None
+        if cached is not None:
+            radar_scan.lakebreeze_mask = cached[0]
+            return radar_scan
 
-    if model_name == 'lakebreeze_model_fcn_resnet50_no_augmentation':
-        model = fcn_resnet50(num_classes=2)
-    elif model_name == 'lakebreeze_best_model_fcn_resnet50':
-        model = fcn_resnet50(weights='FCN_ResNet50_Weights.COCO_WITH_VOC_LABELS_V1')
-        in_channels = 2048
-        inter_channels = 512
-        channels = 2
-        fcn_new_last_layer = torch.nn.Sequential(
-            torch.nn.Conv2d(in_channels, inter_channels, 3, padding=1, bias=False),
-            torch.nn.BatchNorm2d(inter_channels),
-            torch.nn.ReLU(),
-            torch.nn.Dropout(0.1),
-            torch.nn.Conv2d(inter_channels, channels, 1),
-        )
-        model.classifier = fcn_new_last_layer
-        model.aux_classifier = Identity()
+    if server is not None:
+        radar_scan.lakebreeze_mask = _client(server).infer(radar_scan.pytorch_image, model_name, area_threshold)[0]
     else:
-        raise ValueError(f"{model_name} is not a valid model.")
-
-    state_dict = hf_hub_download(repo_id="rcjackson/lakebreeze-resnet50",
-            filename=f"{model_name}.safetensors")
-    load_model(model, state_dict)
-    image = radar_scan.pytorch_image.to(device)
-    model = model.to(device)
-    mask = model(image)['out'].detach().numpy()
-    mask = mask[0].argmax(axis=0)
-    mask = mask.T
-
-    # Filter out small regions that are not lake breezes
-    labels, num_features = label(mask)
-    largest_area = -99999
-    for i in range(num_features):
-        area = mask[labels == i+1].sum()
-        if area > largest_area:
-            largest_area = area
-        if area < area_threshold:
-            mask[labels == i+1] = 0
-    radar_scan.lakebreeze_mask = mask
+        mask = _predict_masks(radar_scan.pytorch_image, model_name, device)[0]
+        # Filter out small regions that are not lake breezes
+        radar_scan.lakebreeze_mask = filter_speckles(mask, area_threshold)
+    if key is not None:
+        cache.put(key, radar_scan.lakebreeze_mask, time=_frame_time(radar_scan, 0))
     return radar_scan
 
 def infer_lake_breeze_batch(radar_list,
                             model_name='lakebreeze_best_model_fcn_resnet50',
-                            area_threshold=20):
+                            area_threshold=20, device='cpu', cache=None, server=None):
     """
     This module will infer the location of the lake breeze from a batch of radar images.
 
@@ -109,16 +136,230 @@ def infer_lake_breeze_batch(radar_list,
     area_threshold: int
         The minimum continuous area in pixels for lake breeze segments. This helps
         remove false positive speckles that are identified by the model.
+    device: str
+        The device to run the model on. Default is 'cpu'. Use 'cuda' for GPU inference.
+    cache: :py:meth:`adam.model.InferenceCache` or None
+        If set, only the frames that are not in the cache are run through the model, and
+        their masks are added to the cache.
+    server: str or :py:meth:`adam.model.ModelClient` or None
+        If set, the images are sent to this :py:meth:`adam.model.ModelServer`. See
+        :py:meth:`infer_lake_breeze`.
 
     Returns
     -------
     radar_scan: list of :py:meth:`RadarImage`
         The RadarImages with the lake breeze mask.
     """ 
+    n_frames = len(radar_list) if isinstance(radar_list, list) else len(radar_list.pytorch_image)
+    keys = [None] * n_frames
+    if cache is not None and isinstance(radar_list, list):
+        keys = [_cache_keys(cache, x, 1, model_name, area_threshold)[0] for x in radar_list]
+    elif cache is not None:
+        keys = _cache_keys(cache, radar_list, n_frames, model_name, area_threshold)
+    cached = [cache.get(key) if key is not None else None for key in keys]
+    todo = [i for i in range(n_frames) if cached[i] is None]
+
+    if len(todo) > 0:
+        if isinstance(radar_list, list):
+            image = torch.concat([radar_list[i].pytorch_image for i in todo], axis=0)
+        elif len(todo) == n_frames:
+            image = radar_list.pytorch_image
+        else:
+            image = radar_list.pytorch_image[todo]
+
+        if server is not None:
+            mask = _client(server).infer(image, model_name, area_threshold)
+        else:
+            # Filter out small regions that are not lake breezes
+            mask = filter_speckles(_predict_masks(image, model_name, device), area_threshold)
+        for j, i in enumerate(todo):
+            if keys[i] is None:
+                continue
+            if isinstance(radar_list, list):
+                cache.put(keys[i], mask[j], time=_frame_time(radar_list[i], 0))
+            else:
+                cache.put(keys[i], mask[j], time=_frame_time(radar_list, i))
+    if len(todo) < n_frames:
+        computed = dict(zip(todo, mask)) if len(todo) > 0 else {}
+        mask = np.stack([computed[i] if cached[i] is None else cached[i][0] for i in range(n_frames)])
+    if isinstance(radar_list, list):
+        for i in range(len(radar_list)):
+            radar_list[i].lakebreeze_mask = mask[i]
+    if isinstance(radar_list, RadarImage):
+        radar_list.lakebreeze_mask = mask
+    return radar_list
+
+
+def infer_lake_breeze_sites(site_images,
+                            model_name='lakebreeze_best_model_fcn_resnet50',
+                            device='cpu',
+                            area_threshold=20,
+                            cache=None,
+                            server=None):
+    """
+    This module will infer the location of the lake breeze for several radar sites at once.
+    All of the sites' images are run through the model in one batched forward pass.
+
+    Parameters
+    ----------
+    site_images: dict of :py:meth:`RadarImage`
+        The RadarImages keyed by radar code, as returned by :py:meth:`adam.io.preprocess_radar_sites`.
+    model_name: str
+        The model to use. See :py:meth:`infer_lake_breeze` for the available models.
+    device: str
+        The device to run the model on. Default is 'cpu'. Use 'cuda' for GPU inference.
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments. This helps
+        remove false positive speckles that are identified by the model.
+    cache: :py:meth:`adam.model.InferenceCache` or None
+        If set, only the sites whose scans are not in the cache are run through the model.
+    server: str or :py:meth:`adam.model.ModelClient` or None
+        If set, the images are sent to this :py:meth:`adam.model.ModelServer`.
+
+    Returns
+    -------
+    site_images: dict of :py:meth:`RadarImage`
+        The RadarImages with the lake breeze mask.
+    """
+    infer_lake_breeze_batch(list(site_images.values()), model_name=model_name,
+                            area_threshold=area_threshold, device=device, cache=cache, server=server)
+    return site_images
+
+
+def infer_lake_breeze_scan(radar, rad_time=None, lat_range=(41.1280, 42.5680),
+                           lon_range=(-88.7176, -87.2873),
+                           model_name='lakebreeze_model_fcn_resnet50_no_augmentation',
+                           device='cpu', area_threshold=20, bucket_name='unidata-nexrad-level2',
+                           partial_download=False, cache=None, dtype='float32', server=None):
+    """
+    This module will fetch and preprocess a radar scan and infer the location of the lake breeze
+    from it. With a cache, the scan is looked up before it is downloaded, so a repeated request
+    for the same scan only lists the archive bucket.
+
+    Parameters
+    ----------
+    radar: str or :py:meth:`pyart.core.Radar`
+        The 4-letter code of the radar, the path or S3 URL of a radar volume, or a radar object.
+    rad_time: ISO-format datestring
+        The date/time string in YYYY-MM-DDTHH:MM:SS format for the radar scan. If None, then ADAM will
+        get the latest scan. Only used with a radar code.
+    lat_range: 2-tuple of floats
+        The minimum and maximum latitude of the domain in degrees.
+    lon_range: 2-tuple of floats
+        The minimum and maximum longitude of the domain in degrees.
+    model_name: str
+        The model to use. See :py:meth:`infer_lake_breeze` for the available models.
+    device: str
+        The device to run the model on. Default is 'cpu'. Use 'cuda' for GPU inference.
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments.
+    bucket_name: str
+        The NEXRAD S3 bucket to use. Default is 'unidata-nexrad-level2'.
+    partial_download: bool
+        If True, only download the lowest sweep of the volume with HTTP range requests.
+    cache: :py:meth:`adam.model.InferenceCache` or None
+        The cache to look the mask up in and add it to.
+    dtype: str
+        The dtype of the preprocessed image, 'float32' or 'uint8'. See
+        :py:meth:`adam.io.preprocess_radar_image`.
+    server: str or :py:meth:`adam.model.ModelClient` or None
+        If set, the image is sent to this :py:meth:`adam.model.ModelServer`.
+
+    Returns
+    -------
+    radar_scan: :py:meth:`RadarImage`
+        The RadarImage with the lake breeze mask. When the mask comes from the cache, the
+        RadarImage has the grid, the mask and the time, but no radar object or preprocessed image.
+    """
+    from ..io.get_radar_scan import (preprocess_radar_image, IMAGE_SHAPE, _find_nexrad_scan,
+                                     _grid_radar_image, _is_volume_path)
+
+    if isinstance(radar, str) and not _is_volume_path(radar):
+        radar = _find_nexrad_scan(radar, rad_time, bucket_name)
+    key = None
+    if cache is not None:
+        source = source_key(radar)
+        key = cache.key(source, lat_range, lon_range, model_name, area_threshold)
+        cached = cache.get(key)
+        if cached is not None:
+            radar_scan = _grid_radar_image(lat_range, lon_range, IMAGE_SHAPE)
+            radar_scan.source = source
+            radar_scan.lakebreeze_mask, time = cached
+            radar_scan.times = None if time is None else [np.datetime64(time)]
+            return radar_scan
+
+    radar_scan = preprocess_radar_image(radar, lat_range=lat_range, lon_range=lon_range,
+                                        partial_download=partial_download, dtype=dtype)
+    radar_scan = infer_lake_breeze(radar_scan, model_name=model_name, device=device,
+                                   area_threshold=area_threshold, server=server)
+    if key is not None:
+        radar_scan.source = source
+        cache.put(key, radar_scan.lakebreeze_mask, time=_frame_time(radar_scan, 0))
+    return radar_scan
+
+
+def _cache_keys(cache, radar_scan, n_frames, model_name, area_threshold):
+    # The cache key of each frame, or None for frames whose source is unknown
+    sources = radar_scan.source
+    if sources is None:
+        radars = radar_scan.pyart_object
+        if n_frames == 1 and not isinstance(radars, (list, tuple)):
+            radars = [radars]
+        if radars is None or len(radars) != n_frames:
+            return [None] * n_frames
+        sources = [None if x is None else source_key(x) for x in radars]
+        # Hashing a volume is not free, so remember the sources
+        radar_scan.source = sources if isinstance(radar_scan.pyart_object, (list, tuple)) else sources[0]
+    if isinstance(sources, str):
+        sources = [sources]
+    if len(sources) != n_frames:
+        return [None] * n_frames
+    return [None if x is None else cache.key(x, radar_scan.lat_range, radar_scan.lon_range,
+                                             model_name, area_threshold) for x in sources]
+
+
+def _predict_masks(image, model_name, device='cpu'):
+    # The unfiltered masks of a batch of images, with shape (N, lon, lat)
+    model = _load_model(model_name, device)
+    with torch.no_grad(), span('forward', model=model_name):
+        mask = model(image.to(device))['out'].cpu().numpy()
+    mask = mask.argmax(axis=1)
+    return np.transpose(mask, [0, 2, 1])
+
+
+def _client(server):
+    from .server import ModelClient
+    return server if isinstance(server, ModelClient) else ModelClient(server)
+
+
+def _frame_time(radar_scan, index):
+    times = radar_scan.times
+    if times is None or len(times) <= index:
+        return None
+    return str(times[index])
+
+
+@lru_cache(maxsize=None)
+def _load_model(model_name, device='cpu'):
+    # Only the first call for each model is timed, the rest come from the cache
+    with span('model_load', model=model_name):
+        model = _build_model(model_name)
+        state_dict = hf_hub_download(repo_id="rcjackson/lakebreeze-resnet50",
+                filename=f"{model_name}.safetensors")
+        load_model(model.network, state_dict)
+        # Inference only: BatchNorm uses its running statistics and Dropout is off, so each
+        # image's mask does not depend on the other images in the batch
+        return model.eval().to(device)
+
+
+def _build_model(model_name):
+    # The architecture of each model, with random weights, behind the normalization layer
     if model_name == 'lakebreeze_model_fcn_resnet50_no_augmentation':
-        model = fcn_resnet50(num_classes=2)
+        model = fcn_resnet50(num_classes=2, weights=None, weights_backbone=None)
     elif model_name == 'lakebreeze_best_model_fcn_resnet50':
-        model = fcn_resnet50(weights='FCN_ResNet50_Weights.COCO_WITH_VOC_LABELS_V1')
+        # All of the weights are loaded from the safetensors file, so there is no need
+        # to download the pretrained COCO weights first.
+        model = fcn_resnet50(weights=None, weights_backbone=None, aux_loss=True)
         in_channels = 2048
         inter_channels = 512
         channels = 2
@@ -133,35 +374,4 @@ def infer_lake_breeze_batch(radar_list,
         model.aux_classifier = Identity()
     else:
         raise ValueError(f"{model_name} is not a valid model.")
-    state_dict = hf_hub_download(repo_id="rcjackson/lakebreeze-resnet50",
-            filename=f"{model_name}.safetensors")
-    load_model(model, state_dict)
-
-    if isinstance(radar_list, list):
-        image = torch.concat([x.pytorch_image for x in radar_list], axis=0)
-    elif isinstance(radar_list, RadarImage):
-        image = radar_list.pytorch_image
-
-    mask = model(image)['out'].detach().numpy()
-    mask = mask.argmax(axis=1)
-    mask = np.transpose(mask, [0, 2, 1])
-
-    # Filter out small regions that are not lake breezes
-    if isinstance(radar_list, list):
-        nsamples = len(radar_list)
-    else:
-        nsamples = mask.shape[0]
-    for i in range(nsamples):
-        labels, num_features = label(mask)
-        largest_area = -99999
-        for j in range(num_features):
-            area = mask[labels == j+1].sum()
-            if area > largest_area:
-                largest_area = area
-            if area < area_threshold:
-                mask[labels == j+1] = 0
-        if isinstance(radar_list, list):
-            radar_list[i].lakebreeze_mask = mask[i]
-    if isinstance(radar_list, RadarImage):
-        radar_list.lakebreeze_mask = mask
-    return radar_list
+    return LakeBreezeModel(model)
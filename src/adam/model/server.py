@@ -0,0 +1,462 @@
+import argparse
+import errno
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+import time
+import numpy as np
+import torch
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..io.get_radar_scan import IMAGE_SHAPE
+from ..util.mask_filters import filter_speckles
+from ..metrics import inc
+from . import predict_lake_breeze
+
+# The Unix socket that the server listens on and the clients connect to by default
+DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), 'adam-model-server.sock')
+
+_DTYPES = {'uint8': torch.uint8, 'float32': torch.float32}
+
+
+class _Request(object):
+    __slots__ = ['image', 'model_name', 'area_threshold', 'done', 'masks', 'error']
+
+    def __init__(self, image, model_name, area_threshold):
+        self.image = image
+        self.model_name = model_name
+        self.area_threshold = area_threshold
+        self.done = threading.Event()
+        self.masks = None
+        self.error = None
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ModelServer(object):
+    """
+    A local inference server that keeps the lake breeze models loaded in one process, so that the
+    real-time monitor, plugins and notebooks on a node can share one copy of each model instead
+    of each loading their own. Clients send preprocessed images with :py:meth:`ModelClient.infer`
+    or with the server option of :py:meth:`adam.model.infer_lake_breeze`, and get the filtered
+    lake breeze masks back.
+
+    Requests that arrive within max_wait seconds of each other are run through the model in one
+    batch, so that concurrent clients share the forward passes. The images may be uint8 or
+    normalized float32, see :py:meth:`adam.io.preprocess_radar_image`; uint8 images are a quarter
+    of the bytes to send.
+
+    Parameters
+    ----------
+    address: str or 2-tuple
+        The path of the Unix socket to listen on, or the (host, port) or 'http://host:port' to
+        listen on over TCP. Use port 0 for a free port. A socket file at the path is replaced only
+        if no server accepts connections on it; otherwise an OSError is raised.
+    device: str
+        The device to run the models on.
+    max_batch_size: int
+        The most images to run through the model at once.
+    max_wait: float
+        How long in seconds to wait for more requests to batch with the first one.
+    models: list of str or None
+        The models to load when the server starts. Other models are loaded on their first request.
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, device='cpu', max_batch_size=16, max_wait=0.01,
+                 models=None):
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.models = list(models) if models is not None else []
+        self.requests = 0
+        self.batches = 0
+        self.images = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._thread = None
+        host_port = _parse_address(address)
+        if host_port is None:
+            _remove_stale_socket(address)
+            self._socket_path = address
+            self._server = _UnixHTTPServer(address, self._make_handler())
+        else:
+            self._socket_path = None
+            self._server = ThreadingHTTPServer(host_port, self._make_handler())
+            self._server.daemon_threads = True
+
+    @property
+    def address(self):
+        """
+        The address that clients connect to.
+        """
+        if self._socket_path is not None:
+            return self._socket_path
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Load the models and serve requests from background threads.
+
+        Returns
+        -------
+        server: :py:meth:`ModelServer`
+            The server.
+        """
+        self._start_worker()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Load the models and serve requests until the process is interrupted.
+        """
+        self._start_worker()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close()
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._close()
+
+    def stats(self):
+        """
+        Get the statistics of the server.
+
+        Returns
+        -------
+        stats: dict
+            The number of requests, batches and images served, the mean batch size in images,
+            and the models that are loaded.
+        """
+        with self._lock:
+            return dict(requests=self.requests, batches=self.batches, images=self.images,
+                        mean_batch_size=self.images / self.batches if self.batches else 0.,
+                        models=list(self.models), device=self.device)
+
+    def _start_worker(self):
+        for model_name in self.models:
+            predict_lake_breeze._load_model(model_name, self.device)
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _close(self):
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+        self._server.server_close()
+        if self._socket_path is not None and os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+
+    def submit(self, image, model_name, area_threshold=20):
+        """
+        Run images through a model in the next batch, and wait for the masks.
+
+        Parameters
+        ----------
+        image: :py:meth:`torch.Tensor`
+            The (N, 3, 256, 256) uint8 or normalized float32 images.
+        model_name: str
+            The model to use.
+        area_threshold: int
+            The minimum continuous area in pixels for lake breeze segments.
+
+        Returns
+        -------
+        masks: (N, 256, 256) ndarray
+            The filtered lake breeze masks.
+        """
+        request = _Request(image, model_name, area_threshold)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.masks
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            n_images = len(request.image)
+            deadline = time.perf_counter() + self.max_wait
+            stopping = False
+            while n_images < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                n_images += len(request.image)
+            self._process(batch)
+            if stopping:
+                return
+
+    def _process(self, batch):
+        # Images for different models, or of different dtypes, go through separate forward passes
+        groups = {}
+        for request in batch:
+            groups.setdefault((request.model_name, request.image.dtype), []).append(request)
+        for (model_name, _), requests in groups.items():
+            n_images = sum(len(x.image) for x in requests)
+            try:
+                image = torch.concat([x.image for x in requests], axis=0)
+                masks = predict_lake_breeze._predict_masks(image, model_name, self.device)
+                start = 0
+                for request in requests:
+                    stop = start + len(request.image)
+                    request.masks = filter_speckles(masks[start:stop], request.area_threshold)
+                    start = stop
+            except Exception as e:
+                for request in requests:
+                    request.error = e
+            with self._lock:
+                self.batches += 1
+                self.requests += len(requests)
+                self.images += n_images
+                if model_name not in self.models and requests[0].error is None:
+                    self.models.append(model_name)
+            inc('server_batches', model=model_name)
+            inc('server_images', n_images, model=model_name)
+            for request in requests:
+                request.done.set()
+
+    def _make_handler(self):
+        server = self
+
+        class ModelRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/health':
+                    self._send(404, b'Not found', 'text/plain')
+                    return
+                self._send(200, json.dumps(server.stats()).encode(), 'application/json')
+
+            def do_POST(self):
+                if self.path != '/infer':
+                    self._send(404, b'Not found', 'text/plain')
+                    return
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    image = _decode_image(body, self.headers)
+                    model_name = self.headers['X-Model']
+                    area_threshold = int(self.headers.get('X-Area-Threshold', 20))
+                except (KeyError, TypeError, ValueError) as e:
+                    self._send(400, str(e).encode(), 'text/plain')
+                    return
+                try:
+                    masks = server.submit(image, model_name, area_threshold)
+                except ValueError as e:
+                    self._send(400, str(e).encode(), 'text/plain')
+                    return
+                except Exception as e:
+                    logging.exception("Inference failed.")
+                    self._send(500, f"{type(e).__name__}: {e}".encode(), 'text/plain')
+                    return
+                self._send(200, masks.astype(np.uint8).tobytes(), 'application/octet-stream',
+                           {'X-Shape': ','.join(str(x) for x in masks.shape)})
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def address_string(self):
+                # Clients of a Unix socket have no address
+                return self.client_address[0] if self.client_address else server.address
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        return ModelRequestHandler
+
+    def __enter__(self): return self.start()
+    def __exit__(self, exc_type, exc_val, exc_tb): self.stop()
+
+
+class ModelClient(object):
+    """
+    Sends images to a :py:meth:`ModelServer` and returns the lake breeze masks. Pass it, or the
+    address of the server, as the server of :py:meth:`adam.model.infer_lake_breeze`.
+
+    Parameters
+    ----------
+    address: str or 2-tuple
+        The path of the Unix socket of the server, or its (host, port) or 'http://host:port'.
+    timeout: float
+        The time in seconds to wait for the masks.
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=120.):
+        self.address = address
+        self.timeout = timeout
+
+    def infer(self, image, model_name='lakebreeze_model_fcn_resnet50_no_augmentation', area_threshold=20):
+        """
+        Infer the lake breeze masks of preprocessed images.
+
+        Parameters
+        ----------
+        image: :py:meth:`torch.Tensor`
+            The (N, 3, 256, 256) uint8 or normalized float32 images, such as the pytorch_image
+            of a :py:meth:`adam.io.RadarImage`.
+        model_name: str
+            The model to use. See :py:meth:`adam.model.infer_lake_breeze` for the available models.
+        area_threshold: int
+            The minimum continuous area in pixels for lake breeze segments.
+
+        Returns
+        -------
+        masks: (N, 256, 256) ndarray
+            The filtered lake breeze masks, where 1 = lakebreeze and 0 = not a lake breeze.
+        """
+        image = image.detach().cpu().contiguous()
+        dtype = {v: k for k, v in _DTYPES.items()}.get(image.dtype)
+        if dtype is None:
+            raise ValueError(f"The images must be uint8 or float32, got {image.dtype}.")
+        headers = {'Content-Type': 'application/octet-stream', 'X-Model': model_name,
+                   'X-Dtype': dtype, 'X-Shape': ','.join(str(x) for x in image.shape),
+                   'X-Area-Threshold': str(int(area_threshold))}
+        status, response_headers, body = self._request('POST', '/infer', image.numpy().tobytes(), headers)
+        if status == 400:
+            raise ValueError(body.decode())
+        if status != 200:
+            raise RuntimeError(f"The model server failed: {body.decode()}")
+        shape = tuple(int(x) for x in response_headers['X-Shape'].split(','))
+        return np.frombuffer(body, dtype=np.uint8).reshape(shape).astype(np.int64)
+
+    def health(self):
+        """
+        Get the statistics of the server, see :py:meth:`ModelServer.stats`.
+        """
+        status, _, body = self._request('GET', '/health')
+        if status != 200:
+            raise RuntimeError(f"The model server failed: {body.decode()}")
+        return json.loads(body)
+
+    def _request(self, method, path, body=None, headers=None):
+        host_port = _parse_address(self.address)
+        if host_port is None:
+            connection = _UnixHTTPConnection(self.address, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(*host_port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, response.headers, response.read()
+        finally:
+            connection.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def _remove_stale_socket(path):
+    # Remove a socket file left behind by a server that did not shut down cleanly. Any other file,
+    # or a socket that a running server still accepts connections on, is left where it is
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if stat.S_ISSOCK(mode):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)
+            return
+        finally:
+            probe.close()
+    raise OSError(errno.EADDRINUSE, f"Address already in use: {path}")
+
+
+def _parse_address(address):
+    # (host, port) for TCP addresses, or None for the path of a Unix socket
+    if isinstance(address, (tuple, list)):
+        return address[0], int(address[1])
+    if address.startswith('http://'):
+        host, _, port = address[len('http://'):].rstrip('/').rpartition(':')
+        return host, int(port)
+    return None
+
+
+def _decode_image(body, headers):
+    dtype = _DTYPES.get(headers.get('X-Dtype'))
+    if dtype is None:
+        raise ValueError(f"The images must be uint8 or float32, got {headers.get('X-Dtype')}.")
+    shape = tuple(int(x) for x in headers['X-Shape'].split(','))
+    if len(shape) != 4 or shape[1:] != IMAGE_SHAPE:
+        raise ValueError(f"The images must have shape (N,) + {IMAGE_SHAPE}, got {shape}.")
+    if len(body) != int(np.prod(shape)) * dtype.itemsize:
+        raise ValueError(f"Got {len(body)} bytes for images of shape {shape}.")
+    return torch.frombuffer(bytearray(body), dtype=dtype).view(shape)
+
+
+def main(args=None):
+    """
+    The entry point of the adam-model-server command.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve the lake breeze models to the ADAM processes on this node.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS,
+                        help="The path of the Unix socket to listen on, or http://host:port to listen on TCP.")
+    parser.add_argument("--device", default="cpu", help="The device to run the models on.")
+    parser.add_argument("--model", action="append", default=None,
+                        help="A model to load on startup. Can be given more than once.")
+    parser.add_argument("--max-batch-size", type=int, default=16, help="The most images per forward pass.")
+    parser.add_argument("--max-wait", type=float, default=0.01,
+                        help="Seconds to wait for more requests to batch with the first one.")
+    parser.add_argument("--log-level", default="INFO", help="The logging level.")
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(message)s")
+    models = args.model if args.model is not None else ['lakebreeze_model_fcn_resnet50_no_augmentation']
+    server = ModelServer(args.address, device=args.device, max_batch_size=args.max_batch_size,
+                         max_wait=args.max_wait, models=models)
+    logging.info(f"Serving {', '.join(models)} on {server.address}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping the model server.")
+    logging.info(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    main()
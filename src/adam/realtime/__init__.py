@@ -0,0 +1,22 @@
+"""
+============================
+adam.realtime (adam.realtime)
+============================
+
+.. currentmodule:: adam.realtime
+
+This module handles the real-time monitoring of radar data and triggering of instruments.
+It provides the adam-monitor command.
+
+.. autosummary::
+    :toctree: generated/
+
+    LakeBreezeMonitor
+    S3ScanSource
+    DirectoryScanSource
+"""
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, attributes={
+    'monitor': ['LakeBreezeMonitor', 'S3ScanSource', 'DirectoryScanSource'],
+})
@@ -0,0 +1,472 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import time
+import boto3
+import numpy as np
+import paramiko
+import pyart
+
+from datetime import datetime, timedelta, timezone
+from glob import glob
+from botocore import UNSIGNED
+from botocore.config import Config
+
+from .. import metrics
+from ..io import NexradChunkSource, get_site, preprocess_radar_image
+from ..model import infer_lake_breeze
+from ..model.predict_lake_breeze import _load_model
+from ..triggering import SSHConnectionPool, TriggerState, dispatch_triggers, lidar_name
+from ..vis.quicklook import QuickLookRenderer
+
+
+class S3ScanSource(object):
+    """
+    Polls the NEXRAD Level II archive bucket for new volumes from one radar.
+
+    Parameters
+    ----------
+    radar: str
+        The 4-letter code of the radar.
+    bucket_name: str
+        The NEXRAD S3 bucket to use. Default is 'unidata-nexrad-level2'.
+    backfill: bool
+        If False, the first poll only returns the latest volume instead of every volume of the day.
+    """
+    def __init__(self, radar, bucket_name='unidata-nexrad-level2', backfill=False):
+        self.radar = radar
+        self.bucket_name = bucket_name
+        self.backfill = backfill
+        self.last_key = None
+        self._s3 = boto3.session.Session().client('s3', config=Config(signature_version=UNSIGNED))
+
+    def poll(self):
+        """
+        Get the volumes that appeared since the last poll.
+
+        Returns
+        -------
+        paths: list of str
+            The S3 paths of the new volumes, oldest first.
+        """
+        now = datetime.now(timezone.utc)
+        keys = []
+        for day in [now - timedelta(days=1), now]:
+            prefix = f'{day.year}/{day.month:02d}/{day.day:02d}/{self.radar}/'
+            kwargs = dict(Bucket=self.bucket_name, Prefix=prefix)
+            if self.last_key is not None:
+                if self.last_key >= prefix + '~':
+                    continue
+                if self.last_key.startswith(prefix):
+                    kwargs['StartAfter'] = self.last_key
+            elif day != now:
+                continue
+            paginator = self._s3.get_paginator('list_objects_v2')
+            for page in paginator.paginate(**kwargs):
+                keys = keys + [x['Key'] for x in page.get('Contents', []) if not x['Key'].endswith('_MDM')]
+        keys = sorted(keys)
+        if len(keys) == 0:
+            return []
+        if self.last_key is None and not self.backfill:
+            keys = keys[-1:]
+        self.last_key = keys[-1]
+        return [f"s3://{self.bucket_name}/{key}" for key in keys]
+
+    def read(self, path):
+        return pyart.io.read_nexrad_archive(path)
+
+
+class DirectoryScanSource(object):
+    """
+    Watches a local directory for new radar volumes. This is a stand-in for the S3 bucket
+    that is useful for testing and for sites that receive data through LDM.
+
+    Parameters
+    ----------
+    path: str
+        The directory to watch.
+    pattern: str
+        The glob pattern of the radar files inside the directory.
+    backfill: bool
+        If False, the first poll only returns the latest volume instead of every file in the directory.
+    """
+    def __init__(self, path, pattern='*', backfill=False):
+        self.path = path
+        self.pattern = pattern
+        self.backfill = backfill
+        self.seen = None
+
+    def poll(self):
+        """
+        Get the volumes that appeared since the last poll.
+
+        Returns
+        -------
+        paths: list of str
+            The paths of the new volumes sorted by name.
+        """
+        files = sorted(glob(os.path.join(self.path, self.pattern)))
+        if self.seen is None:
+            self.seen = set()
+            if not self.backfill:
+                self.seen.update(files[:-1])
+        new_files = [x for x in files if x not in self.seen]
+        self.seen.update(new_files)
+        return new_files
+
+    def read(self, path):
+        return pyart.io.read(path)
+
+
+class LakeBreezeMonitor(object):
+    """
+    A long-running monitor that keeps the model, the scan index and the lidar connections warm,
+    and sends each new radar volume through preprocessing, inference and lidar triggering.
+
+    The end-to-end latency of a scan is the time from the end of the lowest sweep of the radar
+    volume to the end of the lidar uploads. It is compared against a latency budget and
+    reported in :py:meth:`LakeBreezeMonitor.status`.
+
+    Parameters
+    ----------
+    source: :py:meth:`S3ScanSource`, :py:meth:`DirectoryScanSource` or :py:meth:`adam.io.NexradChunkSource`
+        Where to look for new volumes.
+    site: str or :py:meth:`adam.io.RadarSite`
+        The radar site that defines the inference domain.
+    lidars: list of dict
+        The lidars to trigger. Each dictionary has the keys 'lat', 'lon', 'host', 'username',
+        'password' and 'elevations', and the optional keys of
+        :py:meth:`adam.triggering.dispatch_triggers`.
+    model_name: str
+        The model to use. See :py:meth:`adam.model.infer_lake_breeze`.
+    latency_budget: float
+        The allowed time in seconds from the end of the scan to the end of the lidar upload.
+    poll_interval: float
+        The time in seconds between polls of the source.
+    device: str
+        The device to run the model on.
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments.
+    status_file: str or None
+        If set, the status summary is written to this JSON file after every cycle.
+    client_factory: callable
+        Creates the SSH clients of the lidar connection pool. Default is :py:meth:`paramiko.SSHClient`.
+    trigger_timeout: float
+        The time in seconds that each lidar has to finish its upload. The lidars are triggered
+        at the same time, so a lidar that hangs does not hold up the others.
+    trigger_state: :py:meth:`adam.triggering.TriggerState` or str, optional
+        Skips uploads to lidars where the lake breeze has barely moved since the last scan. If a
+        string, a TriggerState persisted to that JSON file is used.
+    thumbnail_file: str or None
+        If set, a quick-look PNG of the lake breeze mask over the radar image is written to this
+        file after every scan, once the lidars have been triggered.
+    metrics_file: str or None
+        If set, the stage timings, counters and peak memory from :py:meth:`adam.metrics.METRICS`
+        are written to this file in the Prometheus text format after every cycle. Setting it
+        turns on metric recording.
+    model_server: str or :py:meth:`adam.model.ModelClient` or None
+        If set, the scans are sent as uint8 images to this :py:meth:`adam.model.ModelServer`
+        instead of being run through a model loaded by the monitor.
+    """
+    def __init__(self, source, site='KLOT', lidars=None,
+                 model_name='lakebreeze_model_fcn_resnet50_no_augmentation',
+                 latency_budget=120., poll_interval=30., device='cpu', area_threshold=20,
+                 status_file=None, client_factory=paramiko.SSHClient, trigger_timeout=30.,
+                 trigger_state=None, thumbnail_file=None, metrics_file=None, model_server=None):
+        self.source = source
+        self.site = get_site(site)
+        self.lidars = lidars if lidars is not None else []
+        self.model_name = model_name
+        self.latency_budget = latency_budget
+        self.poll_interval = poll_interval
+        self.device = device
+        self.area_threshold = area_threshold
+        self.status_file = status_file
+        self.pool = SSHConnectionPool(client_factory=client_factory)
+        self.trigger_timeout = trigger_timeout
+        if isinstance(trigger_state, str):
+            trigger_state = TriggerState(path=trigger_state)
+        self.trigger_state = trigger_state
+        self.thumbnail_file = thumbnail_file
+        self.metrics_file = metrics_file
+        self.model_server = model_server
+        if metrics_file is not None:
+            metrics.METRICS.enabled = True
+        self._renderer = QuickLookRenderer()
+        self._latencies = []
+        self._status = dict(started=_utcnow_str(), scans_processed=0, scans_failed=0,
+                            consecutive_failures=0, triggers=0, budget_exceeded=0,
+                            last_scan=None, last_scan_end=None, last_latency=None,
+                            last_error=None, last_poll=None)
+
+    def warm_up(self):
+        """
+        Load the model and open the lidar connections before the first scan arrives.
+        """
+        if self.model_server is None:
+            _load_model(self.model_name, self.device)
+        for lidar in self.lidars:
+            try:
+                self.pool.connect(lidar['host'], lidar['username'], lidar['password'])
+            except Exception as e:
+                logging.warning(f"Could not connect to lidar {lidar_name(lidar)}: {e}")
+
+    def process_scan(self, path):
+        """
+        Run one radar volume through preprocessing, inference and triggering.
+
+        Parameters
+        ----------
+        path: str
+            The path of the volume in the source.
+
+        Returns
+        -------
+        result: dict
+            The scan end time, the end-to-end latency in seconds, and which lidars were triggered.
+        """
+        with metrics.span('fetch', radar=self.site.radar):
+            radar = self.source.read(path)
+        scan_end = _sweep_end_time(radar, 0)
+        with metrics.span('preprocess', radar=self.site.radar):
+            rad_scan = preprocess_radar_image(radar, lat_range=self.site.lat_range,
+                                              lon_range=self.site.lon_range,
+                                              dtype='float32' if self.model_server is None else 'uint8')
+        with metrics.span('inference', radar=self.site.radar):
+            rad_scan = infer_lake_breeze(rad_scan, model_name=self.model_name, device=self.device,
+                                         area_threshold=self.area_threshold, server=self.model_server)
+        results = dispatch_triggers(rad_scan, self.lidars, pool=self.pool, timeout=self.trigger_timeout,
+                                    trigger_state=self.trigger_state)
+        triggered = {name: result.triggered for name, result in results.items()}
+        failed = [f"{name}: {result.error}" for name, result in results.items()
+                  if result.status in ('failed', 'timeout')]
+        if failed:
+            self._status['last_error'] = "Triggering failed for " + "; ".join(failed)
+        latency = (datetime.now(timezone.utc) - scan_end).total_seconds()
+        metrics.observe('scan_latency', latency, radar=self.site.radar)
+        if self.thumbnail_file is not None:
+            self._write_thumbnail(rad_scan)
+        return dict(path=path, scan_end=scan_end, latency=latency, triggered=triggered)
+
+    def run_once(self):
+        """
+        Poll the source once and process every new volume.
+
+        Returns
+        -------
+        results: list of dict
+            The results of :py:meth:`LakeBreezeMonitor.process_scan` for the volumes that succeeded.
+        """
+        results = []
+        try:
+            paths = self.source.poll()
+        except Exception as e:
+            self._record_failure(f"Polling failed: {e}")
+            paths = []
+        self._status['last_poll'] = _utcnow_str()
+        for path in paths:
+            try:
+                result = self.process_scan(path)
+            except Exception as e:
+                self._record_failure(f"Processing {path} failed: {e}")
+                continue
+            self._record_success(result)
+            results.append(result)
+        self._write_status()
+        self._write_metrics()
+        return results
+
+    def run(self, max_cycles=None):
+        """
+        Poll the source until interrupted. Errors in a cycle are logged and counted, and the
+        monitor keeps running.
+
+        Parameters
+        ----------
+        max_cycles: int or None
+            Stop after this many polls. None runs forever.
+        """
+        self.warm_up()
+        cycle = 0
+        try:
+            while max_cycles is None or cycle < max_cycles:
+                start = time.monotonic()
+                self.run_once()
+                cycle += 1
+                if max_cycles is not None and cycle >= max_cycles:
+                    break
+                time.sleep(max(self.poll_interval - (time.monotonic() - start), 0))
+        finally:
+            self.close()
+
+    def status(self):
+        """
+        Get the health and status summary of the monitor.
+
+        Returns
+        -------
+        status: dict
+            Counters of processed and failed scans, the latest and mean latencies, the number
+            of scans over the latency budget, and whether the monitor is healthy.
+        """
+        status = dict(self._status)
+        status['latency_budget'] = self.latency_budget
+        if len(self._latencies) > 0:
+            status['mean_latency'] = float(np.mean(self._latencies))
+            status['max_latency'] = float(np.max(self._latencies))
+        else:
+            status['mean_latency'] = None
+            status['max_latency'] = None
+        connected = self.pool.connected()
+        status['lidars_connected'] = sorted(lidar_name(lidar) for lidar in self.lidars
+                                            if (lidar['host'], lidar['username']) in connected)
+        status['healthy'] = self._status['consecutive_failures'] < 3
+        return status
+
+    def close(self):
+        """
+        Close the lidar connections.
+        """
+        self.pool.close()
+
+    def _record_success(self, result):
+        metrics.inc('scans', status='processed')
+        self._latencies = (self._latencies + [result['latency']])[-100:]
+        self._status['scans_processed'] += 1
+        self._status['consecutive_failures'] = 0
+        self._status['triggers'] += sum(result['triggered'].values())
+        self._status['last_scan'] = result['path']
+        self._status['last_scan_end'] = result['scan_end'].isoformat()
+        self._status['last_latency'] = result['latency']
+        if result['latency'] > self.latency_budget:
+            self._status['budget_exceeded'] += 1
+            metrics.inc('budget_exceeded')
+            logging.warning(f"Scan {result['path']} took {result['latency']:.1f} s from scan end to upload, "
+                            f"over the budget of {self.latency_budget:.1f} s.")
+        else:
+            logging.info(f"Scan {result['path']} processed in {result['latency']:.1f} s from scan end to upload.")
+
+    def _record_failure(self, message):
+        logging.error(message)
+        metrics.inc('scans', status='failed')
+        self._status['scans_failed'] += 1
+        self._status['consecutive_failures'] += 1
+        self._status['last_error'] = message
+
+    def _write_thumbnail(self, rad_scan):
+        try:
+            buffer = self._renderer.to_png(rad_scan)
+        except Exception as e:
+            logging.warning(f"Could not draw the thumbnail: {e}")
+            return
+        tmp_file = self.thumbnail_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_file, self.thumbnail_file)
+
+    def _write_status(self):
+        if self.status_file is None:
+            return
+        tmp_file = self.status_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(tmp_file, self.status_file)
+
+    def _write_metrics(self):
+        if self.metrics_file is None:
+            return
+        try:
+            metrics.METRICS.write_prometheus(self.metrics_file)
+        except OSError as e:
+            logging.warning(f"Could not write the metrics: {e}")
+
+
+def _utcnow_str():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _sweep_end_time(radar, sweep):
+    start = datetime.strptime(radar.time['units'].split()[2].rstrip('Z')[:19], "%Y-%m-%dT%H:%M:%S")
+    last_ray = radar.sweep_end_ray_index['data'][sweep]
+    return start.replace(tzinfo=timezone.utc) + timedelta(seconds=float(radar.time['data'][last_ray]))
+
+
+def main(args=None):
+    """
+    The entry point of the adam-monitor command.
+    """
+    parser = argparse.ArgumentParser(
+        description="Monitor a NEXRAD radar for lake breezes and trigger lidar scans in real time.")
+    parser.add_argument("--radar", default="KLOT", help="The 4-letter code of the radar site.")
+    parser.add_argument("--source", default="s3",
+                        help="'s3' to poll the NEXRAD archive bucket, 'chunks' to follow the real-time chunk "
+                             "stream, or a local directory to watch.")
+    parser.add_argument("--chunk-path", default=None,
+                        help="A local directory with the real-time chunk layout to use instead of S3 "
+                             "when --source is 'chunks'.")
+    parser.add_argument("--pattern", default="*", help="The glob pattern of files in a local directory.")
+    parser.add_argument("--bucket", default="unidata-nexrad-level2", help="The NEXRAD S3 bucket.")
+    parser.add_argument("--lidar-config", default=None,
+                        help="A JSON file with a list of lidars to trigger.")
+    parser.add_argument("--model", default="lakebreeze_model_fcn_resnet50_no_augmentation",
+                        help="The lake breeze model to use.")
+    parser.add_argument("--device", default="cpu", help="The device to run the model on.")
+    parser.add_argument("--model-server", default=None,
+                        help="Send the scans to the adam-model-server at this address instead of loading "
+                             "the model in the monitor.")
+    parser.add_argument("--latency-budget", type=float, default=120.,
+                        help="The budget in seconds from scan end to lidar upload.")
+    parser.add_argument("--poll-interval", type=float, default=30., help="Seconds between polls.")
+    parser.add_argument("--status-file", default=None, help="Write the status summary to this JSON file.")
+    parser.add_argument("--trigger-state", default=None,
+                        help="Skip lidar uploads when the lake breeze has barely moved, and keep the state "
+                             "of the last uploads in this JSON file.")
+    parser.add_argument("--thumbnail", default=None,
+                        help="Write a quick-look PNG of the latest lake breeze mask to this file.")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Write the stage timings and counters to this file in the Prometheus text format.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve the stage timings and counters for Prometheus on this port.")
+    parser.add_argument("--metrics-log", action="store_true",
+                        help="Log every stage timing as a JSON line.")
+    parser.add_argument("--profile", default=None,
+                        help="Profile every stage with cProfile, the torch profiler and tracemalloc, and "
+                             "write the profiles to this directory when the monitor stops.")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Process all existing volumes on startup instead of only the latest.")
+    parser.add_argument("--log-level", default="INFO", help="The logging level.")
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(message)s")
+    if args.source == "s3":
+        source = S3ScanSource(args.radar, bucket_name=args.bucket, backfill=args.backfill)
+    elif args.source == "chunks":
+        source = NexradChunkSource(args.radar, path=args.chunk_path)
+    else:
+        source = DirectoryScanSource(args.source, pattern=args.pattern, backfill=args.backfill)
+    if args.metrics_port is not None or args.metrics_log:
+        metrics.enable(log=args.metrics_log)
+    if args.metrics_port is not None:
+        logging.info(f"Serving metrics at {metrics.METRICS.serve(args.metrics_port, host='0.0.0.0')}.")
+    lidars = []
+    if args.lidar_config is not None:
+        with open(args.lidar_config) as f:
+            lidars = json.load(f)
+    monitor = LakeBreezeMonitor(source, site=args.radar, lidars=lidars, model_name=args.model,
+                                latency_budget=args.latency_budget, poll_interval=args.poll_interval,
+                                device=args.device, status_file=args.status_file,
+                                trigger_state=args.trigger_state, thumbnail_file=args.thumbnail,
+                                metrics_file=args.metrics_file, model_server=args.model_server)
+    profiler = metrics.profile(args.profile) if args.profile is not None else contextlib.nullcontext()
+    try:
+        with profiler:
+            monitor.run()
+    except KeyboardInterrupt:
+        logging.info("Stopping the monitor.")
+    logging.info(json.dumps(monitor.status()))
+
+
+if __name__ == "__main__":
+    main()
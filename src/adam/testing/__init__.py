@@ -14,6 +14,19 @@ This module handles testing utilities for ADAM.
 
     FakeSSHClient
     FakeSFTP
+    ChunkReplayer
+    LocalRangeServer
+    LocalS3Server
+    make_level2_volume
+    write_level2_chunks
+    make_radar_volume
+    write_radar_volume
+    write_synthetic_archive
+    nexrad_key
+    clear_air_echo
+    fine_line_echo
+    cell_echo
+    combine_echoes
     TEST_RHI_FILE
     TEST_PPI_FILE
     TEST_PPI_TRIGGERED_SCAN
@@ -22,6 +35,11 @@ This module handles testing utilities for ADAM.
 import os
 
 from .fake_lidar import FakeSFTP, FakeSSHClient        # noqa
+from .chunk_replay import ChunkReplayer  # noqa
+from .range_server import LocalRangeServer, LocalS3Server  # noqa
+from .level2 import make_level2_volume, write_level2_chunks  # noqa
+from .synthetic_radar import make_radar_volume, write_radar_volume, write_synthetic_archive, nexrad_key  # noqa
+from .synthetic_radar import clear_air_echo, fine_line_echo, cell_echo, combine_echoes  # noqa
 
 TEST_RHI_FILE = os.path.join(os.path.dirname(__file__), "data/test_scan_rhi.txt")
 TEST_PPI_FILE = os.path.join(os.path.dirname(__file__), "data/test_scan_ppi.txt")
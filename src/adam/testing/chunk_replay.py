@@ -0,0 +1,56 @@
+import os
+import shutil
+import threading
+import logging
+
+
+class ChunkReplayer:
+    """
+    Replays recorded NEXRAD real-time chunks into a directory on a timer, so that
+    :py:meth:`adam.io.NexradChunkSource` can be tested as if the chunks were arriving from the radar.
+
+    The recorded chunks must have the layout of the 'unidata-nexrad-level2-chunks' bucket,
+    <radar>/<volume number>/<chunk>. Chunks are copied in the order of their volume and name.
+    """
+
+    def __init__(self, source_path, dest_path, interval=1.):
+        self.source_path = source_path
+        self.dest_path = dest_path
+        self.interval = interval
+        self.copied = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._replay, daemon=True)
+        self.chunks = []
+        for radar in sorted(os.listdir(source_path)):
+            volumes = sorted(os.listdir(os.path.join(source_path, radar)), key=int)
+            for volume in volumes:
+                for chunk in sorted(os.listdir(os.path.join(source_path, radar, volume))):
+                    self.chunks.append(os.path.join(radar, volume, chunk))
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def finished(self):
+        return len(self.copied) == len(self.chunks)
+
+    def _replay(self):
+        for chunk in self.chunks:
+            if self._stop.is_set():
+                return
+            dest = os.path.join(self.dest_path, chunk)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            # Write under a temporary name so readers never see a partial chunk
+            shutil.copyfile(os.path.join(self.source_path, chunk), dest + '.part')
+            os.replace(dest + '.part', dest)
+            self.copied.append(chunk)
+            logging.info(f"Replayed chunk {chunk}.")
+            self._stop.wait(self.interval)
+
+    def __enter__(self): return self.start()
+    def __exit__(self, exc_type, exc_val, exc_tb): self.stop()
@@ -14,6 +14,7 @@ class FakeSFTP:
         os.makedirs(scan_params_path, exist_ok=True)
         os.makedirs(dynscan_path, exist_ok=True)
         self.files = []
+        self.closed = False
         
     def listdir(self, path): return os.listdir(os.path.join(self.wd, path))
     def get(self, remote, local): 
@@ -23,34 +24,84 @@ class FakeSFTP:
         with open(local, "wb") as f:
             f.write(data)
     def put(self, local, remote): 
+        self._check_open()
         logging.info(f"Putting file {local} to {remote} in fake SFTP at {self.wd}.")
         if remote.startswith("/"):
             remote = remote[1:]
         remote_path = os.path.join(self.wd, remote)
+        # Like a real SFTP client, fail on a missing local file before writing anything
+        with open(local, "rb") as f:
+            data = f.read()
+        with open(remote_path, "wb") as f:
+            f.write(data)
+        self.files.append(remote_path)
+    def putfo(self, fl, remote):
+        self._check_open()
+        logging.info(f"Streaming to {remote} in fake SFTP at {self.wd}.")
+        if remote.startswith("/"):
+            remote = remote[1:]
+        remote_path = os.path.join(self.wd, remote)
         with open(remote_path, "wb") as f:
-            f.write(open(local, "rb").read())
+            f.write(fl.read())
         self.files.append(remote_path)
+    def _check_open(self):
+        # Like paramiko, fail on a channel that was closed while a call was waiting
+        if self.closed:
+            raise OSError("Socket is closed")
     def close(self):
+        # Closing twice does nothing, so that the directories of other clients are not removed
+        if self.closed:
+            return
+        self.closed = True
         for file in self.files:
-            os.remove(file)
+            if os.path.exists(file):
+                os.remove(file)
+        self.files = []
         logging.info("Removed files from fake SFTP.")
-        os.removedirs(os.path.join(self.wd, "C:/Lidar/System/Scan parameters/"))
+        for path in ["C:/Lidar/System/Scan parameters/", "C:/Users/End User/DynScan/"]:
+            try:
+                os.removedirs(os.path.join(self.wd, path))
+            except OSError:
+                # Another fake client still has files there
+                pass
         logging.info("Removed scan parameters directory from fake SFTP.")
-        os.removedirs(os.path.join(self.wd, "C:/Users/End User/DynScan/"))
     def __enter__(self): return self
     def __exit__(self, exc_type, exc_val, exc_tb): self.close()
 
+class FakeTransport:
+    """
+    A fake SSH transport that reports whether its FakeSSHClient is connected.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.keepalive = 0
+    def is_active(self): return self.client.connected
+    def set_keepalive(self, interval): self.keepalive = interval
+
 class FakeSSHClient:
     """
     A fake SSH client for testing purposes. It simulates the behavior of an SSH client by providing a context manager that returns a FakeSFTP instance.
+    The number of connections made by all fake clients is counted in FakeSSHClient.connections.
     """
+    connections = 0
 
     def __init__(self):
         self.sftp = FakeSFTP()
+        self.connected = False
+        self.transport = FakeTransport(self)
     def set_missing_host_key_policy(self, policy): pass
-    def connect(self, ip_addr, username, password): print(f"Connected to {ip_addr} with username {username}")
-    def open_sftp(self): return self.sftp
-    def close(self): self.sftp.close()
+    def connect(self, ip_addr, username, password, **kwargs):
+        FakeSSHClient.connections += 1
+        self.connected = True
+        print(f"Connected to {ip_addr} with username {username}")
+    def get_transport(self): return self.transport if self.connected else None
+    def open_sftp(self):
+        if self.sftp.closed:
+            self.sftp = FakeSFTP()
+        return self.sftp
+    def close(self):
+        self.connected = False
+        self.sftp.close()
     def __enter__(self): return self
     def __exit__(self, exc_type, exc_val, exc_tb): self.close()
-
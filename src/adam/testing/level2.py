@@ -0,0 +1,163 @@
+import bz2
+import os
+import struct
+import numpy as np
+
+from datetime import datetime, timedelta, timezone
+
+CTM_HEADER = b'\x00' * 12
+RECORD_SIZE = 2432
+RADIALS_PER_RECORD = 120
+FIRST_GATE = 2125
+GATE_SPACING = 250
+
+
+def make_level2_volume(radar='KLOT', start_time='2025-07-15T18:00:00', elevations=(0.5, 1.5),
+                       nrays=360, ngates=460, latitude=41.6045, longitude=-88.0847, altitude=202,
+                       reflectivity=None, vcp=212, radials_per_record=RADIALS_PER_RECORD):
+    """
+    Make a compressed NEXRAD Level II archive volume made of Message 31 radials, with the same
+    record layout as the volumes in the NEXRAD buckets. This is useful for testing Level II
+    readers without downloading data.
+
+    Parameters
+    ----------
+    radar: str
+        The 4-letter code of the radar.
+    start_time: str
+        The start time of the volume in YYYY-MM-DDTHH:MM:SS format.
+    elevations: tuple of floats
+        The elevation angle of each sweep in degrees.
+    nrays: int
+        The number of rays per sweep.
+    ngates: int
+        The number of 250 m gates per ray.
+    latitude, longitude, altitude: float
+        The location of the radar.
+    reflectivity: ndarray, callable or None
+        The reflectivity in dBZ. Either an array of shape (len(elevations), nrays, ngates), or a
+        function of (sweep, azimuth, range) arrays returning the reflectivity. If None, a
+        reflectivity that increases with range is used. NaN values are stored as missing.
+    vcp: int
+        The volume coverage pattern number.
+    radials_per_record: int
+        The number of radials in each compressed record.
+
+    Returns
+    -------
+    volume: bytes
+        The Level II volume.
+    """
+    start = datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    start_days = (start - epoch).days + 1
+    start_ms = int((start - start.replace(hour=0, minute=0, second=0)).total_seconds() * 1000)
+    azimuths = (np.arange(nrays) + 0.5) * 360. / nrays
+    ranges = FIRST_GATE + GATE_SPACING * np.arange(ngates)
+    if reflectivity is None:
+        reflectivity = lambda sweep, az, rng: np.broadcast_to(rng / 5000., (len(az), len(rng)))
+    if callable(reflectivity):
+        reflectivity = np.stack([reflectivity(i, azimuths, ranges) for i in range(len(elevations))])
+    raw = np.where(np.isnan(reflectivity), 0, np.clip(np.round(reflectivity * 2. + 66.), 2, 255))
+    raw = raw.astype('>u1')
+
+    header = struct.pack('>9s3sII4s', b'AR2V0006.', b'001', start_days, start_ms, radar.encode())
+    records = [_metadata_record(elevations, vcp, start_days, start_ms)]
+    radials = []
+    # A 360 ray sweep at 0.5 deg takes about 20 s
+    ray_ms = 20000. / nrays
+    for sweep, elevation in enumerate(elevations):
+        for ray in range(nrays):
+            if ray == 0:
+                status = 3 if sweep == 0 else 0
+            elif ray == nrays - 1:
+                status = 4 if sweep == len(elevations) - 1 else 2
+            else:
+                status = 1
+            collect_ms = start_ms + int((sweep * nrays + ray) * ray_ms)
+            radials.append(_msg31(radar, collect_ms, start_days, ray + 1, azimuths[ray], status, sweep + 1,
+                                  elevation, latitude, longitude, altitude, vcp, raw[sweep, ray]))
+    for i in range(0, len(radials), radials_per_record):
+        records.append(b''.join(radials[i:i + radials_per_record]))
+    return header + b''.join(_compress_record(x) for x in records)
+
+
+def write_level2_chunks(volume, path, radar='KLOT', volume_number=1):
+    """
+    Split a Level II volume into real-time chunks with the layout of the
+    'unidata-nexrad-level2-chunks' bucket, <radar>/<volume number>/<YYYYMMDD-HHMMSS>-<chunk>-<S|I|E>.
+    The first chunk has the volume header and the metadata record, and every other chunk has one
+    compressed record.
+
+    Parameters
+    ----------
+    volume: bytes
+        The Level II volume from :py:meth:`make_level2_volume`.
+    path: str
+        The root directory to write the chunks to.
+    radar: str
+        The 4-letter code of the radar.
+    volume_number: int
+        The volume number in the chunk layout.
+
+    Returns
+    -------
+    chunks: list of str
+        The paths of the chunk files.
+    """
+    days, ms = struct.unpack_from('>II', volume, 12)
+    start = datetime(1970, 1, 1) + timedelta(days=days - 1, milliseconds=ms)
+    pieces = []
+    pos = 24
+    while pos < len(volume):
+        size = abs(struct.unpack_from('>i', volume, pos)[0])
+        pieces.append(volume[pos:pos + 4 + size])
+        pos += 4 + size
+    pieces[0] = volume[:24] + pieces[0]
+    volume_path = os.path.join(path, radar, str(volume_number))
+    os.makedirs(volume_path, exist_ok=True)
+    chunks = []
+    for i, piece in enumerate(pieces):
+        kind = 'S' if i == 0 else ('E' if i == len(pieces) - 1 else 'I')
+        chunk = os.path.join(volume_path, f"{start:%Y%m%d-%H%M%S}-{i + 1:03d}-{kind}")
+        with open(chunk, 'wb') as f:
+            f.write(piece)
+        chunks.append(chunk)
+    return chunks
+
+
+def _compress_record(payload):
+    compressed = bz2.compress(payload)
+    return struct.pack('>i', -len(compressed)) + compressed
+
+
+def _message_header(size, msg_type, days, ms):
+    return struct.pack('>HBBHHIHH', size, 0, msg_type, 0, days, ms, 1, 1)
+
+
+def _metadata_record(elevations, vcp, days, ms):
+    cuts = b''
+    for elevation in elevations:
+        cuts += struct.pack('>HBBBBHHhhhhhhHHH2sHHH2sHHH2s', int(round(elevation * 65536. / 360.)),
+                            0, 1, 0, 1, 15, 0, 0, 0, 0, 0, 0, 0,
+                            0, 0, 0, b'', 0, 0, 0, b'', 0, 0, 0, b'')
+    body = struct.pack('>HHHHHBB10s', 0, 2, vcp, len(elevations), 1, 2, 2, b'') + cuts
+    msg5 = CTM_HEADER + _message_header((RECORD_SIZE - 12) // 2, 5, days, ms) + body
+    return msg5.ljust(RECORD_SIZE, b'\x00')
+
+
+def _msg31(radar, collect_ms, days, azimuth_number, azimuth, status, elevation_number, elevation,
+           latitude, longitude, altitude, vcp, ref):
+    pointers = [72, 72 + 44, 72 + 44 + 12, 72 + 44 + 12 + 20]
+    msg_header = struct.pack('>4sIHHfBBHBBBBfBbH10I', radar.encode(), collect_ms, days, azimuth_number, azimuth,
+                             0, 0, 0, 1, status, elevation_number, 1, elevation, 0, 0, 4, *pointers, 0, 0, 0, 0, 0, 0)
+    vol = struct.pack('>1s3sHBBffhHfffffH2s', b'R', b'VOL', 44, 1, 0, latitude, longitude, altitude, 0,
+                      0., 0., 0., 0., 0., vcp, b'')
+    elv = struct.pack('>1s3sHhf', b'R', b'ELV', 12, 0, 0.)
+    rad = struct.pack('>1s3sHhffh2s', b'R', b'RAD', 20, 4660, 0., 0., 2800, b'')
+    ref_block = struct.pack('>1s3sIHhhhhBBff', b'D', b'REF', 0, len(ref), FIRST_GATE, GATE_SPACING,
+                            0, 0, 0, 8, 2., 66.) + ref.tobytes()
+    body = msg_header + vol + elv + rad + ref_block
+    if len(body) % 2:
+        body += b'\x00'
+    return CTM_HEADER + _message_header((16 + len(body)) // 2, 31, days, collect_ms) + body
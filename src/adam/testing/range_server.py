@@ -0,0 +1,233 @@
+import os
+import re
+import sys
+import threading
+import logging
+import time
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+from xml.sax.saxutils import escape
+
+
+class LocalRangeServer:
+    """
+    A local HTTP server that serves the files in a directory and supports byte range requests,
+    like the public endpoints of the NEXRAD S3 buckets. It counts the bytes that it sends so that
+    tests can check how much of each file a reader downloaded.
+
+    The latency is either a delay in seconds before every response, or a function of the
+    request path that returns the delay, to simulate a slow or distant bucket.
+    """
+
+    def __init__(self, directory, host="127.0.0.1", port=0, latency=0.):
+        self.directory = directory
+        self.latency = latency
+        self.bytes_sent = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _record(self, nbytes):
+        with self._lock:
+            self.bytes_sent += nbytes
+            self.requests += 1
+
+    def _delay(self, path):
+        latency = self.latency(path) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def _file_path(self, path):
+        return os.path.join(self.directory, urlsplit(path).path.lstrip("/"))
+
+    def _handle(self, handler, head=False):
+        self._send_file(handler, self._file_path(handler.path), head=head)
+
+    def _send_file(self, handler, path, head=False):
+        if not os.path.isfile(path):
+            self._send_not_found(handler)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", handler.headers.get("Range", ""))
+        if match is not None:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), size - 1)
+            if start >= size:
+                handler.send_error(416)
+                return
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            handler.send_response(200)
+        stat = os.stat(path)
+        handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("Content-Length", str(end - start + 1))
+        handler.send_header("Last-Modified", formatdate(stat.st_mtime, usegmt=True))
+        handler.send_header("ETag", f'"{stat.st_size:x}-{int(stat.st_mtime):x}"')
+        handler.end_headers()
+        if head:
+            self._record(0)
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        handler.wfile.write(data)
+        self._record(len(data))
+
+    def _send_not_found(self, handler):
+        handler.send_error(404)
+
+    def _make_handler(self):
+        server = self
+
+        class RangeRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._delay(self.path)
+                server._handle(self)
+
+            def do_HEAD(self):
+                server._delay(self.path)
+                server._handle(self, head=True)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        return RangeRequestHandler
+
+    def __enter__(self): return self.start()
+    def __exit__(self, exc_type, exc_val, exc_tb): self.stop()
+
+
+class LocalS3Server(LocalRangeServer):
+    """
+    A local stand-in for an anonymous S3 bucket such as the NEXRAD Level II archive bucket. It
+    serves the files in a directory as the objects of the bucket, with the path of each file
+    relative to the directory as its key, and answers the ListObjectsV2, GetObject and HeadObject
+    requests that boto3 and s3fs make. Use :py:meth:`LocalS3Server.endpoint` to point ADAM at it.
+    See :py:meth:`write_synthetic_archive` to fill the directory with synthetic volumes.
+
+    Parameters
+    ----------
+    directory: str
+        The directory with the objects of the bucket.
+    bucket: str
+        The name of the bucket.
+    host: str
+        The address to listen on.
+    port: int
+        The port to listen on. Default is a free port.
+    latency: float or callable
+        A delay in seconds before every response, or a function of the request path that returns it.
+    """
+
+    def __init__(self, directory, bucket="unidata-nexrad-level2", host="127.0.0.1", port=0, latency=0.):
+        super().__init__(directory, host=host, port=port, latency=latency)
+        self.bucket = bucket
+
+    @contextmanager
+    def endpoint(self):
+        """
+        Point the S3 clients made by boto3 and s3fs in this process at the server while the block
+        runs, through the AWS_ENDPOINT_URL_S3 environment variable.
+        """
+        previous = os.environ.get("AWS_ENDPOINT_URL_S3")
+        os.environ["AWS_ENDPOINT_URL_S3"] = self.url
+        _clear_s3fs_cache()
+        try:
+            yield self.url
+        finally:
+            if previous is None:
+                os.environ.pop("AWS_ENDPOINT_URL_S3", None)
+            else:
+                os.environ["AWS_ENDPOINT_URL_S3"] = previous
+            _clear_s3fs_cache()
+
+    def _handle(self, handler, head=False):
+        parts = urlsplit(handler.path)
+        bucket, _, key = parts.path.lstrip("/").partition("/")
+        if bucket != self.bucket:
+            self._send_error(handler, 404, "NoSuchBucket", f"The bucket {bucket} does not exist.")
+            return
+        if key == "":
+            self._list_objects(handler, parse_qs(parts.query), head=head)
+            return
+        self._send_file(handler, os.path.join(self.directory, *key.split("/")), head=head)
+
+    def _send_not_found(self, handler):
+        self._send_error(handler, 404, "NoSuchKey", "The specified key does not exist.")
+
+    def _send_error(self, handler, status, code, message):
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>{code}</Code>'
+                f'<Message>{escape(message)}</Message></Error>').encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/xml")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if handler.command != "HEAD":
+            handler.wfile.write(body)
+        self._record(len(body))
+
+    def _list_objects(self, handler, query, head=False):
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        start_after = query.get("continuation-token", query.get("start-after", [""]))[0]
+        keys = []
+        # Only walk the directories that can hold keys with the prefix
+        root = os.path.join(self.directory, *prefix.split("/")[:-1])
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                key = os.path.relpath(os.path.join(dirpath, name), self.directory).replace(os.sep, "/")
+                if key.startswith(prefix) and key > start_after:
+                    keys.append(key)
+        keys.sort()
+        truncated = len(keys) > max_keys
+        keys = keys[:max_keys]
+        encode = query.get("encoding-type", [""])[0] == "url"
+        contents = []
+        for key in keys:
+            stat = os.stat(os.path.join(self.directory, *key.split("/")))
+            modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+            contents.append(f"<Contents><Key>{escape(quote(key) if encode else key)}</Key>"
+                            f"<LastModified>{modified}</LastModified><Size>{stat.st_size}</Size>"
+                            f"<StorageClass>STANDARD</StorageClass></Contents>")
+        next_token = f"<NextContinuationToken>{escape(keys[-1])}</NextContinuationToken>" if truncated else ""
+        body = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f"<Name>{self.bucket}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(keys)}</KeyCount>"
+                f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>"
+                f"{next_token}{''.join(contents)}</ListBucketResult>").encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/xml")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if not head:
+            handler.wfile.write(body)
+        self._record(len(body))
+
+
+def _clear_s3fs_cache():
+    # s3fs reuses file systems that were made before the endpoint changed
+    if "s3fs" in sys.modules:
+        sys.modules["s3fs"].S3FileSystem.clear_instance_cache()
@@ -0,0 +1,323 @@
+import os
+import numpy as np
+
+from datetime import datetime, timedelta
+
+from .level2 import make_level2_volume, FIRST_GATE, GATE_SPACING
+
+# The location (latitude, longitude, altitude) of the radars in the ADAM site registry
+RADAR_LOCATIONS = {
+    'KLOT': (41.6045, -88.0847, 202.),
+    'KMKX': (42.9678, -88.5506, 292.),
+    'KGRR': (42.8939, -85.5449, 237.),
+    'KIWX': (41.3586, -85.7000, 292.),
+}
+
+
+def clear_air_echo(mean=-10., std=5., seed=0):
+    """
+    Make an echo pattern of random clear air returns.
+
+    Parameters
+    ----------
+    mean: float
+        The mean reflectivity in dBZ.
+    std: float
+        The standard deviation of the reflectivity in dBZ.
+    seed: int
+        The seed of the random numbers. Each sweep gets different returns.
+
+    Returns
+    -------
+    echo: function
+        A function of (sweep, azimuths, ranges) that returns the reflectivity in dBZ with
+        shape (len(azimuths), len(ranges)).
+    """
+    def echo(sweep, azimuths, ranges):
+        rng = np.random.default_rng((seed, sweep))
+        return rng.normal(mean, std, (len(azimuths), len(ranges)))
+    return echo
+
+
+def fine_line_echo(distance=25000., normal_azimuth=60., width=2000., reflectivity=20., length=None,
+                   sweeps=None):
+    """
+    Make an echo pattern of a straight fine line, like the convergence band along a lake breeze
+    front. The line is perpendicular to normal_azimuth and passes distance meters from the radar.
+
+    Parameters
+    ----------
+    distance: float
+        The distance of the line from the radar in meters.
+    normal_azimuth: float
+        The direction from the radar to the nearest point on the line in degrees. For a lake
+        breeze, this points towards the lake.
+    width: float
+        The width of the line in meters.
+    reflectivity: float
+        The reflectivity of the line in dBZ.
+    length: float or None
+        The length of the line in meters, centered on the nearest point to the radar. If None,
+        the line crosses the whole domain.
+    sweeps: list of int or None
+        The sweeps that see the line. Lake breeze fronts are shallow, so the line may only be in
+        the lowest sweeps. If None, every sweep sees it.
+
+    Returns
+    -------
+    echo: function
+        A function of (sweep, azimuths, ranges) that returns the reflectivity in dBZ, or NaN
+        away from the line.
+    """
+    normal = np.deg2rad(normal_azimuth)
+
+    def echo(sweep, azimuths, ranges):
+        x, y = _ground_xy(azimuths, ranges)
+        across = x * np.sin(normal) + y * np.cos(normal) - distance
+        line = np.abs(across) < width / 2.
+        if length is not None:
+            along = x * np.cos(normal) - y * np.sin(normal)
+            line &= np.abs(along) < length / 2.
+        if sweeps is not None and sweep not in sweeps:
+            line[:] = False
+        return np.where(line, reflectivity, np.nan)
+    return echo
+
+
+def cell_echo(distance, azimuth, radius=5000., reflectivity=50.):
+    """
+    Make an echo pattern of a convective cell with a reflectivity that falls off from its center.
+
+    Parameters
+    ----------
+    distance: float
+        The distance of the center of the cell from the radar in meters.
+    azimuth: float
+        The azimuth of the center of the cell from the radar in degrees.
+    radius: float
+        The radius of the cell in meters. The reflectivity drops to 0 dBZ at this radius.
+    reflectivity: float
+        The reflectivity at the center of the cell in dBZ.
+
+    Returns
+    -------
+    echo: function
+        A function of (sweep, azimuths, ranges) that returns the reflectivity in dBZ, or NaN
+        outside of the cell.
+    """
+    cx = distance * np.sin(np.deg2rad(azimuth))
+    cy = distance * np.cos(np.deg2rad(azimuth))
+
+    def echo(sweep, azimuths, ranges):
+        x, y = _ground_xy(azimuths, ranges)
+        r2 = ((x - cx) ** 2 + (y - cy) ** 2) / radius ** 2
+        return np.where(r2 < 1, reflectivity * (1 - r2), np.nan)
+    return echo
+
+
+def combine_echoes(*echoes):
+    """
+    Combine echo patterns by taking the largest reflectivity at each gate.
+
+    Parameters
+    ----------
+    echoes: functions
+        The echo patterns, as made by :py:meth:`clear_air_echo`, :py:meth:`fine_line_echo` and
+        :py:meth:`cell_echo`.
+
+    Returns
+    -------
+    echo: function
+        The combined echo pattern.
+    """
+    def echo(sweep, azimuths, ranges):
+        data = np.full((len(azimuths), len(ranges)), np.nan)
+        for pattern in echoes:
+            data = np.fmax(data, pattern(sweep, azimuths, ranges))
+        return data
+    return echo
+
+
+def make_radar_volume(radar='KLOT', start_time='2025-07-15T18:00:00', elevations=(0.5, 1.5),
+                      nrays=360, ngates=460, reflectivity=None):
+    """
+    Make a synthetic :py:meth:`pyart.core.Radar` volume with the geometry of a NEXRAD radar:
+    the location of the radar, 250 m gates starting at 2.125 km, and about 20 s per sweep.
+
+    Parameters
+    ----------
+    radar: str
+        The 4-letter code of the radar. Must be in RADAR_LOCATIONS.
+    start_time: str
+        The start time of the volume in YYYY-MM-DDTHH:MM:SS format.
+    elevations: tuple of floats
+        The elevation angle of each sweep in degrees.
+    nrays: int
+        The number of rays per sweep.
+    ngates: int
+        The number of gates per ray.
+    reflectivity: ndarray, callable or None
+        The reflectivity in dBZ. Either an array of shape (len(elevations), nrays, ngates), or an
+        echo pattern such as :py:meth:`fine_line_echo`. If None, clear air with a lake breeze
+        fine line is used. NaN values are masked.
+
+    Returns
+    -------
+    radar: :py:meth:`pyart.core.Radar`
+        The radar volume.
+    """
+    import pyart
+
+    latitude, longitude, altitude = RADAR_LOCATIONS[radar]
+    nsweeps = len(elevations)
+    azimuths = (np.arange(nrays) + 0.5) * 360. / nrays
+    ranges = FIRST_GATE + GATE_SPACING * np.arange(ngates)
+    if reflectivity is None:
+        reflectivity = combine_echoes(clear_air_echo(), fine_line_echo())
+    if callable(reflectivity):
+        reflectivity = np.stack([reflectivity(i, azimuths, ranges) for i in range(nsweeps)])
+    reflectivity = np.asarray(reflectivity, dtype=np.float32).reshape(nsweeps * nrays, ngates)
+
+    volume = pyart.testing.make_empty_ppi_radar(ngates, nrays, nsweeps)
+    volume.metadata['instrument_name'] = radar
+    volume.time['units'] = f"seconds since {start_time}Z"
+    volume.time['data'] = np.arange(nsweeps * nrays) * 20. / nrays
+    volume.range['data'] = ranges.astype(np.float32)
+    volume.range['meters_to_center_of_first_gate'] = float(FIRST_GATE)
+    volume.range['meters_between_gates'] = float(GATE_SPACING)
+    volume.latitude['data'] = np.array([latitude])
+    volume.longitude['data'] = np.array([longitude])
+    volume.altitude['data'] = np.array([altitude])
+    volume.fixed_angle['data'] = np.asarray(elevations, dtype=np.float32)
+    volume.azimuth['data'] = np.tile(azimuths, nsweeps).astype(np.float32)
+    volume.elevation['data'] = np.repeat(np.asarray(elevations, dtype=np.float32), nrays)
+    field = pyart.config.get_metadata('reflectivity')
+    field['data'] = np.ma.masked_invalid(reflectivity)
+    volume.add_field('reflectivity', field)
+    volume.init_gate_x_y_z()
+    volume.init_gate_longitude_latitude()
+    return volume
+
+
+def write_radar_volume(volume, path, format='level2'):
+    """
+    Write a synthetic radar volume to a file.
+
+    Parameters
+    ----------
+    volume: :py:meth:`pyart.core.Radar`
+        The volume from :py:meth:`make_radar_volume`.
+    path: str
+        The file to write.
+    format: str
+        'level2' for a compressed NEXRAD Level II archive file, or 'cfradial' for CF-Radial.
+
+    Returns
+    -------
+    path: str
+        The file that was written.
+    """
+    if format == 'cfradial':
+        import pyart
+        pyart.io.write_cfradial(path, volume)
+        return path
+    if format != 'level2':
+        raise ValueError("The format must be 'level2' or 'cfradial'.")
+    ranges = volume.range['data']
+    if abs(ranges[0] - FIRST_GATE) > 1 or abs(ranges[1] - ranges[0] - GATE_SPACING) > 1:
+        raise ValueError("Level II files need 250 m gates starting at 2125 m.")
+    nsweeps = volume.nsweeps
+    nrays = volume.nrays // nsweeps
+    data = np.ma.filled(volume.fields['reflectivity']['data'].astype(float), np.nan)
+    start_time = volume.time['units'].split()[2].rstrip('Z')[:19]
+    with open(path, 'wb') as f:
+        f.write(make_level2_volume(
+            radar=volume.metadata['instrument_name'], start_time=start_time,
+            elevations=tuple(volume.fixed_angle['data']), nrays=nrays, ngates=volume.ngates,
+            latitude=volume.latitude['data'][0], longitude=volume.longitude['data'][0],
+            altitude=int(round(volume.altitude['data'][0])), reflectivity=data.reshape(nsweeps, nrays, volume.ngates)))
+    return path
+
+
+def nexrad_key(radar, time):
+    """
+    Get the key of a volume in the NEXRAD Level II archive bucket.
+
+    Parameters
+    ----------
+    radar: str
+        The 4-letter code of the radar.
+    time: datetime or str
+        The start time of the volume, in YYYY-MM-DDTHH:MM:SS format if a string.
+
+    Returns
+    -------
+    key: str
+        The key, YYYY/MM/DD/<radar>/<radar>YYYYMMDD_HHMMSS_V06.
+    """
+    if isinstance(time, str):
+        time = datetime.strptime(time, "%Y-%m-%dT%H:%M:%S")
+    return f"{time:%Y/%m/%d}/{radar}/{radar}{time:%Y%m%d_%H%M%S}_V06"
+
+
+def write_synthetic_archive(directory, radar='KLOT', start_time='2025-07-15T18:00:00', n_volumes=12,
+                            interval=300., distance=40000., speed=3., normal_azimuth=60.,
+                            elevations=(0.5,), nrays=360, ngates=460, format='level2'):
+    """
+    Write a series of synthetic volumes with a lake breeze front moving inland, with the key
+    layout of the NEXRAD Level II archive bucket. Serve the directory with
+    :py:meth:`LocalS3Server` to stand in for the bucket.
+
+    Parameters
+    ----------
+    directory: str
+        The root directory of the archive.
+    radar: str
+        The 4-letter code of the radar.
+    start_time: str
+        The start time of the first volume in YYYY-MM-DDTHH:MM:SS format.
+    n_volumes: int
+        The number of volumes.
+    interval: float
+        The time between volumes in seconds.
+    distance: float
+        The distance of the front from the radar in the first volume, in meters.
+    speed: float
+        The speed of the front towards the radar in meters per second.
+    normal_azimuth: float
+        The direction from the radar to the front in degrees.
+    elevations: tuple of floats
+        The elevation angle of each sweep in degrees.
+    nrays: int
+        The number of rays per sweep.
+    ngates: int
+        The number of gates per ray.
+    format: str
+        'level2' or 'cfradial'.
+
+    Returns
+    -------
+    keys: list of str
+        The keys of the volumes, relative to directory.
+    """
+    start = datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%S")
+    keys = []
+    for i in range(n_volumes):
+        time = start + timedelta(seconds=i * interval)
+        echo = combine_echoes(clear_air_echo(seed=i),
+                              fine_line_echo(distance=distance - speed * i * interval,
+                                             normal_azimuth=normal_azimuth))
+        volume = make_radar_volume(radar, f"{time:%Y-%m-%dT%H:%M:%S}", elevations=elevations,
+                                   nrays=nrays, ngates=ngates, reflectivity=echo)
+        key = nexrad_key(radar, time)
+        path = os.path.join(directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_radar_volume(volume, path, format=format)
+        keys.append(key)
+    return keys
+
+
+def _ground_xy(azimuths, ranges):
+    azimuths = np.deg2rad(np.asarray(azimuths))[:, np.newaxis]
+    ranges = np.asarray(ranges)[np.newaxis]
+    return ranges * np.sin(azimuths), ranges * np.cos(azimuths)
@@ -11,8 +11,29 @@ This module handles the generation of scan strategies and triggering of the lida
     :toctree: generated/
 
     make_scan_file
+    build_scan
+    encode_scan_points
     send_scan
     trigger_lidar_ppis_from_mask
     trigger_lidar_rhi_from_mask
+    plan_scan
+    LidarMotionModel
+    ScanPlan
+    dispatch_triggers
+    TriggerResult
+    lidar_name
+    TriggerState
+    scan_from_mask
+    SSHConnectionPool
+    get_default_pool
 """
-from .halo_lidar import make_scan_file, send_scan, trigger_lidar_ppis_from_mask, trigger_lidar_rhi_from_mask         # noqa
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, attributes={
+    'halo_lidar': ['make_scan_file', 'build_scan', 'encode_scan_points', 'scan_from_mask', 'send_scan',
+                   'trigger_lidar_ppis_from_mask', 'trigger_lidar_rhi_from_mask'],
+    'connection_pool': ['SSHConnectionPool', 'PooledConnection', 'get_default_pool'],
+    'scan_planner': ['plan_scan', 'LidarMotionModel', 'ScanPlan', 'shortest_azimuth_delta'],
+    'dispatcher': ['dispatch_triggers', 'TriggerResult', 'lidar_name'],
+    'trigger_state': ['TriggerState'],
+})
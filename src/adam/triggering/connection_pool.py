@@ -0,0 +1,304 @@
+import atexit
+import logging
+import threading
+import socket
+import paramiko
+
+from contextlib import contextmanager
+
+from ..metrics import span
+
+# The errors of a dropped or unreachable link. socket.error is OSError, which local file errors
+# such as FileNotFoundError also are, so only the network subclasses of it are listed.
+CONNECTION_ERRORS = (paramiko.SSHException, EOFError, ConnectionError, socket.timeout,
+                     paramiko.ssh_exception.NoValidConnectionsError)
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+class PooledConnection(object):
+    """
+    An SSH connection held by a :py:meth:`SSHConnectionPool`, with a lazily opened SFTP channel.
+
+    Attributes
+    ----------
+    client: paramiko.SSHClient
+        The connected SSH client.
+    """
+    def __init__(self, client):
+        self.client = client
+        self._sftp = None
+
+    @property
+    def sftp(self):
+        """
+        The SFTP channel of the connection. It is opened on first use and then reused.
+        """
+        if self._sftp is None:
+            self._sftp = self.client.open_sftp()
+        return self._sftp
+
+    def is_active(self):
+        """
+        Check if the SSH transport of the connection is still up.
+        """
+        get_transport = getattr(self.client, 'get_transport', None)
+        if get_transport is None:
+            return True
+        transport = get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        """
+        Close the SFTP channel and the SSH connection.
+        """
+        for resource in [self._sftp, self.client]:
+            if resource is None:
+                continue
+            try:
+                resource.close()
+            except Exception as e:
+                logging.debug(f"Error while closing SSH connection: {e}")
+        self._sftp = None
+
+
+class _Borrow(object):
+    # A connection that is in use, and the slot of the host that it holds
+    __slots__ = ['semaphore', 'connection', 'aborted']
+
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+        self.connection = None
+        self.aborted = False
+
+
+class SSHConnectionPool(object):
+    """
+    A pool of persistent SSH connections and SFTP channels to the lidars, keyed by (host, username).
+    Connections are kept alive with SSH keepalives, checked before they are reused, and reopened
+    when they have dropped, so that a trigger does not pay for a new handshake and
+    authentication every time.
+
+    Parameters
+    ----------
+    client_factory: callable
+        Creates the SSH clients. Default is :py:meth:`paramiko.SSHClient`.
+    keepalive: int
+        The interval in seconds between SSH keepalive packets. Set to 0 to disable keepalives.
+    max_connections_per_host: int
+        The maximum number of connections to the same host that can be in use at once.
+    timeout: float
+        The timeout in seconds for opening a connection, and for waiting for a connection
+        to the host to become free.
+    """
+    def __init__(self, client_factory=paramiko.SSHClient, keepalive=30, max_connections_per_host=1,
+                 timeout=10.):
+        self.client_factory = client_factory
+        self.keepalive = keepalive
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._semaphores = {}
+        self._borrowed = {}
+
+    @contextmanager
+    def connection(self, host, username, password):
+        """
+        Borrow a connection from the pool. The connection is returned to the pool when the
+        block exits, unless a connection error was raised, in which case it is closed.
+
+        Parameters
+        ----------
+        host: str
+            The address of the lidar.
+        username: str
+            The username of the lidar.
+        password: str
+            The lidar's password.
+
+        Returns
+        -------
+        connection: :py:meth:`PooledConnection`
+            The connection.
+        """
+        key = (host, username)
+        semaphore = self._semaphore(host)
+        if not semaphore.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Timed out waiting for a free connection to {host}.")
+        borrow = _Borrow(semaphore)
+        with self._lock:
+            self._borrowed.setdefault(host, set()).add(borrow)
+        try:
+            borrow.connection = self._checkout(key, password)
+            try:
+                yield borrow.connection
+            except CONNECTION_ERRORS:
+                borrow.connection.close()
+                raise
+            except BaseException:
+                self._return(key, borrow)
+                raise
+            self._return(key, borrow)
+        finally:
+            self._release(host, borrow)
+
+    def run(self, host, username, password, func, retries=1):
+        """
+        Call a function with a pooled connection. If the connection fails, it is reopened and the
+        call is retried.
+
+        Parameters
+        ----------
+        host: str
+            The address of the lidar.
+        username: str
+            The username of the lidar.
+        password: str
+            The lidar's password.
+        func: callable
+            The function to call with the :py:meth:`PooledConnection`.
+        retries: int
+            The number of times to retry after a connection error.
+
+        Returns
+        -------
+        result:
+            The return value of func.
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.connection(host, username, password) as connection:
+                    return func(connection)
+            except CONNECTION_ERRORS as e:
+                if attempt == retries:
+                    raise
+                logging.warning(f"Connection to {username}@{host} failed ({e}), reconnecting.")
+
+    def connect(self, host, username, password):
+        """
+        Open a connection ahead of time so that the first trigger does not wait for it.
+
+        Parameters
+        ----------
+        host: str
+            The address of the lidar.
+        username: str
+            The username of the lidar.
+        password: str
+            The lidar's password.
+        """
+        with self.connection(host, username, password):
+            pass
+
+    def abort(self, host):
+        """
+        Close every connection to a host, including the ones in use, and free their slots. Calls
+        that are blocked on a hung lidar then fail instead of holding the connection, and the next
+        trigger of the lidar opens a new connection.
+
+        Parameters
+        ----------
+        host: str
+            The address of the lidar.
+        """
+        with self._lock:
+            borrows = self._borrowed.pop(host, set())
+            idle = []
+            for key in [key for key in self._idle if key[0] == host]:
+                idle.extend(self._idle.pop(key))
+            for borrow in borrows:
+                borrow.aborted = True
+                borrow.semaphore.release()
+        for connection in idle + [b.connection for b in borrows if b.connection is not None]:
+            connection.close()
+        if borrows:
+            logging.warning(f"Closed {len(borrows)} connection(s) in use to {host}.")
+
+    def connected(self):
+        """
+        Get the (host, username) keys that have open connections in the pool.
+        """
+        with self._lock:
+            return sorted(key for key, connections in self._idle.items() if connections)
+
+    def close(self):
+        """
+        Close every idle connection in the pool.
+        """
+        with self._lock:
+            idle = [c for connections in self._idle.values() for c in connections]
+            self._idle = {}
+        for connection in idle:
+            connection.close()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._semaphores[host]
+
+    def _checkout(self, key, password):
+        with self._lock:
+            connections = self._idle.get(key, [])
+            connection = connections.pop() if connections else None
+        if connection is not None:
+            if connection.is_active():
+                return connection
+            logging.info(f"Connection to {key[1]}@{key[0]} dropped, reconnecting.")
+            connection.close()
+        return self._open(key, password)
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def _return(self, key, borrow):
+        # A connection that was aborted while it was in use is not reused
+        if borrow.aborted:
+            borrow.connection.close()
+        else:
+            self._checkin(key, borrow.connection)
+
+    def _release(self, host, borrow):
+        # The slot of an aborted connection has already been freed by abort
+        with self._lock:
+            borrowed = self._borrowed.get(host, set())
+            if borrow not in borrowed:
+                return
+            borrowed.discard(borrow)
+            borrow.semaphore.release()
+
+    def _open(self, key, password):
+        host, username = key
+        client = self.client_factory()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with span('ssh_connect', host=host):
+            client.connect(host, username=username, password=password, timeout=self.timeout)
+        transport = client.get_transport()
+        if transport is not None and self.keepalive:
+            transport.set_keepalive(self.keepalive)
+        logging.info(f"Connected to lidar {username}@{host}.")
+        return PooledConnection(client)
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_val, exc_tb): self.close()
+
+
+def get_default_pool():
+    """
+    Get the connection pool that :py:meth:`send_scan` and the trigger functions use by default.
+    It is closed when the interpreter exits.
+
+    Returns
+    -------
+    pool: :py:meth:`SSHConnectionPool`
+        The default pool.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SSHConnectionPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
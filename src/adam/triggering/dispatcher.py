@@ -0,0 +1,210 @@
+import logging
+import time
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .connection_pool import get_default_pool
+from .halo_lidar import scan_from_mask, _put_scan
+from ..metrics import inc, observe
+
+
+class TriggerResult(object):
+    """
+    The outcome of triggering one lidar.
+
+    Attributes
+    ----------
+    name: str
+        The name of the lidar.
+    host: str
+        The address of the lidar.
+    status: str
+        'triggered' if the scan was uploaded, 'out_of_range' if the lake breeze was farther than
+        max_distance, 'debounced' if the trigger state skipped the upload, 'failed' if every
+        upload attempt failed, and 'timeout' if the upload did not finish within the timeout
+        of the lidar.
+    azimuth: float
+        The azimuth of the lake breeze from the lidar in degrees.
+    distance: float
+        The distance from the lidar to the lake breeze in meters.
+    attempts: int
+        The number of upload attempts.
+    elapsed: float
+        The time in seconds from the start of the dispatch to the end of the upload.
+    error: str or None
+        The last error, or why the trigger state skipped the upload.
+    """
+    def __init__(self, name, host, status, azimuth=np.nan, distance=np.nan, attempts=0, elapsed=0.,
+                 error=None):
+        self.name = name
+        self.host = host
+        self.status = status
+        self.azimuth = azimuth
+        self.distance = distance
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def triggered(self):
+        """
+        True if the scan was uploaded.
+        """
+        return self.status == 'triggered'
+
+    def to_dict(self):
+        """
+        Get the result as a dictionary.
+        """
+        return dict(name=self.name, host=self.host, status=self.status, azimuth=float(self.azimuth),
+                    distance=float(self.distance), attempts=self.attempts, elapsed=self.elapsed,
+                    error=self.error)
+
+
+def dispatch_triggers(rad_scan, lidars, pool=None, timeout=30., retries=1, max_workers=None,
+                      tracker=None, lead_time=None, trigger_state=None):
+    """
+    Trigger several lidars from the same lake breeze mask. The scan of each lidar is made from the
+    mask, and the scans are uploaded to all lidars at the same time, so the dispatch takes about
+    as long as the slowest lidar. A lidar that hangs is reported as timed out without holding up
+    the others.
+
+    Parameters
+    ----------
+    rad_scan: RadarImage
+        The radar scan containing the lake breeze mask.
+    lidars: list of dict
+        The lidars to trigger. Each dictionary has the keys 'lat', 'lon', 'host', 'username',
+        'password' and 'elevations', and optionally 'name', 'mode' ('ppi' or 'rhi'), 'az_width',
+        'max_distance', 'dyn_csm', 'out_file_name', 'time_budget' and 'timeout'.
+    pool: :py:meth:`SSHConnectionPool`, optional
+        The pool of persistent lidar connections to use. If None, the default pool is used.
+    timeout: float
+        The time in seconds that each lidar has to finish its upload, unless its dictionary
+        has a 'timeout'.
+    retries: int
+        The number of times to retry a failed upload within the timeout.
+    max_workers: int, optional
+        The maximum number of concurrent uploads. The default is one per lidar.
+    tracker: :py:meth:`adam.util.FrontTracker`, optional
+        A tracker to aim the scans at the predicted lake breeze position.
+    lead_time: float, optional
+        The time in seconds ahead to aim the scans.
+    trigger_state: :py:meth:`TriggerState`, optional
+        If set, uploads are skipped for lidars where the lake breeze has barely moved since their
+        last scan, and successful uploads are recorded in it. The state is keyed by the host of
+        each lidar, as in :py:meth:`trigger_lidar_ppis_from_mask`, so one state can be shared
+        with the trigger functions.
+
+    Returns
+    -------
+    results: dict
+        The :py:meth:`TriggerResult` of each lidar, keyed by lidar name.
+    """
+    if pool is None:
+        pool = get_default_pool()
+    start = time.monotonic()
+    results = {}
+    uploads = []
+    for lidar in lidars:
+        name = lidar_name(lidar)
+        try:
+            scan, azimuth, distance = scan_from_mask(
+                rad_scan, lidar['lat'], lidar['lon'], lidar['elevations'], mode=lidar.get('mode', 'ppi'),
+                az_width=lidar.get('az_width', 30.), dyn_csm=lidar.get('dyn_csm', False),
+                max_distance=lidar.get('max_distance', 5000), tracker=tracker, lead_time=lead_time,
+                time_budget=lidar.get('time_budget'))
+        except Exception as e:
+            results[name] = TriggerResult(name, lidar['host'], 'failed', error=str(e))
+            continue
+        if scan is None:
+            results[name] = TriggerResult(name, lidar['host'], 'out_of_range', azimuth, distance)
+            continue
+        if trigger_state is not None:
+            upload, reason = trigger_state.check(lidar['host'], scan, azimuth, distance)
+            if not upload:
+                results[name] = TriggerResult(name, lidar['host'], 'debounced', azimuth, distance, error=reason)
+                continue
+        results[name] = TriggerResult(name, lidar['host'], 'pending', azimuth, distance)
+        uploads.append((lidar, scan))
+    if len(uploads) == 0:
+        _record_dispatch(results, start)
+        return results
+
+    scans = {lidar_name(lidar): scan for lidar, scan in uploads}
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(uploads))
+    futures = []
+    for lidar, scan in uploads:
+        deadline = start + lidar.get('timeout', timeout)
+        future = executor.submit(_upload, pool, lidar, scan, retries, deadline, start)
+        futures.append((deadline, lidar, future))
+    for deadline, lidar, future in sorted(futures, key=lambda x: x[0]):
+        result = results[lidar_name(lidar)]
+        try:
+            result.attempts, result.elapsed, result.error = future.result(
+                timeout=max(deadline - time.monotonic(), 0))
+            result.status = 'triggered' if result.error is None else 'failed'
+        except FutureTimeoutError:
+            result.status = 'timeout'
+            result.elapsed = time.monotonic() - start
+            result.error = f"Upload did not finish within {deadline - start:.1f} s."
+            # Close the hung connection so that the upload fails instead of holding the
+            # connection and its slot into the next dispatch
+            pool.abort(lidar['host'])
+        if not result.triggered:
+            logging.warning(f"Triggering lidar {result.name} {result.status}: {result.error}")
+        elif trigger_state is not None:
+            trigger_state.record(result.host, scans[result.name], result.azimuth, result.distance)
+    # Do not wait for the aborted uploads to fail
+    executor.shutdown(wait=False, cancel_futures=True)
+    _record_dispatch(results, start)
+    return results
+
+
+def _record_dispatch(results, start):
+    observe('dispatch', time.monotonic() - start)
+    for result in results.values():
+        inc('triggers', status=result.status)
+
+
+def _upload(pool, lidar, scan, retries, deadline, start):
+    out_file_name = lidar.get('out_file_name', 'user.txt')
+    dyn_csm = lidar.get('dyn_csm', False)
+
+    def put(connection):
+        channel = getattr(connection.sftp, 'get_channel', lambda: None)()
+        if channel is not None:
+            channel.settimeout(max(deadline - time.monotonic(), 0.1))
+        _put_scan(connection.sftp, scan, out_file_name, dyn_csm)
+
+    error = None
+    attempts = 0
+    for attempt in range(retries + 1):
+        attempts += 1
+        try:
+            pool.run(lidar['host'], lidar['username'], lidar['password'], put, retries=0)
+            return attempts, time.monotonic() - start, None
+        except Exception as e:
+            error = str(e)
+            logging.warning(f"Upload to lidar {lidar_name(lidar)} failed on attempt {attempts}: {e}")
+        if time.monotonic() >= deadline:
+            break
+    return attempts, time.monotonic() - start, error
+
+
+def lidar_name(lidar):
+    """
+    Get the name of a lidar, which keys the results of :py:meth:`dispatch_triggers`.
+
+    Parameters
+    ----------
+    lidar: dict
+        The lidar, as passed to :py:meth:`dispatch_triggers`.
+
+    Returns
+    -------
+    name: str
+        The 'name' of the lidar, or its 'host' if it has no name.
+    """
+    return lidar.get('name', lidar['host'])
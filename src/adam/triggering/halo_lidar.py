@@ -1,18 +1,21 @@
 import numpy as np
-import paramiko
 import datetime
+import io
 import os
-import xarray as xr
 import logging
 
 from ..util import azimuth_point
+from ..metrics import timed
+
+_CSM_POINT = "A.1=%d,S.1=%d,P.1=%d*A.2=%d,S.2=%d,P.2=%d\r\nW%d\r\n"
+
 
 def make_scan_file(elevations, azimuths,
                    out_file_name, azi_speed=1.,
                    el_speed=0.1,
                    wait=0, acceleration=30, repeat=7,
                    rays_per_point=20, dyn_csm=False,
-                   AZ_COUNTS_PER_ROT=500000, EL_COUNTS_PER_ROT=250000):
+                   AZ_COUNTS_PER_ROT=500000, EL_COUNTS_PER_ROT=250000, serpentine=False):
     """
     Makes a CSM scanning strategy file for a Halo Photonics Doppler Lidar.
     
@@ -49,6 +52,8 @@ def make_scan_file(elevations, azimuths,
         The number of counts per rotation for the elevation motor. This is a constant that depends
         on the lidar hardware and is used to convert from degrees to the encoded values that the lidar uses
         for its scan strategy.
+    serpentine: bool
+        Set to True to reverse the order of the azimuths on every other elevation.
     
     Returns
     -------
@@ -56,41 +61,155 @@ def make_scan_file(elevations, azimuths,
         This function does not return anything. It generates a CSM scan strategy file for the Halo Lidar 
         and saves it to the specified output file name.
     """    
+    scan = build_scan(elevations, azimuths, azi_speed=azi_speed, el_speed=el_speed, wait=wait,
+                      acceleration=acceleration, repeat=repeat, rays_per_point=rays_per_point,
+                      dyn_csm=dyn_csm, AZ_COUNTS_PER_ROT=AZ_COUNTS_PER_ROT,
+                      EL_COUNTS_PER_ROT=EL_COUNTS_PER_ROT, serpentine=serpentine)
+    with open(out_file_name, 'wb') as output:
+        output.write(scan)
+    return
+
+
+def build_scan(elevations, azimuths, azi_speed=1., el_speed=0.1, wait=0, acceleration=30, repeat=7,
+               rays_per_point=20, dyn_csm=False, AZ_COUNTS_PER_ROT=500000, EL_COUNTS_PER_ROT=250000,
+               serpentine=False):
+    """
+    Makes a CSM scanning strategy for a Halo Photonics Doppler Lidar in memory. The scan visits
+    every azimuth at each elevation. The output is the same as the file written by
+    :py:meth:`make_scan_file`.
+
+    Parameters
+    ----------
+    elevations: float 1d array
+        The elevation of each sweep in the scan in degrees.
+    azimuths: float 1d array
+        The azimuths to visit at each elevation in degrees.
+    serpentine: bool
+        Set to True to reverse the order of the azimuths on every other elevation.
+
+    The other parameters are the same as :py:meth:`make_scan_file`.
+
+    Returns
+    -------
+    scan: bytes
+        The CSM scan strategy.
+    """
+    az_grid = np.tile(np.asarray(azimuths, dtype=float).ravel(), (len(elevations), 1))
+    if serpentine:
+        az_grid[1::2] = az_grid[1::2, ::-1]
+    el_grid = np.repeat(np.asarray(elevations, dtype=float).ravel(), az_grid.shape[1])
+    return encode_scan_points(az_grid.ravel(), el_grid, azi_speed=azi_speed, el_speed=el_speed, wait=wait,
+                              acceleration=acceleration, repeat=repeat, rays_per_point=rays_per_point,
+                              dyn_csm=dyn_csm, AZ_COUNTS_PER_ROT=AZ_COUNTS_PER_ROT,
+                              EL_COUNTS_PER_ROT=EL_COUNTS_PER_ROT)
+
+
+def encode_scan_points(azimuths, elevations, azi_speed=1., el_speed=0.1, wait=0, acceleration=30,
+                       repeat=7, rays_per_point=20, dyn_csm=False,
+                       AZ_COUNTS_PER_ROT=500000, EL_COUNTS_PER_ROT=250000):
+    """
+    Encodes a sequence of (azimuth, elevation) points as a CSM scanning strategy.
+    All points are encoded at once, so dense scans with thousands of points are fast.
+
+    Parameters
+    ----------
+    azimuths: float 1d array
+        The azimuth of each point in degrees.
+    elevations: float 1d array
+        The elevation of each point in degrees.
+
+    The other parameters are the same as :py:meth:`make_scan_file`.
+
+    Returns
+    -------
+    scan: bytes
+        The CSM scan strategy.
+    """
+    azimuths = np.asarray(azimuths, dtype=float).ravel()
+    elevations = np.asarray(elevations, dtype=float).ravel()
+    if azimuths.shape != elevations.shape:
+        raise ValueError("azimuths and elevations must have the same number of points.")
     speed_azi_encoded = int(azi_speed * (AZ_COUNTS_PER_ROT / 360.))
     speed_el_encoded = int(el_speed * (EL_COUNTS_PER_ROT / 360.))
-    clockwise = True
-    no_points = len(azimuths) * len(elevations)
-    with open(out_file_name, 'w') as output:
-        if dyn_csm is False:
-            output.write('%d\r\n' % repeat)
-            output.write('%d\r\n' % no_points)
-            output.write('%d\r\n' % rays_per_point)
-  
-        for el in elevations:
-            if clockwise:
-                az_array = azimuths
-            else:
-                az_array = azimuths.reverse()
-            for az in az_array:
-                azi_encoded = -int(az * (AZ_COUNTS_PER_ROT / 360.))
-                el_encoded = -int(el * (EL_COUNTS_PER_ROT / 360.))
-                output.write("A.1=%d,S.1=%d,P.1=%d*A.2=%d,S.2=%d,P.2=%d\r\n" %
-                             (acceleration, speed_azi_encoded, azi_encoded,
-                              acceleration, speed_el_encoded, el_encoded))
-                output.write('W%d\r\n' % (wait))
-            clockwise = ~clockwise
-    return
+    values = np.empty((len(azimuths), 7), dtype=np.int64)
+    values[:, [0, 3]] = int(acceleration)
+    values[:, 1] = speed_azi_encoded
+    values[:, 2] = -np.trunc(azimuths * (AZ_COUNTS_PER_ROT / 360.))
+    values[:, 4] = speed_el_encoded
+    values[:, 5] = -np.trunc(elevations * (EL_COUNTS_PER_ROT / 360.))
+    values[:, 6] = int(wait)
+    header = ''
+    if dyn_csm is False:
+        header = '%d\r\n%d\r\n%d\r\n' % (repeat, len(azimuths), rays_per_point)
+    return (header + (_CSM_POINT * len(values)) % tuple(values.ravel().tolist())).encode('ascii')
+
+
+@timed('scan_build')
+def scan_from_mask(rad_scan, lidar_lat, lidar_lon, elevations, mode='ppi', az_width=30., dyn_csm=False,
+                   max_distance=5000, registry=None, tracker=None, lead_time=None, time_budget=None,
+                   motion_model=None):
+    """
+    Makes the CSM scan strategy that the trigger functions send to a lidar for a lake breeze mask.
+
+    Parameters
+    ----------
+    rad_scan: RadarImage
+        The radar scan containing the lake breeze mask.
+    lidar_lat: float
+        The latitude of the lidar
+    lidar_lon: float
+        The longitude of the lidar
+    elevations: float 1d array
+        The elevations of the scan.
+    mode: str
+        'ppi' for a PPI sector of width az_width centered on the lake breeze, or 'rhi' for
+        an RHI pointed at the lake breeze.
+
+    The other parameters are the same as :py:meth:`trigger_lidar_ppis_from_mask`.
+
+    Returns
+    -------
+    scan: bytes or None
+        The CSM scan strategy, or None if the lake breeze is farther than max_distance.
+    azimuth: float
+        The azimuth of the lake breeze from the lidar in degrees.
+    dist: float
+        The distance from the lidar to the lake breeze in meters.
+    """
+    middle_azimuth, lat, lon, dist = azimuth_point(lidar_lon, lidar_lat, rad_scan, registry=registry,
+                                                    tracker=tracker, lead_time=lead_time)
+    if dist > max_distance:  # If the distance is greater than max_distance, don't trigger the scan
+        logging.info(f"Distance from lidar to lake breeze region is {dist} meters. Not triggering scan.")
+        return None, middle_azimuth, dist
+    if mode == 'rhi':
+        azimuths = [middle_azimuth]
+    elif mode == 'ppi':
+        azimuths = np.array([middle_azimuth - az_width/2, middle_azimuth + az_width/2])
+    else:
+        raise ValueError(f"Unknown scan mode {mode}, must be 'ppi' or 'rhi'.")
+    return _trigger_scan(elevations, azimuths, dyn_csm, time_budget, motion_model), middle_azimuth, dist
+
+
+def _trigger_scan(elevations, azimuths, dyn_csm, time_budget, motion_model):
+    if time_budget is None:
+        return build_scan(elevations, azimuths, dyn_csm=dyn_csm)
+    from .scan_planner import plan_scan
+    plan = plan_scan(elevations, azimuths, model=motion_model)
+    logging.info(f"Planned a {plan.cycle_time:.1f} s scan cycle ({plan.original_cycle_time:.1f} s unplanned), "
+                 f"repeated {plan.repeats(time_budget)} times.")
+    return plan.to_csm(repeat=plan.repeats(time_budget), dyn_csm=dyn_csm)
 
 
 def send_scan(file_name, lidar_ip_addr, lidar_uname, lidar_pwd, out_file_name='user.txt', dyn_csm=False,
-              client=None):
+              client=None, pool=None):
     """
     Sends a scan to the lidar
 
     Parameters
     ---------
-    file_name: str
-        Path to the CSM-format scan strategy
+    file_name: str or bytes
+        Path to the CSM-format scan strategy, or the scan strategy itself from
+        :py:meth:`build_scan`, which is streamed to the lidar without touching local disk.
     lidar_ip_addr:
         IP address of the lidar
     lidar_uname:
@@ -102,42 +221,40 @@ def send_scan(file_name, lidar_ip_addr, lidar_uname, lidar_pwd, out_file_name='u
     dyn_csm: bool
         Set to True to assume Dynamic CSM mode
     client: paramiko.SSHClient, optional
-        An optional SSH client to use for the connection. If not provided, a new client will be created
-        and closed within this function.
+        An optional SSH client to use for the connection. If not provided, a connection is
+        taken from the pool.
+    pool: :py:meth:`SSHConnectionPool`, optional
+        The pool of persistent lidar connections to use. If None, the default pool is used.
 
     """
     if client is not None:
-        ssh = client
-        close_client = False
+        _put_scan(client.open_sftp(), file_name, out_file_name, dyn_csm)
+        return
+    if pool is None:
+        from .connection_pool import get_default_pool
+        pool = get_default_pool()
+    pool.run(lidar_ip_addr, lidar_uname, lidar_pwd,
+             lambda connection: _put_scan(connection.sftp, file_name, out_file_name, dyn_csm))
+
+
+@timed('upload')
+def _put_scan(sftp, file_name, out_file_name, dyn_csm):
+    if dyn_csm is False:
+        logging.info(f"Writing {out_file_name} on lidar.")
+        remote = "/C:/Lidar/System/Scan parameters/%s" % out_file_name
     else:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(lidar_ip_addr, username=lidar_uname, password=lidar_pwd)
-        print("Connected to the Lidar!")
-        close_client = True
-        
-    if close_client:
-        with ssh.open_sftp() as sftp:
-            if dyn_csm is False:
-                logging.info(f"Writing {out_file_name} on lidar.")
-                sftp.put(file_name, "/C:/Lidar/System/Scan parameters/%s" % out_file_name)
-            else:
-                sftp.put(file_name, f"/C:/Users/End User/DynScan/{out_file_name}")
+        remote = f"/C:/Users/End User/DynScan/{out_file_name}"
+    if isinstance(file_name, (bytes, bytearray)):
+        sftp.putfo(io.BytesIO(file_name), remote)
     else:
-        sftp = ssh.open_sftp()
-        if dyn_csm is False:
-            print(f"Writing {out_file_name} on lidar.")
-            sftp.put(file_name, "/C:/Lidar/System/Scan parameters/%s" % out_file_name)
-        else:
-            sftp.put(file_name, f"/C:/Users/End User/DynScan/{out_file_name}")
-
-    if close_client:
-        ssh.close()
+        sftp.put(file_name, remote)
 
 
 def trigger_lidar_ppis_from_mask(rad_scan, lidar_lat, lidar_lon, lidar_ip_addr, lidar_uname, lidar_pwd, elevations, 
                                  az_width=30., out_file_name='user.txt', dyn_csm=False,
-                                 max_distance=5000, client=None):
+                                 max_distance=5000, client=None, registry=None,
+                                 tracker=None, lead_time=None, pool=None, time_budget=None,
+                                 motion_model=None, trigger_state=None):
     """
     Triggers a PPI scan on the lidar using a scan strategy generated from a lake breeze mask.
 
@@ -166,29 +283,57 @@ def trigger_lidar_ppis_from_mask(rad_scan, lidar_lat, lidar_lon, lidar_ip_addr,
     max_distance: float
         The maximum distance from the lidar to the lake breeze region for the scan to be triggered.
     client: paramiko.SSHClient, optional
-        An optional SSH client to use for the connection. If not provided, a new client will be created
-        and closed within the send_scan function.
+        An optional SSH client to use for the connection. If not provided, a connection is
+        taken from the pool.
+    registry: :py:meth:`adam.util.InstrumentRegistry`, optional
+        The registry that caches the distance field of the lidar on the grid of the radar image.
+        If None, the default registry is used.
+    tracker: :py:meth:`adam.util.FrontTracker`, optional
+        A tracker that has been updated with the latest frame. If given with lead_time, the scan is
+        aimed at the lake breeze position predicted by the tracker.
+    lead_time: float, optional
+        The time in seconds ahead to aim the scan, for example the time until the scan finishes.
+    pool: :py:meth:`SSHConnectionPool`, optional
+        The pool of persistent lidar connections to use. If None, the default pool is used.
+    time_budget: float, optional
+        The time in seconds available for scanning, for example the expected time of the front
+        passage. If set, the scan points are reordered to minimize the motor travel time and the
+        scan is repeated as many times as fits in the budget.
+    motion_model: :py:meth:`LidarMotionModel`, optional
+        The motion model used to plan the scan when time_budget is set.
+    trigger_state: :py:meth:`TriggerState`, optional
+        If set, the upload is skipped when the lake breeze has barely moved since the last scan
+        sent to this lidar, or when the last scan was sent too recently.
     
     Returns
     -------
     bool
         Returns True if the scan was triggered, and False if the scan was not triggered due to the distance from the lidar
-        to the lake breeze region being greater than max_distance.
+        to the lake breeze region being greater than max_distance, or because trigger_state skipped
+        the upload.
     """
-    middle_azimuth, lat, lon, dist = azimuth_point(lidar_lon, lidar_lat, rad_scan)
-    if dist > max_distance:  # If the distance is greater than max_distance, don't trigger the scan
-        logging.info(f"Distance from lidar to lake breeze region is {dist} meters. Not triggering scan.")
+    scan, middle_azimuth, dist = scan_from_mask(rad_scan, lidar_lat, lidar_lon, elevations, mode='ppi',
+                                                az_width=az_width, dyn_csm=dyn_csm, max_distance=max_distance,
+                                                registry=registry, tracker=tracker, lead_time=lead_time,
+                                                time_budget=time_budget, motion_model=motion_model)
+    if scan is None:
         return False
-    azimuths = np.array([middle_azimuth - az_width/2, middle_azimuth + az_width/2])
-
-    make_scan_file(elevations, azimuths, out_file_name, dyn_csm=dyn_csm)
-    send_scan(out_file_name, lidar_ip_addr, lidar_uname, lidar_pwd, out_file_name=out_file_name, dyn_csm=dyn_csm,
-              client=client)
+    if trigger_state is not None:
+        upload, reason = trigger_state.check(lidar_ip_addr, scan, middle_azimuth, dist)
+        if not upload:
+            logging.info(f"Not re-triggering lidar {lidar_ip_addr} ({reason}).")
+            return False
+    send_scan(scan, lidar_ip_addr, lidar_uname, lidar_pwd, out_file_name=out_file_name, dyn_csm=dyn_csm,
+              client=client, pool=pool)
+    if trigger_state is not None:
+        trigger_state.record(lidar_ip_addr, scan, middle_azimuth, dist)
     return True
 
 
 def trigger_lidar_rhi_from_mask(rad_scan, lidar_lat, lidar_lon, lidar_ip_addr, lidar_uname, lidar_pwd, elevations, 
-                                out_file_name='user.txt', dyn_csm=False, max_distance=5000, client=None):
+                                out_file_name='user.txt', dyn_csm=False, max_distance=5000, client=None, registry=None,
+                                tracker=None, lead_time=None, pool=None, time_budget=None,
+                                motion_model=None, trigger_state=None):
     """
     Triggers a PPI scan on the lidar using a scan strategy generated from a lake breeze mask.
 
@@ -221,22 +366,48 @@ def trigger_lidar_rhi_from_mask(rad_scan, lidar_lat, lidar_lon, lidar_ip_addr, l
     max_distance: float
         The maximum distance from the lidar to the lake breeze region for the scan to be triggered.
     client: paramiko.SSHClient, optional
-        An optional SSH client to use for the connection. If not provided, a new client will be created
-        and closed within the send_scan function.
+        An optional SSH client to use for the connection. If not provided, a connection is
+        taken from the pool.
+    registry: :py:meth:`adam.util.InstrumentRegistry`, optional
+        The registry that caches the distance field of the lidar on the grid of the radar image.
+        If None, the default registry is used.
+    tracker: :py:meth:`adam.util.FrontTracker`, optional
+        A tracker that has been updated with the latest frame. If given with lead_time, the scan is
+        aimed at the lake breeze position predicted by the tracker.
+    lead_time: float, optional
+        The time in seconds ahead to aim the scan, for example the time until the scan finishes.
+    pool: :py:meth:`SSHConnectionPool`, optional
+        The pool of persistent lidar connections to use. If None, the default pool is used.
+    time_budget: float, optional
+        The time in seconds available for scanning, for example the expected time of the front
+        passage. If set, the scan points are reordered to minimize the motor travel time and the
+        scan is repeated as many times as fits in the budget.
+    motion_model: :py:meth:`LidarMotionModel`, optional
+        The motion model used to plan the scan when time_budget is set.
+    trigger_state: :py:meth:`TriggerState`, optional
+        If set, the upload is skipped when the lake breeze has barely moved since the last scan
+        sent to this lidar, or when the last scan was sent too recently.
     
     Returns
     -------
     bool
         Returns True if the scan was triggered, and False if the scan was not triggered due to
-        the distance from the lidar to the lake breeze region being greater than max_distance.
+        the distance from the lidar to the lake breeze region being greater than max_distance,
+        or because trigger_state skipped the upload.
     """
-    middle_azimuth, lat, lon, dist = azimuth_point(lidar_lon, lidar_lat, rad_scan)
-    if dist > max_distance:  # If the distance is greater than max_distance, don't trigger the scan
-        logging.info(f"Distance from lidar to lake breeze region is {dist} meters. Not triggering scan.")
+    scan, middle_azimuth, dist = scan_from_mask(rad_scan, lidar_lat, lidar_lon, elevations, mode='rhi',
+                                                dyn_csm=dyn_csm, max_distance=max_distance,
+                                                registry=registry, tracker=tracker, lead_time=lead_time,
+                                                time_budget=time_budget, motion_model=motion_model)
+    if scan is None:
         return False
-    azimuths = [middle_azimuth]
-
-    make_scan_file(elevations, azimuths, out_file_name, dyn_csm=dyn_csm)
-    send_scan(out_file_name, lidar_ip_addr, lidar_uname, lidar_pwd, out_file_name=out_file_name, dyn_csm=dyn_csm,
-              client=client)
+    if trigger_state is not None:
+        upload, reason = trigger_state.check(lidar_ip_addr, scan, middle_azimuth, dist)
+        if not upload:
+            logging.info(f"Not re-triggering lidar {lidar_ip_addr} ({reason}).")
+            return False
+    send_scan(scan, lidar_ip_addr, lidar_uname, lidar_pwd, out_file_name=out_file_name, dyn_csm=dyn_csm,
+              client=client, pool=pool)
+    if trigger_state is not None:
+        trigger_state.record(lidar_ip_addr, scan, middle_azimuth, dist)
     return True
\ No newline at end of file
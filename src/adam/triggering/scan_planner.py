@@ -0,0 +1,290 @@
+import numpy as np
+
+from .halo_lidar import encode_scan_points
+
+
+class LidarMotionModel(object):
+    """
+    A model of how long a Halo Photonics Doppler Lidar takes to move between scan points and to
+    collect the rays at each point. Each motor follows a trapezoidal velocity profile: it
+    accelerates at a constant rate up to its maximum speed, coasts, and decelerates. Both motors
+    move at the same time, so a move takes as long as the slower axis.
+
+    Parameters
+    ----------
+    azi_speed: float
+        The speed of the azimuth motor in degrees per second.
+    el_speed: float
+        The speed of the elevation motor in degrees per second.
+    acceleration: int
+        The acceleration of the motors in ticks per second squared, as written to the CSM file.
+    acceleration_scale: float
+        The number of motor counts per tick of acceleration. The acceleration of each motor in
+        degrees per second squared is acceleration * acceleration_scale * 360 / counts per rotation.
+    wait: int
+        The wait time in milliseconds at each point in the scan.
+    rays_per_point: int
+        The number of rays to collect at each point in the scan.
+    ray_duration: float
+        The time in seconds to collect one ray.
+    AZ_COUNTS_PER_ROT: int
+        The number of counts per rotation for the azimuth motor.
+    EL_COUNTS_PER_ROT: int
+        The number of counts per rotation for the elevation motor.
+    """
+    def __init__(self, azi_speed=1., el_speed=0.1, acceleration=30, acceleration_scale=1000.,
+                 wait=0, rays_per_point=20, ray_duration=1.,
+                 AZ_COUNTS_PER_ROT=500000, EL_COUNTS_PER_ROT=250000):
+        self.azi_speed = azi_speed
+        self.el_speed = el_speed
+        self.acceleration = acceleration
+        self.acceleration_scale = acceleration_scale
+        self.wait = wait
+        self.rays_per_point = rays_per_point
+        self.ray_duration = ray_duration
+        self.AZ_COUNTS_PER_ROT = AZ_COUNTS_PER_ROT
+        self.EL_COUNTS_PER_ROT = EL_COUNTS_PER_ROT
+
+    @property
+    def dwell_time(self):
+        """
+        The time in seconds spent at each point.
+        """
+        return self.wait / 1000. + self.rays_per_point * self.ray_duration
+
+    def move_time(self, az0, el0, az1, el1, wrap=True):
+        """
+        Estimate the time to move between points.
+
+        Parameters
+        ----------
+        az0, el0: float or ndarray
+            The azimuth and elevation of the starting points in degrees.
+        az1, el1: float or ndarray
+            The azimuth and elevation of the end points in degrees.
+        wrap: bool
+            If True, azimuth moves take the shortest way around. If False, the azimuths are
+            treated as absolute motor positions.
+
+        Returns
+        -------
+        time: float or ndarray
+            The move time in seconds.
+        """
+        az_accel = self.acceleration * self.acceleration_scale * 360. / self.AZ_COUNTS_PER_ROT
+        el_accel = self.acceleration * self.acceleration_scale * 360. / self.EL_COUNTS_PER_ROT
+        az_delta = shortest_azimuth_delta(az0, az1) if wrap else np.subtract(az1, az0)
+        az_time = _axis_time(np.abs(az_delta), self.azi_speed, az_accel)
+        el_time = _axis_time(np.abs(np.subtract(el1, el0)), self.el_speed, el_accel)
+        return np.maximum(az_time, el_time)
+
+    def cycle_time(self, azimuths, elevations, wrap=True):
+        """
+        Estimate the time to run the points once in order and return to the first point.
+
+        Parameters
+        ----------
+        azimuths: 1D array
+            The azimuth of each point in degrees.
+        elevations: 1D array
+            The elevation of each point in degrees.
+        wrap: bool
+            If True, azimuth moves take the shortest way around. If False, the azimuths are
+            treated as absolute motor positions.
+
+        Returns
+        -------
+        time: float
+            The cycle time in seconds.
+        """
+        azimuths = np.asarray(azimuths, dtype=float)
+        elevations = np.asarray(elevations, dtype=float)
+        moves = self.move_time(azimuths, elevations, np.roll(azimuths, -1), np.roll(elevations, -1), wrap=wrap)
+        return float(moves.sum() + len(azimuths) * self.dwell_time)
+
+
+class ScanPlan(object):
+    """
+    An ordered lidar scan with its estimated timing.
+
+    Attributes
+    ----------
+    azimuths: 1D array
+        The azimuth of each point in the order of the scan, in degrees. If the azimuths were
+        unwrapped, they may be outside of [0, 360) so that the motor takes the shortest way.
+    elevations: 1D array
+        The elevation of each point in the order of the scan, in degrees.
+    cycle_time: float
+        The estimated time in seconds to run the scan once.
+    original_cycle_time: float
+        The estimated time in seconds to run the points once in the order they were given.
+    model: :py:meth:`LidarMotionModel`
+        The motion model used for the estimates.
+    """
+    def __init__(self, azimuths, elevations, cycle_time, original_cycle_time, model):
+        self.azimuths = azimuths
+        self.elevations = elevations
+        self.cycle_time = cycle_time
+        self.original_cycle_time = original_cycle_time
+        self.model = model
+
+    def repeats(self, time_budget):
+        """
+        Get the number of times that the scan fits in a time budget.
+
+        Parameters
+        ----------
+        time_budget: float
+            The time budget in seconds.
+
+        Returns
+        -------
+        repeat: int
+            The number of complete cycles, at least 1.
+        """
+        return max(int(time_budget // self.cycle_time), 1)
+
+    def to_csm(self, repeat=7, dyn_csm=False):
+        """
+        Encode the planned scan as a CSM scan strategy.
+
+        Parameters
+        ----------
+        repeat: int
+            The number of times to repeat the scan strategy.
+        dyn_csm: bool
+            Set to True to send CSM assuming Dynamic CSM mode
+
+        Returns
+        -------
+        scan: bytes
+            The CSM scan strategy.
+        """
+        model = self.model
+        return encode_scan_points(self.azimuths, self.elevations, azi_speed=model.azi_speed,
+                                  el_speed=model.el_speed, wait=model.wait, acceleration=model.acceleration,
+                                  repeat=repeat, rays_per_point=model.rays_per_point, dyn_csm=dyn_csm,
+                                  AZ_COUNTS_PER_ROT=model.AZ_COUNTS_PER_ROT,
+                                  EL_COUNTS_PER_ROT=model.EL_COUNTS_PER_ROT)
+
+
+def plan_scan(elevations, azimuths, model=None, optimize=True, unwrap_azimuths=True,
+              max_two_opt_points=1000):
+    """
+    Plan a lidar scan that visits every azimuth at each elevation in the least time. The given
+    order, a serpentine order, and a nearest neighbor tour refined with 2-opt are compared with
+    the motion model, and the fastest is kept.
+
+    Parameters
+    ----------
+    elevations: float 1d array
+        The elevation of each sweep in the scan in degrees.
+    azimuths: float 1d array
+        The azimuths to visit at each elevation in degrees.
+    model: :py:meth:`LidarMotionModel`, optional
+        The motion model of the lidar. If None, the default model is used.
+    optimize: bool
+        Set to False to keep the given order and only estimate its timing.
+    unwrap_azimuths: bool
+        If True, the azimuths are unwrapped so that every move goes the shortest way around,
+        which gives encoded positions outside of [0, 360) degrees.
+    max_two_opt_points: int
+        The 2-opt refinement is skipped for scans with more points than this.
+
+    Returns
+    -------
+    plan: :py:meth:`ScanPlan`
+        The planned scan.
+    """
+    if model is None:
+        model = LidarMotionModel()
+    az_grid = np.tile(np.asarray(azimuths, dtype=float).ravel(), (len(elevations), 1))
+    el_grid = np.repeat(np.asarray(elevations, dtype=float).ravel(), az_grid.shape[1])
+    az = az_grid.ravel()
+    original_time = model.cycle_time(az, el_grid, wrap=False)
+
+    orders = [np.arange(len(az))]
+    if optimize and len(az) > 2:
+        serpentine = np.arange(az_grid.size).reshape(az_grid.shape)
+        serpentine[1::2] = serpentine[1::2, ::-1]
+        orders.append(serpentine.ravel())
+        if len(az) <= max_two_opt_points:
+            costs = model.move_time(az[:, np.newaxis], el_grid[:, np.newaxis], az[np.newaxis], el_grid[np.newaxis])
+            orders.append(_two_opt(_nearest_neighbor_tour(costs), costs))
+
+    # The motor moves between absolute positions, so each order is scored as it will be encoded
+    candidates = []
+    for order in orders:
+        candidates.append((az[order], el_grid[order]))
+        if unwrap_azimuths and len(az) > 1:
+            unwrapped = az[order][0] + np.concatenate(
+                [[0.], np.cumsum(shortest_azimuth_delta(az[order][:-1], az[order][1:]))])
+            unwrapped -= 360. * np.floor(unwrapped.mean() / 360.)
+            candidates.append((unwrapped, el_grid[order]))
+    times = [model.cycle_time(a, e, wrap=False) for a, e in candidates]
+    best = int(np.argmin(times))
+    return ScanPlan(candidates[best][0], candidates[best][1], times[best], original_time, model)
+
+
+def shortest_azimuth_delta(az0, az1):
+    """
+    Get the signed change in azimuth that goes the shortest way around from az0 to az1.
+
+    Parameters
+    ----------
+    az0, az1: float or ndarray
+        The azimuths in degrees.
+
+    Returns
+    -------
+    delta: float or ndarray
+        The change in degrees, between -180 and 180.
+    """
+    return (np.subtract(az1, az0) + 180.) % 360. - 180.
+
+
+def _axis_time(distance, speed, acceleration):
+    # Triangular profile if the motor never reaches full speed, trapezoidal otherwise
+    distance = np.asarray(distance, dtype=float)
+    triangular = 2 * np.sqrt(distance / acceleration)
+    trapezoidal = distance / speed + speed / acceleration
+    return np.where(distance <= speed ** 2 / acceleration, triangular, trapezoidal)
+
+
+def _nearest_neighbor_tour(costs):
+    n = len(costs)
+    visited = np.zeros(n, dtype=bool)
+    tour = [0]
+    visited[0] = True
+    for i in range(n - 1):
+        row = np.where(visited, np.inf, costs[tour[-1]])
+        nxt = int(np.argmin(row))
+        tour.append(nxt)
+        visited[nxt] = True
+    return np.array(tour)
+
+
+def _two_opt(tour, costs, max_passes=20):
+    # Reverse tour[i + 1:j + 1] whenever it shortens the closed tour
+    tour = tour.copy()
+    n = len(tour)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            a, b = tour[i], tour[i + 1]
+            c = tour[i + 2:]
+            d = np.roll(tour, -1)[i + 2:]
+            gain = costs[a, b] + costs[c, d] - costs[a, c] - costs[b, d]
+            if i == 0:
+                # The last edge wraps back to a
+                gain = gain[:-1]
+            if len(gain) == 0:
+                continue
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                j += i + 2
+                tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return tour
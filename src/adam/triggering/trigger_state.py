@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .scan_planner import shortest_azimuth_delta
+
+
+class TriggerState(object):
+    """
+    Remembers the last scan uploaded to each lidar so that uploads that would barely change the
+    pointing are skipped. Every upload interrupts the scan that the lidar is running, so a new
+    scan is only sent when the lake breeze has moved by more than the thresholds, and never
+    sooner than the minimum dwell time after the previous upload.
+
+    Parameters
+    ----------
+    azimuth_threshold: float
+        The minimum change in degrees of the azimuth to the lake breeze for a new upload.
+    distance_threshold: float
+        The minimum change in meters of the distance to the lake breeze for a new upload.
+    min_dwell: float
+        The minimum time in seconds between uploads to the same lidar.
+    path: str or None
+        If set, the state is loaded from this JSON file if it exists, and saved to it after
+        every upload.
+    """
+    def __init__(self, azimuth_threshold=5., distance_threshold=500., min_dwell=300., path=None):
+        self.azimuth_threshold = azimuth_threshold
+        self.distance_threshold = distance_threshold
+        self.min_dwell = min_dwell
+        self.path = path
+        self.lidars = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def check(self, host, scan, azimuth, distance, now=None):
+        """
+        Decide whether a new scan should be uploaded to a lidar.
+
+        Parameters
+        ----------
+        host: str
+            The address of the lidar, which keys the state of each lidar.
+        scan: bytes
+            The new CSM scan strategy.
+        azimuth: float
+            The azimuth of the lake breeze from the lidar in degrees.
+        distance: float
+            The distance from the lidar to the lake breeze in meters.
+        now: float, optional
+            The current time in seconds since the epoch.
+
+        Returns
+        -------
+        upload: bool
+            True if the scan should be uploaded.
+        reason: str
+            'first', 'moved', 'unchanged', 'dwell' or 'small_change'.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            last = self.lidars.get(host)
+        if last is None:
+            return True, 'first'
+        if last['hash'] == _scan_hash(scan):
+            return False, 'unchanged'
+        if now - last['time'] < self.min_dwell:
+            return False, 'dwell'
+        if (abs(shortest_azimuth_delta(last['azimuth'], azimuth)) < self.azimuth_threshold and
+                abs(distance - last['distance']) < self.distance_threshold):
+            return False, 'small_change'
+        return True, 'moved'
+
+    def record(self, host, scan, azimuth, distance, now=None):
+        """
+        Record that a scan was uploaded to a lidar.
+
+        Parameters
+        ----------
+        host: str
+            The address of the lidar, which keys the state of each lidar.
+        scan: bytes
+            The uploaded CSM scan strategy.
+        azimuth: float
+            The azimuth of the lake breeze from the lidar in degrees.
+        distance: float
+            The distance from the lidar to the lake breeze in meters.
+        now: float, optional
+            The current time in seconds since the epoch.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            uploads = self.lidars.get(host, {}).get('uploads', 0)
+            self.lidars[host] = dict(hash=_scan_hash(scan), azimuth=float(azimuth), distance=float(distance),
+                                     time=now, uploads=uploads + 1)
+        if self.path is not None:
+            self.save()
+
+    def save(self, path=None):
+        """
+        Save the state to a JSON file.
+
+        Parameters
+        ----------
+        path: str, optional
+            The file to save to. Default is the path of the state.
+        """
+        path = self.path if path is None else path
+        with self._lock:
+            state = dict(lidars=self.lidars)
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_file, path)
+
+    def load(self, path=None):
+        """
+        Load the state from a JSON file.
+
+        Parameters
+        ----------
+        path: str, optional
+            The file to load from. Default is the path of the state.
+        """
+        path = self.path if path is None else path
+        try:
+            with open(path) as f:
+                lidars = json.load(f)['lidars']
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not load the trigger state from {path}: {e}")
+            return
+        with self._lock:
+            self.lidars = lidars
+
+
+def _scan_hash(scan):
+    return hashlib.sha256(scan).hexdigest()
@@ -11,6 +11,28 @@ This module contains utility functions for the ADAM package.
     :toctree: generated/
 
     azimuth_point
+    azimuth_point_batch
+    filter_speckles
+    InstrumentRegistry
+    InstrumentGeometry
+    SteeringEngine
+    angular_extent
+    FrontLines
+    extract_front_lines
+    skeletonize
+    encode_front_lines
+    decode_front_lines
+    FrontTracker
 """
 
-from .instrument_steering import azimuth_point
\ No newline at end of file
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, attributes={
+    'instrument_steering': ['azimuth_point', 'azimuth_point_batch'],
+    'mask_filters': ['filter_speckles', 'label_frames'],
+    'instrument_geometry': ['InstrumentGeometry', 'InstrumentRegistry', 'INSTRUMENT_REGISTRY'],
+    'steering_engine': ['SteeringEngine', 'angular_extent'],
+    'front_lines': ['FrontLines', 'extract_front_lines', 'skeletonize', 'encode_front_lines',
+                    'decode_front_lines'],
+    'front_tracker': ['FrontTrack', 'FrontTracker'],
+})
@@ -0,0 +1,282 @@
+import struct
+import numpy as np
+
+from .mask_filters import filter_speckles
+
+FRONT_LINES_MAGIC = b'ADFL'
+FRONT_LINES_VERSION = 1
+_HEADER = struct.Struct('>4sBqddddHHH')
+_NAT = np.iinfo(np.int64).min
+_OFFSETS = [(-1, 0), (0, 1), (1, 0), (0, -1), (-1, 1), (1, 1), (1, -1), (-1, -1)]
+
+
+class FrontLines(object):
+    """
+    The lake breeze front lines of one frame as simplified polylines.
+
+    Attributes
+    ----------
+    pixels: list of 2D int arrays
+        The (row, col) grid indices of the vertices of each polyline, with rows along
+        latitude and columns along longitude.
+    lat_bounds: 2-tuple
+        The first and last latitude of the grid.
+    lon_bounds: 2-tuple
+        The first and last longitude of the grid.
+    shape: 2-tuple
+        The number of latitudes and longitudes of the grid.
+    time: np.datetime64 or None
+        The time of the frame.
+    """
+    def __init__(self, pixels, lat_bounds, lon_bounds, shape, time=None):
+        self.pixels = pixels
+        self.lat_bounds = tuple(float(x) for x in lat_bounds)
+        self.lon_bounds = tuple(float(x) for x in lon_bounds)
+        self.shape = tuple(int(x) for x in shape)
+        self.time = time
+
+    @property
+    def polylines(self):
+        """
+        The (lat, lon) vertices of each polyline in degrees.
+        """
+        lats = np.linspace(self.lat_bounds[0], self.lat_bounds[1], self.shape[0])
+        lons = np.linspace(self.lon_bounds[0], self.lon_bounds[1], self.shape[1])
+        return [np.column_stack([lats[p[:, 0]], lons[p[:, 1]]]) for p in self.pixels]
+
+    @property
+    def bbox(self):
+        """
+        The (lat_min, lat_max, lon_min, lon_max) bounding box of the front lines, or None if
+        there are no front lines.
+        """
+        if len(self.pixels) == 0:
+            return None
+        vertices = np.concatenate(self.polylines)
+        return (vertices[:, 0].min(), vertices[:, 0].max(), vertices[:, 1].min(), vertices[:, 1].max())
+
+    def __len__(self):
+        return len(self.pixels)
+
+
+def extract_front_lines(radar_image, tolerance=1., area_threshold=20, min_length=3):
+    """
+    Extract the lake breeze front lines of every frame of a RadarImage as simplified polylines.
+    The filtered masks are thinned to one pixel wide lines, the lines are traced into polylines,
+    and the polylines are simplified with the Douglas-Peucker algorithm.
+
+    Parameters
+    ----------
+    radar_image: RadarImage
+        The RadarImage object containing one or more lake breeze masks.
+    tolerance: float
+        The simplification tolerance in pixels. Larger values give fewer vertices.
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments. This helps
+        remove false positive speckles that are identified by the model.
+    min_length: int
+        Traced lines with fewer pixels than this are dropped.
+
+    Returns
+    -------
+    front_lines: list of :py:meth:`FrontLines`
+        The front lines of each frame.
+    """
+    masks = np.asarray(radar_image.lakebreeze_mask)
+    if masks.ndim == 2:
+        masks = masks[np.newaxis]
+    # Masks are stored as (lon, lat); work in (lat, lon) like the grid coordinates
+    masks = filter_speckles(np.transpose(masks, (0, 2, 1)) != 0, area_threshold)
+    skeletons = skeletonize(masks)
+    lat_bounds = (radar_image.grid_lat[0], radar_image.grid_lat[-1])
+    lon_bounds = (radar_image.grid_lon[0], radar_image.grid_lon[-1])
+    times = radar_image.times
+    if times is not None:
+        times = np.atleast_1d(times)
+
+    front_lines = []
+    for i, skeleton in enumerate(skeletons):
+        pixels = [_douglas_peucker(np.array(path), tolerance) for path in _trace(skeleton)
+                  if len(path) >= min_length]
+        time = times[i] if times is not None and i < len(times) else None
+        front_lines.append(FrontLines(pixels, lat_bounds, lon_bounds, skeleton.shape, time))
+    return front_lines
+
+
+def skeletonize(mask):
+    """
+    Thin a mask or a batch of masks to one pixel wide lines with the Zhang-Suen algorithm.
+
+    Parameters
+    ----------
+    mask: 2D or 3D ndarray
+        The mask or batch of masks. If the mask is 3D, the first dimension is time and
+        the frames are thinned together.
+
+    Returns
+    -------
+    skeleton: ndarray
+        The boolean skeleton with the same shape as the mask.
+    """
+    image = np.asarray(mask) != 0
+    squeeze = image.ndim == 2
+    if squeeze:
+        image = image[np.newaxis]
+    image = np.pad(image, ((0, 0), (1, 1), (1, 1)))
+    center = image[:, 1:-1, 1:-1]
+    changed = True
+    while changed:
+        changed = False
+        for step in range(2):
+            # Clockwise from north
+            p = [image[:, :-2, 1:-1], image[:, :-2, 2:], image[:, 1:-1, 2:], image[:, 2:, 2:],
+                 image[:, 2:, 1:-1], image[:, 2:, :-2], image[:, 1:-1, :-2], image[:, :-2, :-2]]
+            neighbours = np.sum(p, axis=0, dtype=np.uint8)
+            transitions = np.sum([~p[i] & p[(i + 1) % 8] for i in range(8)], axis=0, dtype=np.uint8)
+            remove = center & (neighbours >= 2) & (neighbours <= 6) & (transitions == 1)
+            if step == 0:
+                remove &= ~(p[0] & p[2] & p[4]) & ~(p[2] & p[4] & p[6])
+            else:
+                remove &= ~(p[0] & p[2] & p[6]) & ~(p[0] & p[4] & p[6])
+            if remove.any():
+                center &= ~remove
+                changed = True
+    skeleton = center.copy()
+    return skeleton[0] if squeeze else skeleton
+
+
+def encode_front_lines(front_lines):
+    """
+    Encode the front lines of one frame in a compact binary format. The vertices are stored as
+    grid indices, with the first vertex of each polyline as int16 values and the others
+    as int16 differences from the previous vertex.
+
+    Parameters
+    ----------
+    front_lines: :py:meth:`FrontLines`
+        The front lines to encode.
+
+    Returns
+    -------
+    data: bytes
+        The encoded front lines.
+    """
+    time = _NAT if front_lines.time is None else np.datetime64(front_lines.time, 's').astype(np.int64)
+    parts = [_HEADER.pack(FRONT_LINES_MAGIC, FRONT_LINES_VERSION, int(time), *front_lines.lat_bounds,
+                          *front_lines.lon_bounds, *front_lines.shape, len(front_lines.pixels))]
+    for pixels in front_lines.pixels:
+        deltas = np.diff(pixels, axis=0, prepend=np.zeros((1, 2), dtype=pixels.dtype))
+        parts.append(struct.pack('>H', len(pixels)))
+        parts.append(deltas.astype('>i2').tobytes())
+    return b''.join(parts)
+
+
+def decode_front_lines(data):
+    """
+    Decode front lines encoded with :py:meth:`encode_front_lines`.
+
+    Parameters
+    ----------
+    data: bytes
+        The encoded front lines.
+
+    Returns
+    -------
+    front_lines: :py:meth:`FrontLines`
+        The decoded front lines.
+    """
+    magic, version, time, lat0, lat1, lon0, lon1, nlat, nlon, count = _HEADER.unpack_from(data)
+    if magic != FRONT_LINES_MAGIC or version != FRONT_LINES_VERSION:
+        raise ValueError("Data are not encoded front lines.")
+    pos = _HEADER.size
+    pixels = []
+    for i in range(count):
+        npoints = struct.unpack_from('>H', data, pos)[0]
+        pos += 2
+        deltas = np.frombuffer(data, dtype='>i2', count=2 * npoints, offset=pos).reshape(npoints, 2)
+        pos += 4 * npoints
+        pixels.append(np.cumsum(deltas.astype(np.int64), axis=0))
+    time = None if time == _NAT else np.datetime64(time, 's')
+    return FrontLines(pixels, (lat0, lat1), (lon0, lon1), (nlat, nlon), time)
+
+
+def _trace(skeleton):
+    rows, cols = np.nonzero(skeleton)
+    pixels = set(zip(rows.tolist(), cols.tolist()))
+    neighbours = {p: _neighbours(p, pixels) for p in pixels}
+    nodes = sorted(p for p in pixels if len(neighbours[p]) != 2)
+    visited = set()
+    paths = []
+    for node in nodes:
+        if not neighbours[node]:
+            paths.append([node])
+        for start in neighbours[node]:
+            if frozenset((node, start)) in visited:
+                continue
+            visited.add(frozenset((node, start)))
+            path = [node]
+            prev, cur = node, start
+            while True:
+                path.append(cur)
+                if len(neighbours[cur]) != 2:
+                    break
+                nxt = neighbours[cur][0] if neighbours[cur][0] != prev else neighbours[cur][1]
+                if frozenset((cur, nxt)) in visited:
+                    break
+                visited.add(frozenset((cur, nxt)))
+                prev, cur = cur, nxt
+            paths.append(path)
+
+    # Closed loops have no end points or junctions
+    seen = set(p for path in paths for p in path)
+    for start in sorted(pixels - seen):
+        if start in seen:
+            continue
+        path = [start]
+        seen.add(start)
+        prev, cur = start, neighbours[start][0]
+        while cur != start:
+            path.append(cur)
+            seen.add(cur)
+            nxt = neighbours[cur][0] if neighbours[cur][0] != prev else neighbours[cur][1]
+            prev, cur = cur, nxt
+        path.append(start)
+        paths.append(path)
+    return paths
+
+
+def _neighbours(p, pixels):
+    # m-adjacency: a diagonal neighbour only counts if no shared 4-neighbour connects them,
+    # so that staircases are traced as single lines instead of junctions
+    result = []
+    for dr, dc in _OFFSETS:
+        q = (p[0] + dr, p[1] + dc)
+        if q not in pixels:
+            continue
+        if dr != 0 and dc != 0 and ((p[0] + dr, p[1]) in pixels or (p[0], p[1] + dc) in pixels):
+            continue
+        result.append(q)
+    return result
+
+
+def _douglas_peucker(points, tolerance):
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        segment = (points[end] - points[start]).astype(float)
+        offsets = (points[start + 1:end] - points[start]).astype(float)
+        length = np.hypot(*segment)
+        if length == 0:
+            dist = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            dist = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            keep[start + 1 + i] = True
+            stack.append((start, start + 1 + i))
+            stack.append((start + 1 + i, end))
+    return points[keep]
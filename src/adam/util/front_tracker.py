@@ -0,0 +1,225 @@
+import numpy as np
+
+from scipy.ndimage import label
+
+from .mask_filters import filter_speckles
+
+
+class FrontTrack(object):
+    """
+    A lake breeze region followed across frames.
+
+    Attributes
+    ----------
+    track_id: int
+        The identifier of the track.
+    time: np.datetime64
+        The time of the last frame in which the region was seen.
+    rows, cols: 1D int arrays
+        The (lat, lon) grid indices of the pixels of the region in the last frame.
+    x, y: float
+        The centroid of the region in meters.
+    u, v: float
+        The smoothed eastward and northward motion of the region in m/s.
+    age: int
+        The number of frames in which the region was seen.
+    missed: int
+        The number of consecutive frames in which the region was not found.
+    """
+    def __init__(self, track_id, time, rows, cols, x, y):
+        self.track_id = track_id
+        self.time = time
+        self.rows = rows
+        self.cols = cols
+        self.x = x
+        self.y = y
+        self.u = 0.
+        self.v = 0.
+        self.age = 1
+        self.missed = 0
+
+    def position(self, time):
+        """
+        The centroid of the region extrapolated to a time.
+        """
+        lead = _seconds(time - self.time)
+        return self.x + self.u * lead, self.y + self.v * lead
+
+
+class FrontTracker(object):
+    """
+    Tracks lake breeze regions across the frames of a RadarImage by matching their centroids and
+    extrapolates their motion so that instruments can be aimed at where the front will be.
+    Each call to :py:meth:`update` only processes the new frame.
+
+    Parameters
+    ----------
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments. This helps
+        remove false positive speckles that are identified by the model.
+    max_speed: float
+        The maximum speed in m/s at which a region can move between frames and still be matched.
+    smoothing: float
+        The weight between 0 and 1 given to the latest motion estimate when updating the smoothed
+        motion of a track. Lower values give smoother motion.
+    max_missed: int
+        The number of consecutive frames that a region can go unmatched before its track is dropped.
+    """
+    def __init__(self, area_threshold=20, max_speed=15., smoothing=0.5, max_missed=1):
+        self.area_threshold = area_threshold
+        self.max_speed = max_speed
+        self.smoothing = smoothing
+        self.max_missed = max_missed
+        self.tracks = []
+        self.time = None
+        self.grid_lat = None
+        self.grid_lon = None
+        self.grid_x = None
+        self.grid_y = None
+        self._next_id = 0
+
+    def update(self, radar_image, index=None, time=None):
+        """
+        Add a new frame to the tracker.
+
+        Parameters
+        ----------
+        radar_image: RadarImage
+            The RadarImage object containing the lake breeze mask.
+        index: int, optional
+            If the radar image contains multiple time frames, specify the index of the frame to use.
+            If None, use the first frame.
+        time: np.datetime64, optional
+            The time of the frame. If None, the time is taken from the times of the RadarImage.
+
+        Returns
+        -------
+        tracks: list of :py:meth:`FrontTrack`
+            The tracks that are active after the update.
+        """
+        mask = np.asarray(radar_image[0] if index is None else radar_image[index])
+        if time is None:
+            time = np.atleast_1d(radar_image.times)[0 if index is None else index]
+        time = np.datetime64(time, 's')
+        if self.time is not None and time <= self.time:
+            raise ValueError(f"Frame time {time} is not after the last frame time {self.time}.")
+        self.grid_lat = radar_image.grid_lat
+        self.grid_lon = radar_image.grid_lon
+        self.grid_x = np.asarray(radar_image.grid_x)
+        self.grid_y = np.asarray(radar_image.grid_y)
+
+        # Masks are stored as (lon, lat); work in (lat, lon) like the grid coordinates
+        mask = filter_speckles(mask.T != 0, self.area_threshold)
+        labels, num_features = label(mask)
+        rows, cols = np.nonzero(labels)
+        order = np.argsort(labels[rows, cols], kind='stable')
+        rows, cols = rows[order], cols[order]
+        splits = np.cumsum(np.bincount(labels[rows, cols], minlength=num_features + 1)[1:])[:-1]
+        regions = list(zip(np.split(rows, splits), np.split(cols, splits))) if num_features else []
+        centroids = np.array([(self.grid_x[c].mean(), self.grid_y[r].mean()) for r, c in regions])
+
+        # Greedily match each region to the nearest predicted track position
+        matched_tracks = set()
+        matched_regions = set()
+        if len(self.tracks) and len(regions):
+            predicted = np.array([track.position(time) for track in self.tracks])
+            dist = np.hypot(predicted[:, np.newaxis, 0] - centroids[np.newaxis, :, 0],
+                            predicted[:, np.newaxis, 1] - centroids[np.newaxis, :, 1])
+            max_dist = np.array([self.max_speed * _seconds(time - track.time) for track in self.tracks])
+            for t, r in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+                if dist[t, r] > max_dist[t] or t in matched_tracks or r in matched_regions:
+                    continue
+                matched_tracks.add(t)
+                matched_regions.add(r)
+                self._advance(self.tracks[t], time, regions[r], centroids[r])
+
+        tracks = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+            if track.missed <= self.max_missed:
+                tracks.append(track)
+        for r, (region_rows, region_cols) in enumerate(regions):
+            if r not in matched_regions:
+                tracks.append(FrontTrack(self._next_id, time, region_rows, region_cols, *centroids[r]))
+                self._next_id += 1
+        self.tracks = tracks
+        self.time = time
+        return self.tracks
+
+    def predict(self, lead_time):
+        """
+        Extrapolate the centroids of the tracked regions.
+
+        Parameters
+        ----------
+        lead_time: float
+            The time in seconds after the last frame to extrapolate to.
+
+        Returns
+        -------
+        predictions: list of dict
+            The track_id, x, y, lat, lon, u and v of each track at the lead time.
+        """
+        predictions = []
+        time = self.time + np.timedelta64(int(round(lead_time)), 's')
+        for track in self.tracks:
+            x, y = track.position(time)
+            col = (x - self.grid_x[0]) / _spacing(self.grid_x)
+            row = (y - self.grid_y[0]) / _spacing(self.grid_y)
+            predictions.append(dict(track_id=track.track_id, x=x, y=y,
+                                    lat=np.interp(row, np.arange(len(self.grid_lat)), self.grid_lat),
+                                    lon=np.interp(col, np.arange(len(self.grid_lon)), self.grid_lon),
+                                    u=track.u, v=track.v))
+        return predictions
+
+    def predict_mask(self, lead_time):
+        """
+        Make the lake breeze mask expected at a time after the last frame by moving each tracked
+        region along its motion vector.
+
+        Parameters
+        ----------
+        lead_time: float
+            The time in seconds after the last frame to extrapolate to.
+
+        Returns
+        -------
+        mask: 2D ndarray
+            The predicted lake breeze mask with the same (lon, lat) layout as the
+            masks of a RadarImage.
+        """
+        if self.time is None:
+            raise ValueError("The tracker has not been updated with any frames.")
+        mask = np.zeros((len(self.grid_lat), len(self.grid_lon)), dtype=np.int64)
+        time = self.time + np.timedelta64(int(round(lead_time)), 's')
+        for track in self.tracks:
+            lead = _seconds(time - track.time)
+            rows = track.rows + int(round(track.v * lead / _spacing(self.grid_y)))
+            cols = track.cols + int(round(track.u * lead / _spacing(self.grid_x)))
+            inside = (rows >= 0) & (rows < mask.shape[0]) & (cols >= 0) & (cols < mask.shape[1])
+            mask[rows[inside], cols[inside]] = 1
+        return mask.T
+
+    def _advance(self, track, time, region, centroid):
+        dt = _seconds(time - track.time)
+        u = (centroid[0] - track.x) / dt
+        v = (centroid[1] - track.y) / dt
+        if track.age == 1:
+            track.u, track.v = u, v
+        else:
+            track.u = self.smoothing * u + (1 - self.smoothing) * track.u
+            track.v = self.smoothing * v + (1 - self.smoothing) * track.v
+        track.x, track.y = centroid
+        track.rows, track.cols = region
+        track.time = time
+        track.age += 1
+        track.missed = 0
+
+
+def _seconds(delta):
+    return delta / np.timedelta64(1, 's')
+
+
+def _spacing(coords):
+    return (coords[-1] - coords[0]) / (len(coords) - 1)
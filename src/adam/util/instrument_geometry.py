@@ -0,0 +1,154 @@
+import hashlib
+import os
+import numpy as np
+
+
+class InstrumentGeometry(object):
+    """
+    The fixed geometry of an instrument on the grid of a RadarImage. All rasters are in
+    (lat, lon) order, so index them with the transpose of the lake breeze mask.
+
+    Attributes
+    ----------
+    lat_index: int
+        The row of the grid pixel closest to the instrument.
+    lon_index: int
+        The column of the grid pixel closest to the instrument.
+    x: float
+        The x coordinate of the instrument pixel in meters.
+    y: float
+        The y coordinate of the instrument pixel in meters.
+    distance: 2D ndarray
+        The distance in meters from the instrument pixel to every pixel of the grid.
+    bearing: 2D ndarray
+        The azimuth angle in degrees clockwise from north from the instrument pixel to every
+        pixel of the grid.
+    """
+    def __init__(self, lat_index, lon_index, x, y, distance, bearing):
+        self.lat_index = lat_index
+        self.lon_index = lon_index
+        self.x = x
+        self.y = y
+        self.distance = distance
+        self.bearing = bearing
+
+
+class InstrumentRegistry(object):
+    """
+    A registry of instruments that caches the distance and bearing rasters of each instrument
+    for each grid definition. The rasters are computed the first time that an instrument is
+    used on a grid and are reused by every later steering decision on that grid.
+
+    Parameters
+    ----------
+    cache_dir: str or None
+        If set, the rasters are also saved to this directory and memory-mapped from it, so
+        that they survive restarts and can be shared between processes.
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.instruments = {}
+        self._cache = {}
+
+    def register(self, name, lon, lat):
+        """
+        Register an instrument under a name.
+
+        Parameters
+        ----------
+        name: str
+            The name of the instrument.
+        lon: float
+            Longitude of the instrument in degrees.
+        lat: float
+            Latitude of the instrument in degrees.
+        """
+        self.instruments[name] = (lon, lat)
+
+    def geometry(self, instrument, radar_image):
+        """
+        Get the geometry of an instrument on the grid of a RadarImage.
+
+        Parameters
+        ----------
+        instrument: str or 2-tuple
+            The name of a registered instrument, or its (lon, lat) in degrees.
+        radar_image: RadarImage
+            The RadarImage whose grid to use.
+
+        Returns
+        -------
+        geometry: :py:meth:`InstrumentGeometry`
+            The cached geometry.
+        """
+        if isinstance(instrument, str):
+            lon, lat = self.instruments[instrument]
+        else:
+            lon, lat = instrument
+        key = (float(lon), float(lat), grid_key(radar_image))
+        if key not in self._cache:
+            self._cache[key] = self._load_or_compute(lon, lat, radar_image, key)
+        return self._cache[key]
+
+    def clear(self):
+        """
+        Drop the in-memory cache.
+        """
+        self._cache = {}
+
+    def _load_or_compute(self, lon, lat, radar_image, key):
+        if self.cache_dir is None:
+            return _compute_geometry(lon, lat, radar_image)
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        base = os.path.join(self.cache_dir, name)
+        if not os.path.exists(base + '_bearing.npy'):
+            geometry = _compute_geometry(lon, lat, radar_image)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.save(base + '_distance.npy', geometry.distance)
+            np.save(base + '_bearing.npy', geometry.bearing)
+            return geometry
+        lat_index, lon_index = _instrument_pixel(lon, lat, radar_image)
+        return InstrumentGeometry(lat_index, lon_index,
+                                  radar_image.grid_x[lon_index], radar_image.grid_y[lat_index],
+                                  np.load(base + '_distance.npy', mmap_mode='r'),
+                                  np.load(base + '_bearing.npy', mmap_mode='r'))
+
+
+def grid_key(radar_image):
+    """
+    Get a key that identifies the grid definition of a RadarImage.
+
+    Parameters
+    ----------
+    radar_image: RadarImage
+        The RadarImage.
+
+    Returns
+    -------
+    key: str
+        A hash of the grid coordinates.
+    """
+    digest = hashlib.sha1()
+    for coords in [radar_image.grid_lat, radar_image.grid_lon, radar_image.grid_x, radar_image.grid_y]:
+        digest.update(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _instrument_pixel(lon, lat, radar_image):
+    lat_index = int(np.argmin(np.abs(radar_image.grid_lat - lat)))
+    lon_index = int(np.argmin(np.abs(radar_image.grid_lon - lon)))
+    return lat_index, lon_index
+
+
+def _compute_geometry(lon, lat, radar_image):
+    lat_index, lon_index = _instrument_pixel(lon, lat, radar_image)
+    instrument_x = radar_image.grid_x[lon_index]
+    instrument_y = radar_image.grid_y[lat_index]
+    x, y = np.meshgrid(radar_image.grid_x, radar_image.grid_y)
+    distance = np.sqrt((x - instrument_x)**2 + (y - instrument_y)**2)
+    bearing = (np.rad2deg(np.arctan2((x - instrument_x), (y - instrument_y))) + 360) % 360
+    return InstrumentGeometry(lat_index, lon_index, instrument_x, instrument_y, distance, bearing)
+
+
+INSTRUMENT_REGISTRY = InstrumentRegistry()
+INSTRUMENT_REGISTRY.register('atmos_lidar', -87.99577278662817, 41.70101404798476)
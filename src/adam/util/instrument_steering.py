@@ -1,11 +1,16 @@
 import numpy as np
 import logging
 from adam.io import RadarImage
-from scipy.ndimage import center_of_mass, label
+from scipy.ndimage import center_of_mass
 
+from .mask_filters import filter_speckles
+from .instrument_geometry import INSTRUMENT_REGISTRY
+from ..metrics import timed
+
+@timed('steering')
 def azimuth_point(instrument_lon, instrument_lat, 
                   radar_image: RadarImage, index=None,
-                  area_threshold=20):
+                  area_threshold=20, registry=None, tracker=None, lead_time=None):
     """
     Calculate the azimuth angle from the radar instrument to each pixel in the radar image.
 
@@ -21,57 +26,129 @@ def azimuth_point(instrument_lon, instrument_lat,
         If the radar image contains multiple time frames, specify the index of the frame to use. If None, use the first frame.
     area_threshold: int
         The minimum continuous area in pixels for lake breeze segments. This helps
-        remove false positive speckles that are identified by the model.
+        remove false positive speckles that are identified by the model. The speckles
+        are removed from a copy, so the mask of the radar image is left as it is.
+    registry: :py:meth:`InstrumentRegistry`, optional
+        The registry that caches the distance field of the instrument on the grid of the
+        radar image. If None, the default registry is used.
+    tracker: :py:meth:`FrontTracker`, optional
+        A tracker that has been updated with the latest frame. If given with lead_time, the
+        azimuth and distance are calculated for the lake breeze position predicted by the tracker
+        instead of the lake breeze mask of the radar image.
+    lead_time: float, optional
+        The time in seconds after the last frame of the tracker to aim at.
 
     Returns
     -------
     deg_angle: float
-       Azimuth angle in degrees from the radar instrument to the center of the largest lake breeze region.
+       Azimuth angle in degrees from the radar instrument to the center of the lake breeze regions
+       that are left after the speckles are removed.
     lat_center: float
-       Latitude of the center of the largest lake breeze region.
+       Latitude of the center of the lake breeze regions.
     lon_center: float
-       Longitude of the center of the largest lake breeze region.
+       Longitude of the center of the lake breeze regions.
+    dist: float
+       Distance from the instrument to the closest pixel of the lake breeze regions.
     """
-    # Convert lat/lon to radians
-    if index is None:
+    if tracker is not None and lead_time is not None:
+        mask = tracker.predict_mask(lead_time)
+    elif index is None:
         mask = radar_image[0]
     else:
         mask = radar_image[index]
     
+    # Masks are stored as (lon, lat); work on a (lat, lon) copy like the distance field, so that
+    # the mask of the RadarImage is left as it is
+    mask = np.asarray(mask).T != 0
+    mask = filter_speckles(mask, area_threshold)
+
+    if registry is None:
+        registry = INSTRUMENT_REGISTRY
+    geometry = registry.geometry((instrument_lon, instrument_lat), radar_image)
     lats = radar_image.grid_lat
     lons = radar_image.grid_lon
-    lat_index = np.argmin(np.abs(lats - instrument_lat))
-    lon_index = np.argmin(np.abs(lons - instrument_lon))
-    labels, num_features = label(mask)
-    area_threshold = 20
-    largest_area = -99999
-    mask = mask.T
-    for i in range(num_features):
-        area = mask[labels == i].sum()
-        if area > largest_area:
-            largest_area = area
-        if area < area_threshold:
-            mask[labels == i] = 0
-
     center = center_of_mass(mask)
-    num_y = len(radar_image.grid_y)
-    num_x = len(radar_image.grid_x)
-    center_x = radar_image.grid_x[int(center[1])]
-    center_y = radar_image.grid_y[int(center[0])]
-    logging.info(f"Center of mass: {center}, Center lat/lon: {center_y}, {center_x}")
-    instrument_x = radar_image.grid_x[lon_index]
-    instrument_y = radar_image.grid_y[lat_index]
-    logging.info(f"Instrument lat/lon: {instrument_y}, {instrument_x}")
-    angle = np.arctan2((center_x - instrument_x), (center_y - instrument_y))
-    deg_angle = np.rad2deg(angle)
-    deg_angle = (deg_angle + 360) % 360
+    center_row = int(center[0])
+    center_col = int(center[1])
+    logging.info(f"Center of mass: {center}, Center lat/lon: {lats[center_row]}, {lons[center_col]}")
+    logging.info(f"Instrument lat/lon: {instrument_lat}, {instrument_lon}")
+    deg_angle = geometry.bearing[center_row, center_col]
 
     # Get the distance from the instrument to the nearest point in the lake breeze region
-    x, y = np.meshgrid(radar_image.grid_x, radar_image.grid_y)
-    dist = np.sqrt((x - instrument_x)**2 + (y - instrument_y)**2)
-    dist = dist[mask == 1]
-    dist = np.min(dist)
-    return deg_angle, lats[int(center[0])], lons[int(center[1])], dist
+    dist = np.min(geometry.distance[mask])
+    return deg_angle, lats[center_row], lons[center_col], dist
+
+
+    
+
+def azimuth_point_batch(instrument_lon, instrument_lat, radar_image: RadarImage,
+                        area_threshold=20, registry=None, tracker=None, lead_time=None):
+    """
+    Calculate the azimuth angle, center, and distance from an instrument to the lake breeze
+    for every frame of a RadarImage at once. This gives the same values as calling
+    :py:meth:`azimuth_point` for each frame with the same area_threshold, and NaN for frames
+    without a lake breeze.
+
+    Parameters
+    ----------
+    instrument_lon: float
+        Longitude of the instrument in degrees.
+    instrument_lat: float
+        Latitude of the instrument in degrees.
+    radar_image: RadarImage
+        The RadarImage object containing one or more lake breeze masks.
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments. This helps
+        remove false positive speckles that are identified by the model.
+    registry: :py:meth:`InstrumentRegistry`, optional
+        The registry that caches the distance and bearing fields of the instrument on the grid
+        of the radar image. If None, the default registry is used.
+    tracker: :py:meth:`FrontTracker`, optional
+        A tracker that has been updated with the last frame. If given with lead_time, the values
+        for the last frame are calculated for the lake breeze position predicted by the tracker
+        instead of the lake breeze mask of that frame, as in :py:meth:`azimuth_point`.
+    lead_time: float, optional
+        The time in seconds after the last frame of the tracker to aim at.
+
+    Returns
+    -------
+    deg_angle: ndarray
+       Azimuth angle in degrees from the instrument to the center of the lake breeze region in each frame.
+    lat_center: ndarray
+       Latitude of the center of the lake breeze region in each frame.
+    lon_center: ndarray
+       Longitude of the center of the lake breeze region in each frame.
+    dist: ndarray
+       Distance in meters from the instrument to the nearest lake breeze pixel in each frame.
+    All of the returned values are NaN for frames without a lake breeze.
+    """
+    masks = np.asarray(radar_image.lakebreeze_mask)
+    if masks.ndim == 2:
+        masks = masks[np.newaxis]
+    if tracker is not None and lead_time is not None:
+        masks = np.concatenate([masks[:-1], tracker.predict_mask(lead_time)[np.newaxis]])
+    # Masks are stored as (lon, lat); work in (lat, lon) like the distance field
+    masks = np.transpose(masks, (0, 2, 1)) != 0
+    masks = filter_speckles(masks, area_threshold)
+
+    if registry is None:
+        registry = INSTRUMENT_REGISTRY
+    geometry = registry.geometry((instrument_lon, instrument_lat), radar_image)
+    lats = radar_image.grid_lat
+    lons = radar_image.grid_lon
+
+    # Per-frame area and center of mass of the filtered regions
+    counts = masks.sum(axis=(1, 2))
+    valid = counts > 0
+    safe_counts = np.where(valid, counts, 1)
+    center_row = masks.sum(axis=2) @ np.arange(masks.shape[1]) / safe_counts
+    center_col = masks.sum(axis=1) @ np.arange(masks.shape[2]) / safe_counts
+    center_row = center_row.astype(int)
+    center_col = center_col.astype(int)
 
+    deg_angle = geometry.bearing[center_row, center_col]
+    dist = np.min(np.broadcast_to(geometry.distance, masks.shape), axis=(1, 2), where=masks, initial=np.inf)
 
-    
\ No newline at end of file
+    nan = np.full(len(masks), np.nan)
+    return (np.where(valid, deg_angle, nan), np.where(valid, lats[center_row], nan),
+            np.where(valid, lons[center_col], nan), np.where(valid, dist, nan))
@@ -0,0 +1,54 @@
+import numpy as np
+
+from scipy.ndimage import generate_binary_structure, label
+
+from ..metrics import timed
+
+
+@timed('speckle_filter')
+def filter_speckles(mask, area_threshold=20):
+    """
+    Remove lake breeze regions smaller than a given area from a mask or a batch of masks.
+
+    Parameters
+    ----------
+    mask: 2D or 3D ndarray
+        The lake breeze mask, where 1 = lakebreeze and 0 = not a lake breeze. If the mask is 3D,
+        the first dimension is time and each frame is filtered separately.
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments.
+
+    Returns
+    -------
+    mask: ndarray
+        The filtered mask. The input mask is modified in place.
+    """
+    labels = label_frames(mask)
+    areas = np.bincount(labels.ravel())
+    small = areas < area_threshold
+    small[0] = False
+    mask[small[labels]] = 0
+    return mask
+
+
+def label_frames(mask):
+    """
+    Label the connected lake breeze regions of a mask. For a 3D batch of masks,
+    regions are never connected across frames.
+
+    Parameters
+    ----------
+    mask: 2D or 3D ndarray
+        The lake breeze mask or batch of masks.
+
+    Returns
+    -------
+    labels: ndarray
+        The label of the region of each pixel, 0 for pixels outside of a region.
+    """
+    structure = None
+    if mask.ndim == 3:
+        structure = np.zeros((3, 3, 3), dtype=int)
+        structure[1] = generate_binary_structure(2, 1)
+    labels, _ = label(mask, structure=structure)
+    return labels
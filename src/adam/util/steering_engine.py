@@ -0,0 +1,170 @@
+import numpy as np
+
+from scipy.ndimage import label
+from scipy.spatial import cKDTree
+
+from .mask_filters import filter_speckles
+
+
+class SteeringEngine(object):
+    """
+    Points any number of instruments at the lake breeze in one frame of a RadarImage. A k-d tree
+    is built over the lake breeze pixels once per frame, so each instrument query takes
+    O(log n) time instead of a pass over every pixel of the grid.
+
+    Parameters
+    ----------
+    radar_image: RadarImage
+        The RadarImage object containing the lake breeze mask.
+    index: int, optional
+        If the radar image contains multiple time frames, specify the index of the frame to use.
+        If None, use the first frame.
+    area_threshold: int
+        The minimum continuous area in pixels for lake breeze segments. This helps
+        remove false positive speckles that are identified by the model.
+    """
+    def __init__(self, radar_image, index=None, area_threshold=20):
+        mask = np.asarray(radar_image[0] if index is None else radar_image[index])
+        # Masks are stored as (lon, lat); work in (lat, lon) like the grid coordinates
+        mask = filter_speckles(mask.T != 0, area_threshold)
+        labels, num_features = label(mask)
+        rows, cols = np.nonzero(mask)
+        self.grid_lat = radar_image.grid_lat
+        self.grid_lon = radar_image.grid_lon
+        self.grid_x = np.asarray(radar_image.grid_x)
+        self.grid_y = np.asarray(radar_image.grid_y)
+        self.rows = rows
+        self.cols = cols
+        self.labels = labels[rows, cols]
+        self.num_features = num_features
+        self.points = np.column_stack([self.grid_x[cols], self.grid_y[rows]])
+        self.tree = cKDTree(self.points) if len(rows) else None
+
+        # Centroid of each connected region in pixel and map coordinates
+        counts = np.maximum(np.bincount(self.labels, minlength=num_features + 1), 1)
+        self.centroid_row = np.bincount(self.labels, rows, num_features + 1) / counts
+        self.centroid_col = np.bincount(self.labels, cols, num_features + 1) / counts
+        self.centroid_x = np.bincount(self.labels, self.points[:, 0], num_features + 1) / counts
+        self.centroid_y = np.bincount(self.labels, self.points[:, 1], num_features + 1) / counts
+
+    @property
+    def empty(self):
+        """
+        True if there is no lake breeze in the frame.
+        """
+        return self.tree is None
+
+    def instrument_xy(self, instrument_lons, instrument_lats):
+        """
+        Get the coordinates of the grid pixels closest to each instrument.
+
+        Parameters
+        ----------
+        instrument_lons: float or 1D array
+            Longitudes of the instruments in degrees.
+        instrument_lats: float or 1D array
+            Latitudes of the instruments in degrees.
+
+        Returns
+        -------
+        x, y: 1D arrays
+            The x and y coordinates of the instruments in meters.
+        """
+        instrument_lons = np.atleast_1d(instrument_lons)
+        instrument_lats = np.atleast_1d(instrument_lats)
+        lon_index = np.argmin(np.abs(self.grid_lon[np.newaxis] - instrument_lons[:, np.newaxis]), axis=1)
+        lat_index = np.argmin(np.abs(self.grid_lat[np.newaxis] - instrument_lats[:, np.newaxis]), axis=1)
+        return self.grid_x[lon_index], self.grid_y[lat_index]
+
+    def query(self, instrument_lons, instrument_lats, extent_range=10000.):
+        """
+        Get the steering solution for each instrument.
+
+        Parameters
+        ----------
+        instrument_lons: float or 1D array
+            Longitudes of the instruments in degrees.
+        instrument_lats: float or 1D array
+            Latitudes of the instruments in degrees.
+        extent_range: float
+            The range in meters within which the angular extent of the lake breeze is measured.
+
+        Returns
+        -------
+        solution: dict
+            A dictionary of 1D arrays with one value per instrument:
+
+            * distance: distance in meters to the nearest lake breeze pixel
+            * nearest_azimuth: azimuth in degrees to the nearest lake breeze pixel
+            * nearest_lat, nearest_lon: location of the nearest lake breeze pixel
+            * centroid_azimuth: azimuth in degrees to the centroid of the lake breeze region
+              containing the nearest pixel
+            * centroid_lat, centroid_lon: location of that centroid
+            * extent_start, extent_end: the lake breeze within extent_range spans the azimuths
+              clockwise from extent_start to extent_end
+            * extent_width: the angular width of that span in degrees
+
+            All values are NaN when there is no lake breeze, and the extent is NaN when there
+            is no lake breeze within extent_range.
+        """
+        x, y = self.instrument_xy(instrument_lons, instrument_lats)
+        keys = ['distance', 'nearest_azimuth', 'nearest_lat', 'nearest_lon',
+                'centroid_azimuth', 'centroid_lat', 'centroid_lon',
+                'extent_start', 'extent_end', 'extent_width']
+        solution = {key: np.full(len(x), np.nan) for key in keys}
+        if self.empty:
+            return solution
+
+        instruments = np.column_stack([x, y])
+        distance, nearest = self.tree.query(instruments)
+        solution['distance'] = distance
+        solution['nearest_azimuth'] = _azimuth(self.points[nearest, 0] - x, self.points[nearest, 1] - y)
+        solution['nearest_lat'] = self.grid_lat[self.rows[nearest]]
+        solution['nearest_lon'] = self.grid_lon[self.cols[nearest]]
+
+        region = self.labels[nearest]
+        solution['centroid_azimuth'] = _azimuth(self.centroid_x[region] - x, self.centroid_y[region] - y)
+        indices = np.arange(len(self.grid_lat))
+        solution['centroid_lat'] = np.interp(self.centroid_row[region], indices, self.grid_lat)
+        solution['centroid_lon'] = np.interp(self.centroid_col[region], np.arange(len(self.grid_lon)),
+                                             self.grid_lon)
+
+        for i, in_range in enumerate(self.tree.query_ball_point(instruments, extent_range)):
+            if len(in_range) == 0:
+                continue
+            azimuths = _azimuth(self.points[in_range, 0] - x[i], self.points[in_range, 1] - y[i])
+            solution['extent_start'][i], solution['extent_end'][i], solution['extent_width'][i] = \
+                angular_extent(azimuths)
+        return solution
+
+
+def angular_extent(azimuths):
+    """
+    Get the smallest arc of azimuths that contains every given azimuth. The arc may
+    cross north.
+
+    Parameters
+    ----------
+    azimuths: 1D array
+        The azimuths in degrees.
+
+    Returns
+    -------
+    start: float
+        The azimuth in degrees at which the arc starts.
+    end: float
+        The azimuth in degrees at which the arc ends, going clockwise from start.
+    width: float
+        The width of the arc in degrees.
+    """
+    azimuths = np.sort(np.asarray(azimuths) % 360)
+    # The arc is everything except the largest gap between consecutive azimuths
+    gaps = np.diff(np.append(azimuths, azimuths[0] + 360))
+    largest = np.argmax(gaps)
+    start = azimuths[(largest + 1) % len(azimuths)]
+    end = azimuths[largest]
+    return start, end, 360 - gaps[largest]
+
+
+def _azimuth(dx, dy):
+    return (np.rad2deg(np.arctan2(dx, dy)) + 360) % 360
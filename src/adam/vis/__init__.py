@@ -11,5 +11,15 @@ This module handles the visualization of the lake breeze mask on radar data.
     :toctree: generated/
 
     visualize_lake_breeze
+    animate_lake_breeze
+    grid_radar_field
+    QuickLookRenderer
+    quick_look
 """
-from .visualize_lake_breeze import visualize_lake_breeze
+from .._lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, attributes={
+    'visualize_lake_breeze': ['visualize_lake_breeze'],
+    'animation': ['animate_lake_breeze', 'grid_radar_field'],
+    'quicklook': ['QuickLookRenderer', 'quick_look'],
+})
@@ -0,0 +1,192 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+import pyart
+
+from concurrent.futures import ProcessPoolExecutor
+
+from ..io import RadarImage
+
+
+def grid_radar_field(radar, grid_lat, grid_lon, field='reflectivity', sweep=0):
+    """
+    Sample a field of one sweep of a radar volume on a latitude/longitude grid by taking the
+    nearest gate to each grid point. This is much faster than plotting the sweep with
+    :py:meth:`pyart.graph.RadarMapDisplay` and is used to draw many frames on the same map.
+
+    Parameters
+    ----------
+    radar: :py:meth:`pyart.core.Radar`
+        The radar volume.
+    grid_lat: 1D array
+        The latitudes of the grid rows in degrees.
+    grid_lon: 1D array
+        The longitudes of the grid columns in degrees.
+    field: str
+        The name of the field to sample.
+    sweep: int
+        The sweep to sample.
+
+    Returns
+    -------
+    data: 2D masked array
+        The field on the (lat, lon) grid, masked outside of the range of the radar.
+    """
+    lon, lat = np.meshgrid(grid_lon, grid_lat)
+    x, y = pyart.core.geographic_to_cartesian_aeqd(
+        lon, lat, radar.longitude['data'][0], radar.latitude['data'][0])
+    ground_range = np.hypot(x, y)
+    azimuth = np.rad2deg(np.arctan2(x, y)) % 360
+
+    rays = radar.get_slice(sweep)
+    ray_azimuths = radar.azimuth['data'][rays]
+    order = np.argsort(ray_azimuths)
+    sorted_azimuths = ray_azimuths[order]
+    # Nearest ray, wrapping around north
+    after = np.searchsorted(sorted_azimuths, azimuth) % len(order)
+    before = (after - 1) % len(order)
+    after_dist = np.abs((sorted_azimuths[after] - azimuth + 180) % 360 - 180)
+    before_dist = np.abs((sorted_azimuths[before] - azimuth + 180) % 360 - 180)
+    ray = order[np.where(after_dist < before_dist, after, before)]
+
+    ranges = radar.range['data']
+    gate_spacing = ranges[1] - ranges[0]
+    gate = np.round((ground_range - ranges[0]) / gate_spacing).astype(int)
+    outside = (gate < 0) | (gate >= len(ranges))
+    sweep_data = np.ma.asarray(radar.fields[field]['data'][rays])
+    data = sweep_data[ray, np.clip(gate, 0, len(ranges) - 1)]
+    return np.ma.masked_where(outside | np.ma.getmaskarray(data), data)
+
+
+def animate_lake_breeze(radar_scan: RadarImage, out_file, field='reflectivity', sweep=0, fps=10,
+                        n_jobs=None, features=True, vmin=-30, vmax=60, cmap='ChaseSpectral',
+                        figsize=(5, 5), dpi=100):
+    """
+    Make an animation of the lake breeze mask over a radar field for every frame of a
+    RadarImage. The map, coastlines, state borders and colorbar are drawn once per worker
+    process, and only the radar field and the mask contour are updated for each frame. The
+    frames are rendered in parallel across processes.
+
+    Parameters
+    ----------
+    radar_scan: :py:meth:`RadarImage`
+        The RadarImage with the inferred lake breeze masks inside.
+    out_file: str
+        The output. Names ending in .mp4 are encoded with ffmpeg, names ending in .gif are written
+        with Pillow, and any other name is a directory to write a PNG sequence to.
+    field: str
+        The radar field to plot the lake breeze mask over.
+    sweep: int
+        The sweep of the radar field to plot.
+    fps: float
+        The frames per second of the animation.
+    n_jobs: int or None
+        The number of processes to render with. Default is the number of CPUs. Set to 1 to render
+        in this process.
+    features: bool
+        Set to False to skip the coastlines and state borders, which need the Natural Earth data.
+    vmin, vmax: float
+        The limits of the color scale.
+    cmap: str
+        The colormap of the radar field.
+    figsize: 2-tuple
+        The size of the figure in inches.
+    dpi: int
+        The resolution of the frames.
+
+    Returns
+    -------
+    out_file: str
+        The path of the animation or of the directory of PNG frames.
+    """
+    masks = np.asarray(radar_scan.lakebreeze_mask)
+    radars = radar_scan.pyart_object
+    if masks.ndim == 2:
+        masks = masks[np.newaxis]
+    if not isinstance(radars, (list, np.ndarray)):
+        radars = [radars]
+    times = radar_scan.times
+    times = [None] * len(masks) if times is None else [str(t) for t in np.atleast_1d(times)]
+    if len(radars) != len(masks):
+        raise ValueError("The RadarImage must have one radar volume for every lake breeze mask.")
+
+    extension = os.path.splitext(out_file)[1].lower()
+    frame_dir = out_file if extension not in ['.mp4', '.gif'] else tempfile.mkdtemp()
+    os.makedirs(frame_dir, exist_ok=True)
+    style = dict(field=field, sweep=sweep, features=features, vmin=vmin, vmax=vmax, cmap=cmap,
+                 figsize=figsize, dpi=dpi, grid_lat=radar_scan.grid_lat, grid_lon=radar_scan.grid_lon,
+                 lat_range=radar_scan.lat_range, lon_range=radar_scan.lon_range)
+    frames = [(i, radars[i], masks[i], times[i], os.path.join(frame_dir, f"frame_{i:05d}.png"))
+              for i in range(len(masks))]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(frames))
+    try:
+        if n_jobs == 1:
+            paths = _render_frames(frames, style)
+        else:
+            chunks = [frames[i::n_jobs] for i in range(n_jobs)]
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                paths = sorted(p for chunk in executor.map(_render_frames, chunks, [style] * n_jobs)
+                               for p in chunk)
+        if extension == '.mp4':
+            _write_mp4(frame_dir, out_file, fps)
+        elif extension == '.gif':
+            _write_gif(paths, out_file, fps)
+    finally:
+        if frame_dir != out_file:
+            shutil.rmtree(frame_dir, ignore_errors=True)
+    return out_file
+
+
+def _render_frames(frames, style):
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    # The static layers are drawn once and reused for every frame of this worker
+    fig = Figure(figsize=style['figsize'], dpi=style['dpi'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+    ax.set_extent([style['lon_range'][0], style['lon_range'][1],
+                   style['lat_range'][0], style['lat_range'][1]], crs=ccrs.PlateCarree())
+    if style['features']:
+        ax.coastlines()
+        ax.add_feature(cfeature.STATES)
+    grid_lat, grid_lon = style['grid_lat'], style['grid_lon']
+    empty = np.ma.masked_all((len(grid_lat), len(grid_lon)))
+    mesh = ax.pcolormesh(grid_lon, grid_lat, empty, cmap=style['cmap'], vmin=style['vmin'],
+                         vmax=style['vmax'], shading='nearest', transform=ccrs.PlateCarree())
+    fig.colorbar(mesh, ax=ax, shrink=0.8, label=style['field'])
+    title = ax.set_title('')
+
+    paths = []
+    for index, radar, mask, time, path in frames:
+        if isinstance(radar, (str, os.PathLike)):
+            radar = pyart.io.read(radar)
+        data = grid_radar_field(radar, grid_lat, grid_lon, field=style['field'], sweep=style['sweep'])
+        mesh.set_array(data.ravel())
+        contour = ax.contour(grid_lon, grid_lat, mask.T, levels=[0.5], colors='k',
+                             transform=ccrs.PlateCarree()) if np.any(mask) else None
+        title.set_text(time if time is not None else '')
+        fig.savefig(path)
+        if contour is not None:
+            contour.remove()
+        paths.append(path)
+    return paths
+
+
+def _write_gif(paths, out_file, fps):
+    from PIL import Image
+    images = [Image.open(p).convert('RGB') for p in paths]
+    images[0].save(out_file, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0)
+
+
+def _write_mp4(frame_dir, out_file, fps):
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg is needed to write MP4 animations. Write a .gif or a PNG sequence instead.")
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps),
+                    '-i', os.path.join(frame_dir, 'frame_%05d.png'),
+                    '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', out_file], check=True)
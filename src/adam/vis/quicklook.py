@@ -0,0 +1,204 @@
+import io
+import threading
+import numpy as np
+
+from PIL import Image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from ..io import RadarImage
+
+# The normalization applied to the preprocessed images for the model
+_IMAGE_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_IMAGE_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+class QuickLookRenderer(object):
+    """
+    Draws quick-look thumbnails of the lake breeze mask over the radar image from the gridded data
+    already in a :py:meth:`RadarImage`, without the radar volume, Py-ART or cartopy. The figure,
+    axes, grid lines and colorbar for a domain are drawn once and cached, and each thumbnail only
+    redraws the radar image, the mask contour and the title over the cached background.
+
+    Parameters
+    ----------
+    figsize: 2-tuple
+        The size of the thumbnails in inches.
+    dpi: int
+        The resolution of the thumbnails.
+    vmin, vmax: float
+        The limits of the color scale of a gridded field.
+    cmap: str
+        The colormap of a gridded field.
+    mask_color: str
+        The color of the lake breeze contour.
+    compress_level: int
+        The zlib compression level of the PNG, from 0 to 9. Lower is faster.
+    """
+    def __init__(self, figsize=(3, 3), dpi=100, vmin=-20, vmax=60, cmap='HomeyerRainbow',
+                 mask_color='k', compress_level=1):
+        self.figsize = figsize
+        self.dpi = dpi
+        self.vmin = vmin
+        self.vmax = vmax
+        self.cmap = cmap
+        self.mask_color = mask_color
+        self.compress_level = compress_level
+        self._layers = {}
+        self._lock = threading.Lock()
+
+    def render(self, radar_scan: RadarImage, index=None, field=None):
+        """
+        Draw a thumbnail.
+
+        Parameters
+        ----------
+        radar_scan: :py:meth:`RadarImage`
+            The RadarImage with the preprocessed image and the inferred lake breeze mask inside.
+        index: int or None
+            The frame of a batch RadarImage to draw. Default is the last frame.
+        field: 2D array or None
+            A gridded field, such as reflectivity, on the (grid_lat, grid_lon) grid to draw
+            instead of the preprocessed image.
+
+        Returns
+        -------
+        rgba: (height, width, 4) uint8 array
+            The thumbnail.
+        """
+        image = _frame(radar_scan.pytorch_image, index, 3) if field is None else None
+        if image is not None:
+            image = np.asarray(image)
+            if image.dtype == np.uint8:
+                image = image.transpose(1, 2, 0)
+            else:
+                # Undo the model normalization to get back the rendered RGB image
+                image = image.astype(np.float32).transpose(1, 2, 0)
+                image = np.clip((image * _IMAGE_STD + _IMAGE_MEAN) / 255., 0, 1)
+        elif field is not None:
+            image = np.ma.masked_invalid(field)
+        else:
+            raise ValueError("The RadarImage has no preprocessed image, so a gridded field must be given.")
+        mask = _frame(radar_scan.lakebreeze_mask, index, 2)
+        times = radar_scan.times
+        time = None if times is None or len(times) == 0 else str(_frame(times, index, 0))
+
+        key = (tuple(radar_scan.lat_range), tuple(radar_scan.lon_range), field is not None)
+        with self._lock:
+            layer = self._layers.get(key)
+            if layer is None:
+                layer = self._layers[key] = self._static_layer(radar_scan, field is not None)
+            fig, ax, artist, title, background = layer
+            canvas = fig.canvas
+            canvas.restore_region(background)
+            artist.set_data(image)
+            ax.draw_artist(artist)
+            if mask is not None and np.any(mask):
+                contour = ax.contour(radar_scan.grid_lon, radar_scan.grid_lat, np.asarray(mask).T,
+                                     levels=[0.5], colors=self.mask_color, linewidths=1)
+                ax.draw_artist(contour)
+                contour.remove()
+            title.set_text(time if time is not None else '')
+            ax.draw_artist(title)
+            return np.array(canvas.buffer_rgba())
+
+    def to_png(self, radar_scan: RadarImage, index=None, field=None, buffer=None):
+        """
+        Draw a thumbnail as a PNG in memory.
+
+        Parameters
+        ----------
+        radar_scan: :py:meth:`RadarImage`
+            The RadarImage with the preprocessed image and the inferred lake breeze mask inside.
+        index: int or None
+            The frame of a batch RadarImage to draw. Default is the last frame.
+        field: 2D array or None
+            A gridded field on the (grid_lat, grid_lon) grid to draw instead of the preprocessed image.
+        buffer: file-like or None
+            The buffer to write the PNG to. If None, a new :py:meth:`io.BytesIO` is made.
+
+        Returns
+        -------
+        buffer: file-like
+            The buffer holding the PNG, rewound to the start.
+        """
+        buffer = io.BytesIO() if buffer is None else buffer
+        rgba = self.render(radar_scan, index=index, field=field)
+        Image.fromarray(rgba, 'RGBA').save(buffer, format='png', compress_level=self.compress_level)
+        buffer.seek(0)
+        return buffer
+
+    def clear(self):
+        """
+        Drop the cached static layers.
+        """
+        with self._lock:
+            self._layers = {}
+
+    def _static_layer(self, radar_scan, gridded):
+        fig = Figure(figsize=self.figsize, dpi=self.dpi)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1, 1, 1)
+        extent = [radar_scan.lon_range[0], radar_scan.lon_range[1],
+                  radar_scan.lat_range[0], radar_scan.lat_range[1]]
+        shape = (len(radar_scan.grid_lat), len(radar_scan.grid_lon))
+        if gridded:
+            artist = ax.imshow(np.ma.masked_all(shape), extent=extent, origin='upper', cmap=self.cmap,
+                               vmin=self.vmin, vmax=self.vmax, interpolation='nearest', animated=True)
+            fig.colorbar(artist, ax=ax, shrink=0.8)
+        else:
+            artist = ax.imshow(np.zeros(shape + (3,)), extent=extent, origin='upper',
+                               interpolation='nearest', animated=True)
+        ax.set_xlim(extent[0], extent[1])
+        ax.set_ylim(extent[2], extent[3])
+        ax.set_aspect(1. / np.cos(np.deg2rad(np.mean(radar_scan.lat_range))))
+        ax.tick_params(labelsize=6)
+        ax.grid(True, linewidth=0.3, alpha=0.5)
+        title = ax.set_title('', fontsize=7, animated=True)
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+        return fig, ax, artist, title, background
+
+
+_default_renderer = None
+_default_renderer_lock = threading.Lock()
+
+
+def quick_look(radar_scan: RadarImage, index=None, field=None, renderer=None):
+    """
+    Draw a quick-look PNG thumbnail of the lake breeze mask over the radar image in memory, for
+    serving on a dashboard. See :py:meth:`QuickLookRenderer`.
+
+    Parameters
+    ----------
+    radar_scan: :py:meth:`RadarImage`
+        The RadarImage with the preprocessed image and the inferred lake breeze mask inside.
+    index: int or None
+        The frame of a batch RadarImage to draw. Default is the last frame.
+    field: 2D array or None
+        A gridded field on the (grid_lat, grid_lon) grid to draw instead of the preprocessed image.
+    renderer: :py:meth:`QuickLookRenderer` or None
+        The renderer to use. Default is a shared renderer that keeps its static layers between calls.
+
+    Returns
+    -------
+    buffer: :py:meth:`io.BytesIO`
+        The PNG thumbnail.
+    """
+    global _default_renderer
+    if renderer is None:
+        with _default_renderer_lock:
+            if _default_renderer is None:
+                _default_renderer = QuickLookRenderer()
+            renderer = _default_renderer
+    return renderer.to_png(radar_scan, index=index, field=field)
+
+
+def _frame(data, index, ndim):
+    # Batches have one more leading dimension than a single frame
+    if data is None:
+        return None
+    data = data.detach().cpu().numpy() if hasattr(data, 'detach') else np.asarray(data)
+    if data.ndim > ndim:
+        return data[-1 if index is None else index]
+    return data
@@ -54,9 +54,7 @@ def test_send_scan():
             assert line == expected_line, f"Line {i} does not match expected output.\nGot: {line}\nExpected: {expected_line}"
 
 def test_trigger_lidar_ppis_from_mask():
-    import torch
     import adam
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     rad_scan = adam.model.infer_lake_breeze(
         rad_scan, model_name='lakebreeze_best_model_fcn_resnet50')
@@ -83,13 +81,10 @@ def test_trigger_lidar_ppis_from_mask():
         for i, (line, expected_line) in enumerate(zip(lines, expected_lines)):
             assert line == expected_line, f"Line {i} does not match expected output.\nGot: {line}\nExpected: {expected_line}"
     os.remove('test_scan_ppi_lakebreeze_close_copy.txt')
-    os.remove('test_scan_ppi_lakebreeze_close.txt')
     os.remove('test_scan_ppi.txt')
 
 def test_trigger_lidar_rhi_from_mask():
-    import torch
     import adam
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     rad_scan = adam.model.infer_lake_breeze(
         rad_scan, model_name='lakebreeze_best_model_fcn_resnet50')
@@ -115,5 +110,257 @@ def test_trigger_lidar_rhi_from_mask():
         for i, (line, expected_line) in enumerate(zip(lines, expected_lines)):
             assert line == expected_line, f"Line {i} does not match expected output.\nGot: {line}\nExpected: {expected_line}"
     os.remove('test_scan_rhi_lakebreeze_copy.txt')
-    os.remove('test_scan_rhi_lakebreeze.txt')
     os.remove('test_scan_rhi.txt')
+
+def test_connection_pool():
+    import adam
+    import pytest
+    from adam.testing import FakeSSHClient, TEST_RHI_FILE
+    connections = FakeSSHClient.connections
+    with adam.triggering.SSHConnectionPool(client_factory=FakeSSHClient, keepalive=15) as pool:
+        for i in range(3):
+            adam.triggering.send_scan(TEST_RHI_FILE, 'lidar', 'user', 'pwd', out_file_name='test_rhi_scan.txt',
+                                      pool=pool)
+        assert FakeSSHClient.connections == connections + 1
+        assert pool.connected() == [('lidar', 'user')]
+        with pool.connection('lidar', 'user', 'pwd') as connection:
+            assert connection.client.get_transport().keepalive == 15
+            with open(connection.sftp.files[0], 'r') as f:
+                with open(TEST_RHI_FILE, 'r') as expected:
+                    assert f.read() == expected.read()
+            # Simulate a dropped link
+            connection.client.connected = False
+        adam.triggering.send_scan(TEST_RHI_FILE, 'lidar', 'user', 'pwd', out_file_name='test_rhi_scan.txt',
+                                  pool=pool)
+        assert FakeSSHClient.connections == connections + 2
+
+        # Connection errors during a transfer reconnect and retry once
+        calls = []
+
+        def flaky(connection):
+            calls.append(connection)
+            if len(calls) == 1:
+                raise EOFError("Connection reset")
+            return True
+
+        assert pool.run('lidar', 'user', 'pwd', flaky) is True
+        assert calls[0] is not calls[1]
+        assert FakeSSHClient.connections == connections + 3
+
+        # Local file errors are not connection errors, so the connection is kept and not retried
+        with pytest.raises(FileNotFoundError):
+            adam.triggering.send_scan('no_such_scan.txt', 'lidar', 'user', 'pwd', out_file_name='test_rhi_scan.txt',
+                                      pool=pool)
+        assert FakeSSHClient.connections == connections + 3
+        assert pool.connected() == [('lidar', 'user')]
+    assert pool.connected() == []
+
+def test_build_scan():
+    import adam
+    from adam.testing import TEST_RHI_FILE, TEST_PPI_FILE, FakeSSHClient
+    with open(TEST_RHI_FILE, 'rb') as f:
+        assert adam.triggering.build_scan([0, 90], [90], el_speed=2) == f.read()
+    with open(TEST_PPI_FILE, 'rb') as f:
+        expected = f.read()
+    scan = adam.triggering.build_scan([0, 5, 10], [90, 180], el_speed=2)
+    assert scan == expected
+
+    serpentine = adam.triggering.build_scan([0, 5], [90, 180], el_speed=2, serpentine=True).split(b'\r\n')
+    assert serpentine[3].endswith(b'P.1=-125000*A.2=30,S.2=1388,P.2=0')
+    assert serpentine[7].endswith(b'P.1=-250000*A.2=30,S.2=1388,P.2=-3472')
+    assert serpentine[9].endswith(b'P.1=-125000*A.2=30,S.2=1388,P.2=-3472')
+
+    azimuths, elevations = np.meshgrid(np.arange(0, 360, 0.5), np.arange(0, 10, 1.))
+    dense = adam.triggering.encode_scan_points(azimuths.ravel(), elevations.ravel())
+    assert dense.count(b'\r\n') == 3 + 2 * azimuths.size
+
+    with FakeSSHClient() as client:
+        adam.triggering.send_scan(scan, None, None, None, out_file_name='test_ppi_scan.txt', client=client)
+        with open(client.sftp.files[0], 'rb') as f:
+            assert f.read() == expected
+
+def test_plan_scan():
+    import adam
+    model = adam.triggering.LidarMotionModel(azi_speed=5., el_speed=2., rays_per_point=1, ray_duration=0.5)
+    np.testing.assert_allclose(adam.triggering.shortest_azimuth_delta(350., 10.), 20.)
+    az_accel = 30 * 1000. * 360. / 500000
+    # Short moves never reach full speed
+    np.testing.assert_allclose(model.move_time(0., 0., 0.1, 0.), 2 * np.sqrt(0.1 / az_accel))
+    np.testing.assert_allclose(model.move_time(0., 0., 90., 0.), 90. / 5. + 5. / az_accel)
+
+    plan = adam.triggering.plan_scan(np.arange(0, 30, 3), np.arange(0, 360, 10), model=model)
+    assert len(plan.azimuths) == 360
+    assert plan.cycle_time < plan.original_cycle_time / 2
+    assert sorted(zip(plan.azimuths % 360, plan.elevations)) == \
+        sorted((az, el) for el in np.arange(0, 30, 3.) for az in np.arange(0, 360, 10.))
+    assert plan.repeats(3 * plan.cycle_time + 1) == 3
+    scan = plan.to_csm(repeat=plan.repeats(3600.))
+    assert scan.startswith(b'%d\r\n360\r\n1\r\n' % plan.repeats(3600.))
+
+    # Crossing north takes the short way
+    plan = adam.triggering.plan_scan([2.], [350., 10.], model=model)
+    assert abs(plan.azimuths[1] - plan.azimuths[0]) == 20.
+
+def test_dispatch_triggers():
+    import time
+    import adam
+    from adam.testing import FakeSSHClient
+    masks = np.zeros((256, 256), dtype=np.int64)
+    masks[100:120, 100:120] = 1
+    rad_scan = adam.io.RadarImage()
+    rad_scan.grid_lat = np.linspace(42.5680, 41.1280, 256)
+    rad_scan.grid_lon = np.linspace(-88.7176, -87.2873, 256)
+    rad_scan.grid_x = np.linspace(-60000., 60000., 256)
+    rad_scan.grid_y = np.linspace(80000., -80000., 256)
+    rad_scan.lakebreeze_mask = masks
+
+    class SlowSSHClient(FakeSSHClient):
+        def open_sftp(self):
+            time.sleep(1.)
+            return self.sftp
+
+    lidar = dict(lat=rad_scan.grid_lat[110], lon=rad_scan.grid_lon[110], username='user', password='pwd',
+                 elevations=[0, 5], out_file_name='test_dispatch.txt')
+    lidars = [dict(lidar, host='lidar%d' % i) for i in range(3)]
+    lidars.append(dict(lidar, host='far', lat=rad_scan.grid_lat[250], lon=rad_scan.grid_lon[250]))
+    with adam.triggering.SSHConnectionPool(client_factory=SlowSSHClient) as pool:
+        start = time.monotonic()
+        results = adam.triggering.dispatch_triggers(rad_scan, lidars, pool=pool)
+        assert time.monotonic() - start < 2.5
+        assert [results['lidar%d' % i].status for i in range(3)] == ['triggered'] * 3
+        assert results['far'].status == 'out_of_range'
+        assert results['far'].distance > 5000
+        assert results['lidar0'].to_dict()['attempts'] == 1
+        assert [adam.triggering.lidar_name(x) for x in lidars] == list(results)
+        assert adam.triggering.lidar_name(dict(lidars[0], name='halo')) == 'halo'
+
+        hung = dict(lidars[0], host='hung', timeout=0.2)
+        results = adam.triggering.dispatch_triggers(rad_scan, [hung, lidars[1]], pool=pool)
+        assert results['hung'].status == 'timeout'
+        assert results['lidar1'].status == 'triggered'
+        time.sleep(1.)
+
+def test_dispatch_triggers_hung_upload():
+    import threading
+    import adam
+    from adam.testing import FakeSSHClient
+    from adam.testing.fake_lidar import FakeSFTP
+    masks = np.zeros((256, 256), dtype=np.int64)
+    masks[100:120, 100:120] = 1
+    rad_scan = adam.io.RadarImage()
+    rad_scan.grid_lat = np.linspace(42.5680, 41.1280, 256)
+    rad_scan.grid_lon = np.linspace(-88.7176, -87.2873, 256)
+    rad_scan.grid_x = np.linspace(-60000., 60000., 256)
+    rad_scan.grid_y = np.linspace(80000., -80000., 256)
+    rad_scan.lakebreeze_mask = masks
+
+    # The upload of the first connection hangs until the connection is closed
+    closed = threading.Event()
+
+    class HungSFTP(FakeSFTP):
+        def putfo(self, fl, remote):
+            closed.wait(30.)
+            super().putfo(fl, remote)
+
+        def close(self):
+            closed.set()
+            super().close()
+
+    class HungSSHClient(FakeSSHClient):
+        clients = 0
+
+        def __init__(self):
+            super().__init__()
+            if HungSSHClient.clients == 0:
+                self.sftp = HungSFTP()
+            HungSSHClient.clients += 1
+
+    lidar = dict(lat=rad_scan.grid_lat[110], lon=rad_scan.grid_lon[110], username='user', password='pwd',
+                 elevations=[0, 5], out_file_name='test_dispatch.txt', host='lidar', timeout=0.5)
+    with adam.triggering.SSHConnectionPool(client_factory=HungSSHClient, timeout=1.) as pool:
+        results = adam.triggering.dispatch_triggers(rad_scan, [lidar], pool=pool, retries=0)
+        assert results['lidar'].status == 'timeout'
+        # The hung connection was closed, which ends the upload and frees the slot of the host
+        assert closed.is_set()
+        results = adam.triggering.dispatch_triggers(rad_scan, [lidar], pool=pool, retries=0)
+        assert results['lidar'].status == 'triggered', results['lidar'].error
+        assert HungSSHClient.clients == 2
+        assert pool.connected() == [('lidar', 'user')]
+
+
+def test_connection_pool_abort():
+    import pytest
+    import adam
+    from adam.testing import FakeSSHClient
+    with adam.triggering.SSHConnectionPool(client_factory=FakeSSHClient, timeout=0.1) as pool:
+        pool.connect('idle', 'user', 'pwd')
+        with pool.connection('busy', 'user', 'pwd') as connection:
+            pool.abort('busy')
+            assert not connection.is_active()
+            # The slot is free while the aborted connection is still in use
+            with pool.connection('busy', 'user', 'pwd') as other:
+                assert other.is_active()
+        # The aborted connection is not returned to the pool, and its slot is not freed twice
+        assert pool.connected() == [('busy', 'user'), ('idle', 'user')]
+        with pool.connection('busy', 'user', 'pwd'):
+            with pytest.raises(TimeoutError):
+                with pool.connection('busy', 'user', 'pwd'):
+                    pass
+        pool.abort('idle')
+        assert pool.connected() == [('busy', 'user')]
+
+
+def test_trigger_state(tmp_path):
+    import adam
+    path = str(tmp_path / 'trigger_state.json')
+    state = adam.triggering.TriggerState(azimuth_threshold=5., distance_threshold=500., min_dwell=300., path=path)
+    scan = adam.triggering.build_scan([0, 5], [100, 130])
+    assert state.check('lidar', scan, 115., 2000., now=0.) == (True, 'first')
+    state.record('lidar', scan, 115., 2000., now=0.)
+    assert state.check('lidar', scan, 115., 2000., now=1000.) == (False, 'unchanged')
+    nudged = adam.triggering.build_scan([0, 5], [102, 132])
+    assert state.check('lidar', nudged, 117., 2100., now=100.) == (False, 'dwell')
+    assert state.check('lidar', nudged, 117., 2100., now=1000.) == (False, 'small_change')
+    moved = adam.triggering.build_scan([0, 5], [140, 170])
+    assert state.check('lidar', moved, 155., 2100., now=1000.) == (True, 'moved')
+    assert state.check('lidar', nudged, 117., 3000., now=1000.) == (True, 'moved')
+
+    # The state survives a restart
+    restored = adam.triggering.TriggerState(path=path)
+    assert restored.lidars['lidar']['uploads'] == 1
+    assert restored.check('lidar', scan, 115., 2000., now=1000.) == (False, 'unchanged')
+
+
+def test_trigger_state_shared():
+    import adam
+    from adam.testing import FakeSSHClient
+    masks = np.zeros((256, 256), dtype=np.int64)
+    masks[100:120, 100:120] = 1
+    rad_scan = adam.io.RadarImage()
+    rad_scan.grid_lat = np.linspace(42.5680, 41.1280, 256)
+    rad_scan.grid_lon = np.linspace(-88.7176, -87.2873, 256)
+    rad_scan.grid_x = np.linspace(-60000., 60000., 256)
+    rad_scan.grid_y = np.linspace(80000., -80000., 256)
+    rad_scan.lakebreeze_mask = masks
+    lidar = dict(name='halo', host='lidar', lat=rad_scan.grid_lat[110], lon=rad_scan.grid_lon[110],
+                 username='user', password='pwd', elevations=[0, 5], out_file_name='test_shared.txt')
+
+    # The trigger functions and the dispatcher key the state by the host of the lidar, so the
+    # scan sent by one is not sent again by the other
+    state = adam.triggering.TriggerState()
+    with adam.triggering.SSHConnectionPool(client_factory=FakeSSHClient) as pool:
+        assert adam.triggering.trigger_lidar_ppis_from_mask(
+            rad_scan, lidar['lat'], lidar['lon'], lidar['host'], lidar['username'], lidar['password'],
+            lidar['elevations'], out_file_name=lidar['out_file_name'], pool=pool, trigger_state=state)
+        assert list(state.lidars) == ['lidar']
+        results = adam.triggering.dispatch_triggers(rad_scan, [lidar], pool=pool, trigger_state=state)
+        assert results['halo'].status == 'debounced'
+        assert results['halo'].error == 'unchanged'
+
+        state = adam.triggering.TriggerState()
+        results = adam.triggering.dispatch_triggers(rad_scan, [lidar], pool=pool, trigger_state=state)
+        assert results['halo'].status == 'triggered'
+        assert not adam.triggering.trigger_lidar_ppis_from_mask(
+            rad_scan, lidar['lat'], lidar['lon'], lidar['host'], lidar['username'], lidar['password'],
+            lidar['elevations'], out_file_name=lidar['out_file_name'], pool=pool, trigger_state=state)
+        assert state.lidars['lidar']['uploads'] == 1
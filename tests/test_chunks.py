@@ -0,0 +1,67 @@
+import io
+import time
+import tempfile
+import numpy as np
+import pyart
+import adam
+
+
+def test_sweep0_assembler():
+    volume = adam.testing.make_level2_volume(elevations=(0.5, 1.5, 2.5))
+    assembler = adam.io.Sweep0Assembler()
+    for i in range(0, len(volume), 1000):
+        if assembler.feed(volume[i:i + 1000]):
+            break
+    assert assembler.complete
+    assert assembler.bytes_used < len(volume) / 2
+    radar = pyart.io.read_nexrad_archive(io.BytesIO(assembler.getvalue()), scans=[0])
+    full_radar = pyart.io.read_nexrad_archive(io.BytesIO(volume))
+    assert radar.nsweeps == 1
+    np.testing.assert_array_equal(
+        radar.fields['reflectivity']['data'], full_radar.get_field(0, 'reflectivity'))
+
+
+def test_nexrad_chunk_source_replay():
+    volume = adam.testing.make_level2_volume(elevations=(0.5, 1.5, 2.5))
+    with tempfile.TemporaryDirectory() as recorded, tempfile.TemporaryDirectory() as live:
+        chunks = adam.testing.write_level2_chunks(volume, recorded, volume_number=5)
+        source = adam.io.NexradChunkSource('KLOT', path=live)
+        completed = []
+        with adam.testing.ChunkReplayer(recorded, live, interval=0.1) as replayer:
+            deadline = time.time() + 10
+            while len(completed) == 0 and time.time() < deadline:
+                completed = source.poll()
+                time.sleep(0.02)
+            chunks_at_detection = len(replayer.copied)
+        assert completed == ['KLOT/5/20250715-180000']
+        # Sweep 0 is ready after the metadata chunk and three radial chunks
+        assert chunks_at_detection < len(chunks)
+        radar = source.read(completed[0])
+        assert radar.nsweeps == 1
+        assert radar.fields['reflectivity']['data'].shape == (360, 460)
+
+
+def test_nexrad_chunk_source_volume_timeout(tmp_path):
+    import os
+    first = adam.testing.make_level2_volume(start_time='2025-07-15T18:00:00', elevations=(0.5, 1.5))
+    second = adam.testing.make_level2_volume(start_time='2025-07-15T18:05:00', elevations=(0.5, 1.5))
+    # Volume 999 never gets its end chunk
+    os.remove(adam.testing.write_level2_chunks(first, str(tmp_path), volume_number=999)[-1])
+    source = adam.io.NexradChunkSource('KLOT', path=str(tmp_path), volume_timeout=0.2)
+    assert source.poll() == ['KLOT/999/20250715-180000']
+
+    # The volume numbers wrap around, so volume 1 follows 999
+    adam.testing.write_level2_chunks(second, str(tmp_path), volume_number=1)
+    assert source.poll() == []
+    time.sleep(0.3)
+    assert source.poll() == ['KLOT/1/20250715-180500']
+    assert source.volume == 1
+
+    # The latest volume is found from one listing of the radar prefix, locally and on S3
+    assert adam.io.NexradChunkSource('KLOT', path=str(tmp_path))._find_latest_volume() == 1
+    with adam.testing.LocalS3Server(str(tmp_path), bucket='unidata-nexrad-level2-chunks') as server, \
+            server.endpoint():
+        source = adam.io.NexradChunkSource('KLOT')
+        assert source._find_latest_volume() == 1
+        assert server.requests == 1
+        assert source.poll() == ['KLOT/1/20250715-180500']
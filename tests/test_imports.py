@@ -0,0 +1,32 @@
+import subprocess
+import sys
+import adam
+
+
+def _loaded_modules(statement):
+    code = (f"import sys\n{statement}\n"
+            "print(' '.join(m for m in ['torch', 'pyart', 'cartopy', 'boto3', 'paramiko', 'matplotlib'] "
+            "if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return output.strip().splitlines()[-1].split() if output.strip() else []
+
+
+def test_lazy_imports():
+    assert _loaded_modules("import adam") == []
+    assert _loaded_modules("from adam.triggering import make_scan_file") == []
+    assert _loaded_modules("from adam.util import azimuth_point") == []
+    assert _loaded_modules("from adam.io import RadarImage") == []
+    assert 'torch' in _loaded_modules("import adam; adam.model.infer_lake_breeze")
+
+
+def test_lazy_attributes():
+    assert 'util' in dir(adam)
+    assert 'azimuth_point' in dir(adam.util)
+    assert adam.io.RadarImage is adam.io.get_radar_scan.RadarImage
+    assert callable(adam.vis.visualize_lake_breeze)
+    try:
+        adam.util.not_a_function
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("Missing attributes must raise AttributeError.")
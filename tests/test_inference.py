@@ -8,8 +8,35 @@ import pyart
 
 """Tests for `adam` package."""
 
+
+@pytest.fixture
+def random_weights(tmp_path, monkeypatch):
+    # Serve weights files of the model architectures with random weights, so that the models
+    # are loaded the same way as the trained ones without downloading them
+    from safetensors.torch import save_model
+    from adam.model import predict_lake_breeze
+
+    def download(repo_id, filename):
+        path = tmp_path / filename
+        if not path.exists():
+            torch.manual_seed(0)
+            model = predict_lake_breeze._build_model(filename[:-len('.safetensors')])
+            save_model(model.network, str(path))
+        return str(path)
+    monkeypatch.setattr(predict_lake_breeze, 'hf_hub_download', download)
+    predict_lake_breeze._load_model.cache_clear()
+    yield
+    predict_lake_breeze._load_model.cache_clear()
+
+
+def _random_radar_image(seed):
+    generator = torch.Generator().manual_seed(seed)
+    rad_scan = adam.io.RadarImage()
+    rad_scan.lat_range, rad_scan.lon_range = (41.128, 42.568), (-88.7176, -87.2873)
+    rad_scan.pytorch_image = torch.randint(0, 256, (1, 3, 256, 256), dtype=torch.uint8, generator=generator)
+    return rad_scan
+
 def test_infer_fcn_resnet50():
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     rad_scan = adam.model.infer_lake_breeze(
         rad_scan, model_name='lakebreeze_best_model_fcn_resnet50')
@@ -17,14 +44,12 @@ def test_infer_fcn_resnet50():
     assert rad_scan.lakebreeze_mask.shape == (256, 256)
 
 def test_infer_fcn_resnet50_no_augmentation():
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     rad_scan = adam.model.infer_lake_breeze(rad_scan, model_name='lakebreeze_model_fcn_resnet50_no_augmentation')
     np.testing.assert_almost_equal(rad_scan.lakebreeze_mask.sum(), 1158, decimal=-2)
     assert rad_scan.lakebreeze_mask.shape == (256, 256)
 
 def test_infer_fcn_resnet50_batch():
-    torch.manual_seed(42)
     rad_scan1 = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     rad_scan2 = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:05:00')
     rad_scan = adam.model.infer_lake_breeze_batch(
@@ -57,7 +82,174 @@ def test_infer_fcn_resnet50_batch():
 
 
 def test_infer_fcn_resnet50_invalid_model():
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     with pytest.raises(ValueError):
-        adam.model.infer_lake_breeze(rad_scan, model_name='invalid_model_name')
\ No newline at end of file
+        adam.model.infer_lake_breeze(rad_scan, model_name='invalid_model_name')
+
+def test_infer_lake_breeze_sites():
+    rad_scans = adam.io.preprocess_radar_sites(['KLOT', 'KMKX'], '2025-07-15T18:00:00')
+    rad_scans = adam.model.infer_lake_breeze_sites(
+        rad_scans, model_name='lakebreeze_best_model_fcn_resnet50')
+    for rad_scan in rad_scans.values():
+        assert rad_scan.lakebreeze_mask.shape == (256, 256)
+
+def test_infer_lake_breeze_sites_offline(random_weights):
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+    alone = adam.model.infer_lake_breeze(_random_radar_image(0), model_name=model_name).lakebreeze_mask
+    site_images = {radar: _random_radar_image(i) for i, radar in enumerate(['KLOT', 'KMKX', 'KGRR'])}
+    site_images = adam.model.infer_lake_breeze_sites(site_images, model_name=model_name)
+    # A site's mask does not depend on the other sites in the batch, or on earlier calls
+    np.testing.assert_array_equal(site_images['KLOT'].lakebreeze_mask, alone)
+    again = adam.model.infer_lake_breeze(_random_radar_image(0), model_name=model_name).lakebreeze_mask
+    np.testing.assert_array_equal(again, alone)
+
+
+def test_inference_cache_matches_model(random_weights):
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+    scans = [_random_radar_image(i) for i in range(3)]
+    for i, scan in enumerate(scans):
+        scan.source = f"s3://unidata-nexrad-level2/KLOT_{i}"
+    fresh = [adam.model.infer_lake_breeze(_random_radar_image(i), model_name=model_name).lakebreeze_mask
+             for i in range(3)]
+    cache = adam.model.InferenceCache()
+    # Fill the cache with one frame, then run a batch that mixes a hit with misses
+    adam.model.infer_lake_breeze(scans[1], model_name=model_name, cache=cache)
+    adam.model.infer_lake_breeze_batch(scans, model_name=model_name, cache=cache)
+    assert cache.stats()['hits'] == 1
+    for scan, mask in zip(scans, fresh):
+        np.testing.assert_array_equal(scan.lakebreeze_mask, mask)
+    # Hits give the same masks as fresh inference
+    for i, scan in enumerate(scans):
+        scan.lakebreeze_mask = None
+        scan = adam.model.infer_lake_breeze(scan, model_name=model_name, cache=cache)
+        np.testing.assert_array_equal(scan.lakebreeze_mask, fresh[i])
+    assert cache.stats()['hits'] == 4
+
+
+def test_inference_cache():
+    rng = np.random.default_rng(0)
+    masks = [(rng.random((256, 256)) > 0.5).astype(np.int64) for _ in range(3)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = adam.model.InferenceCache(max_entries=2, path=tmpdir)
+        keys = [cache.key(f"s3://unidata-nexrad-level2/KLOT_{i}", (41.128, 42.568), (-88.7176, -87.2873),
+                          'lakebreeze_best_model_fcn_resnet50', 20) for i in range(3)]
+        assert len(set(keys)) == 3
+        assert keys[0] != cache.key("s3://unidata-nexrad-level2/KLOT_0", (41.128, 42.568), (-88.7176, -87.2873),
+                                    'lakebreeze_best_model_fcn_resnet50', 10)
+        assert cache.get(keys[0]) is None
+        for key, mask in zip(keys, masks):
+            cache.put(key, mask, time='2025-07-15T18:00:00')
+        # The oldest mask is evicted from memory but reloaded from disk
+        assert len(cache) == 2
+        mask, time = cache.get(keys[0])
+        np.testing.assert_array_equal(mask, masks[0])
+        assert mask.dtype == np.int64
+        assert time == '2025-07-15T18:00:00'
+        assert cache.stats()['disk_hits'] == 1
+        assert cache.hit_rate == 0.5
+
+        # Repeated inference on a cached scan does not touch the model
+        rad_scan = adam.io.RadarImage()
+        rad_scan.source = "s3://unidata-nexrad-level2/KLOT_1"
+        rad_scan.lat_range, rad_scan.lon_range = (41.128, 42.568), (-88.7176, -87.2873)
+        rad_scan = adam.model.infer_lake_breeze(rad_scan, model_name='lakebreeze_best_model_fcn_resnet50',
+                                                cache=cache)
+        np.testing.assert_array_equal(rad_scan.lakebreeze_mask, masks[1])
+
+        rad_scan.source = ["s3://unidata-nexrad-level2/KLOT_2", "s3://unidata-nexrad-level2/KLOT_1"]
+        rad_scan.pytorch_image = torch.zeros((2, 3, 256, 256))
+        rad_scan = adam.model.infer_lake_breeze_batch(rad_scan, cache=cache)
+        np.testing.assert_array_equal(rad_scan.lakebreeze_mask, np.stack([masks[2], masks[1]]))
+        assert cache.stats()['hits'] == 4
+
+
+def test_infer_lake_breeze_uint8(tmp_path, random_weights):
+    from adam.model import predict_lake_breeze
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+    volume = adam.testing.make_radar_volume()
+    path = adam.testing.write_radar_volume(volume, str(tmp_path / 'KLOT20250715_180000_V06'))
+    normalized = adam.io.preprocess_radar_image(path)
+    image = adam.io.preprocess_radar_image(path, dtype='uint8')
+    assert image.pytorch_image.dtype == torch.uint8
+    model = predict_lake_breeze._load_model(model_name)
+    assert not model.training
+    with torch.no_grad():
+        torch.testing.assert_close(model(image.pytorch_image)['out'], model(normalized.pytorch_image)['out'],
+                                   rtol=0, atol=0)
+    uint8_mask = adam.model.infer_lake_breeze(image, model_name=model_name).lakebreeze_mask
+    float_mask = adam.model.infer_lake_breeze(normalized, model_name=model_name).lakebreeze_mask
+    np.testing.assert_array_equal(uint8_mask, float_mask)
+    # The normalization layer is not part of the weights files
+    assert list(model.state_dict()) == ['network.' + x for x in model.network.state_dict()]
+
+
+def test_model_server(tmp_path, random_weights):
+    import threading
+    from adam.model import predict_lake_breeze
+
+    model_name = 'lakebreeze_best_model_fcn_resnet50'
+    generator = torch.Generator().manual_seed(1)
+    images = torch.randint(0, 256, (4, 1, 3, 256, 256), dtype=torch.uint8, generator=generator)
+    normalized = adam.model.ImageNormalization()(images[0])
+    expected = [predict_lake_breeze.filter_speckles(
+        predict_lake_breeze._predict_masks(x, model_name), 20) for x in images]
+
+    with adam.model.ModelServer(str(tmp_path / 'model.sock'), models=[model_name], max_wait=0.5) as server:
+        client = adam.model.ModelClient(server.address)
+        masks = [None] * len(images)
+
+        def infer(i):
+            masks[i] = client.infer(images[i], model_name=model_name)
+        threads = [threading.Thread(target=infer, args=(i,)) for i in range(len(images))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for mask, expect in zip(masks, expected):
+            np.testing.assert_array_equal(mask, expect)
+        # The concurrent requests share forward passes, and each mask is the same as when the
+        # image is run alone
+        stats = client.health()
+        assert stats['requests'] == 4 and stats['batches'] < 4
+        np.testing.assert_array_equal(client.infer(images[0], model_name=model_name), expected[0])
+
+        # The client shim of infer_lake_breeze, with float32 images
+        rad_scan = adam.io.RadarImage()
+        rad_scan.pytorch_image = normalized
+        rad_scan = adam.model.infer_lake_breeze(rad_scan, model_name=model_name, server=server.address)
+        np.testing.assert_array_equal(rad_scan.lakebreeze_mask, expected[0][0])
+        assert rad_scan.lakebreeze_mask.dtype == expected[0].dtype
+
+        with pytest.raises(ValueError):
+            client.infer(images[0], model_name='not_a_model')
+        with pytest.raises(ValueError):
+            client.infer(images[0, :, :, :128])
+    assert not (tmp_path / 'model.sock').exists()
+
+    with adam.model.ModelServer(('127.0.0.1', 0)) as server:
+        assert server.address.startswith('http://')
+        rad_scan = adam.model.infer_lake_breeze_batch([rad_scan], model_name=model_name, server=server.address)
+        np.testing.assert_array_equal(rad_scan[0].lakebreeze_mask, expected[0][0])
+
+
+def test_model_server_address_in_use(tmp_path):
+    import socket
+
+    # A socket left behind by a server that did not shut down is replaced
+    address = str(tmp_path / 'model.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(address)
+    stale.close()
+    with adam.model.ModelServer(address) as server:
+        assert adam.model.ModelClient(address).health()['requests'] == 0
+        # A socket of a running server is not
+        with pytest.raises(OSError, match='already in use'):
+            adam.model.ModelServer(address)
+        assert adam.model.ModelClient(address).health()['requests'] == 0
+
+    # Neither is a file that is not a socket
+    other = tmp_path / 'notes.txt'
+    other.write_text('keep me')
+    with pytest.raises(OSError, match='already in use'):
+        adam.model.ModelServer(str(other))
+    assert other.read_text() == 'keep me'
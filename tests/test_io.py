@@ -5,8 +5,80 @@ import numpy as np
 
 
 def test_preprocess_radar_image():
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     assert rad_scan.pytorch_image.shape == torch.Size([1, 3, 256, 256])
     assert rad_scan.pyart_object.fields['reflectivity']['data'].shape == (6480, 1832)
     np.testing.assert_almost_equal(rad_scan.pytorch_image.numpy().sum(), 150341140.0, decimal=-4)
+
+
+def test_radar_sites():
+    site = adam.io.get_site('klot')
+    assert site.radar == 'KLOT'
+    assert site.lat_range == (41.1280, 42.5680)
+    assert 'atmos_lidar' in site.instruments
+    for radar in ['KMKX', 'KGRR', 'KIWX']:
+        assert radar in adam.io.RADAR_SITES
+    with pytest.raises(ValueError):
+        adam.io.get_site('KXXX')
+
+
+def test_preprocess_radar_sites():
+    rad_scans = adam.io.preprocess_radar_sites(['KLOT', 'KMKX'], '2025-07-15T18:00:00')
+    assert list(rad_scans.keys()) == ['KLOT', 'KMKX']
+    for radar, rad_scan in rad_scans.items():
+        assert rad_scan.pytorch_image.shape == torch.Size([1, 3, 256, 256])
+        assert rad_scan.lat_range == adam.io.RADAR_SITES[radar].lat_range
+    assert rad_scans['KMKX'].pyart_object.metadata['instrument_name'] == 'KMKX'
+
+
+def test_preprocess_radar_image_batch_shared_memory():
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for minute in [0, 5, 10]:
+            volume = adam.testing.make_level2_volume(start_time=f'2025-07-15T18:{minute:02d}:00',
+                                                     elevations=(0.5,))
+            with open(os.path.join(tmpdir, f'KLOT20250715_18{minute:02d}00_V06'), 'wb') as f:
+                f.write(volume)
+        serial = adam.io.preprocess_radar_image_batch(f"{tmpdir}/KLOT*", parallel=False)
+        parallel = adam.io.preprocess_radar_image_batch(f"{tmpdir}/KLOT*", parallel=True)
+    assert parallel.pytorch_image.shape == torch.Size([3, 3, 256, 256])
+    torch.testing.assert_close(parallel.pytorch_image, serial.pytorch_image)
+    assert list(parallel.times) == list(serial.times)
+    if os.path.isdir('/dev/shm'):
+        assert len([x for x in os.listdir('/dev/shm') if x.startswith('adam_batch_')]) == 0
+
+
+def test_source_key(tmp_path):
+    url = 's3://unidata-nexrad-level2/2025/07/15/KLOT/KLOT20250715_180000_V06'
+    assert adam.io.source_key(url) == url
+    volume = adam.testing.make_radar_volume()
+    path = adam.testing.write_radar_volume(volume, str(tmp_path / 'KLOT20250715_180000_V06'))
+    key = adam.io.source_key(path)
+    assert key.startswith('blake2b:') and key == adam.io.source_key(path)
+    other = adam.testing.make_radar_volume(reflectivity=adam.testing.fine_line_echo(distance=30000.))
+    assert adam.io.source_key(volume) == adam.io.source_key(adam.testing.make_radar_volume())
+    assert adam.io.source_key(volume) != adam.io.source_key(other)
+
+    # Paths are read directly instead of being looked up in the archive
+    rad_scan = adam.io.preprocess_radar_image(path)
+    assert rad_scan.times == [np.datetime64('2025-07-15T18:00:00')]
+    assert rad_scan.source is None
+
+
+def test_preprocess_radar_image_uint8(tmp_path):
+    for minute in [0, 5]:
+        volume = adam.testing.make_level2_volume(start_time=f'2025-07-15T18:{minute:02d}:00', elevations=(0.5,))
+        with open(tmp_path / f'KLOT20250715_18{minute:02d}00_V06', 'wb') as f:
+            f.write(volume)
+    normalized = adam.io.preprocess_radar_image_batch(f"{tmp_path}/KLOT*", parallel=False)
+    images = adam.io.preprocess_radar_image_batch(f"{tmp_path}/KLOT*", parallel=True, dtype='uint8')
+    assert images.pytorch_image.dtype == torch.uint8
+    assert images.pytorch_image.shape == torch.Size([2, 3, 256, 256])
+    assert images.pytorch_image.nbytes * 4 == normalized.pytorch_image.nbytes
+    # Normalizing in the model gives exactly the preprocessed float32 images
+    assert torch.equal(adam.model.ImageNormalization()(images.pytorch_image), normalized.pytorch_image)
+    assert torch.equal(adam.model.ImageNormalization()(normalized.pytorch_image), normalized.pytorch_image)
+
+    with pytest.raises(ValueError):
+        adam.io.preprocess_radar_image(str(tmp_path / 'KLOT20250715_180000_V06'), dtype='float16')
@@ -0,0 +1,123 @@
+import os
+import adam
+import tempfile
+import urllib.request
+import numpy as np
+
+
+def test_metrics_registry():
+    registry = adam.metrics.MetricsRegistry()
+    with registry.span('forward'):
+        pass
+    registry.inc('uploads')
+    assert registry.snapshot() == dict(stages={}, counters={}, gauges={})
+
+    registry.enabled = True
+    for _ in range(3):
+        with registry.span('forward', model='fcn'):
+            pass
+    registry.observe('scan_latency', 42.)
+    registry.inc('triggers', status='triggered')
+    registry.inc('triggers', 2, status='triggered')
+    snapshot = registry.snapshot()
+    assert snapshot['stages']['forward{model="fcn"}']['count'] == 3
+    assert snapshot['stages']['scan_latency']['total'] == 42.
+    assert snapshot['counters']['triggers{status="triggered"}'] == 3
+
+    text = registry.to_prometheus()
+    assert 'adam_stage_seconds_bucket{stage="scan_latency",le="30.0"} 0' in text
+    assert 'adam_stage_seconds_bucket{stage="scan_latency",le="60.0"} 1' in text
+    assert 'adam_stage_seconds_bucket{stage="forward",model="fcn",le="+Inf"} 3' in text
+    assert 'adam_stage_seconds_count{stage="forward",model="fcn"} 3' in text
+    assert 'adam_triggers_total{status="triggered"} 3' in text
+    assert 'adam_process_peak_rss_bytes ' in text
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'adam.prom')
+        registry.write_prometheus(path)
+        with open(path) as f:
+            assert 'adam_triggers_total' in f.read()
+
+    url = registry.serve(port=0)
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert 'adam_stage_seconds_sum{stage="forward",model="fcn"}' in response.read().decode()
+    finally:
+        registry.stop_serving()
+
+
+def test_metrics_stages():
+    adam.metrics.METRICS.reset()
+    mask = np.zeros((20, 20), dtype=int)
+    mask[5:10, 5:10] = 1
+    adam.util.filter_speckles(mask.copy(), 20)
+    assert adam.metrics.METRICS.snapshot()['stages'] == {}
+    with adam.metrics.enabled():
+        adam.util.filter_speckles(mask.copy(), 20)
+    adam.util.filter_speckles(mask.copy(), 20)
+    assert adam.metrics.METRICS.snapshot()['stages']['speckle_filter']['count'] == 1
+    adam.metrics.METRICS.reset()
+
+
+def test_profile():
+    import torch
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.ReLU())
+    mask = np.zeros((50, 50), dtype=int)
+    mask[:10, :10] = 1
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with adam.profile(tmpdir) as profiler:
+            with adam.metrics.span('forward'):
+                with torch.no_grad():
+                    model(torch.randn(2, 3, 32, 32))
+                buffers = [np.ones(1000) for _ in range(1000)]
+            adam.util.filter_speckles(mask, 20)
+        assert not adam.metrics.METRICS.enabled
+        assert profiler.stages['forward']['calls'] == 1
+        assert profiler.stages['forward']['memory_peak'] >= 8000000
+        assert profiler.stages['speckle_filter']['calls'] == 1
+        for name in ['stacks.folded', 'forward.prof', 'speckle_filter.prof', 'all.prof', 'memory.txt',
+                     'summary.json', 'torch_trace.json', 'torch_ops.txt']:
+            assert os.path.exists(os.path.join(tmpdir, name)), name
+        with open(os.path.join(tmpdir, 'torch_trace.json')) as f:
+            assert '"forward"' in f.read()
+        with open(os.path.join(tmpdir, 'memory.txt')) as f:
+            assert 'forward' in f.read()
+        del buffers
+    adam.metrics.METRICS.reset()
+
+
+def test_profile_concurrent_spans():
+    import threading
+    registry = adam.metrics.MetricsRegistry(enabled=True)
+    stop = threading.Event()
+
+    def work():
+        while not stop.is_set():
+            with registry.span('worker'):
+                with registry.span('inner'):
+                    pass
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Spans that started before the profiler, in this thread and in the workers, and spans
+        # that end after it stopped do not break it
+        outer = registry.span('before')
+        outer.__enter__()
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for i in range(5):
+            profiler = adam.metrics.Profiler(os.path.join(tmpdir, str(i)), python=None, torch=False,
+                                             memory=False, registry=registry)
+            with profiler:
+                with registry.span('main'):
+                    late = registry.span('late')
+                    late.__enter__()
+            late.__exit__(None, None, None)
+            assert profiler.stages['main']['calls'] == 1
+            assert 'before' not in profiler.stages and 'late' not in profiler.stages
+        outer.__exit__(None, None, None)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert registry.profilers == ()
+    assert registry.snapshot()['stages']['before']['count'] == 1
@@ -0,0 +1,30 @@
+import io
+import os
+import tempfile
+import urllib.request
+import numpy as np
+import pyart
+import adam
+
+
+def test_read_nexrad_sweep0():
+    volume = adam.testing.make_level2_volume(elevations=(0.5, 0.9, 1.3, 1.8, 2.4, 3.1))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        key = '2025/07/15/KLOT/KLOT20250715_180000_V06'
+        os.makedirs(os.path.join(tmpdir, os.path.dirname(key)))
+        with open(os.path.join(tmpdir, key), 'wb') as f:
+            f.write(volume)
+        with adam.testing.LocalRangeServer(tmpdir) as server:
+            radar, stats = adam.io.read_nexrad_sweep0(f"{server.url}/{key}", block_size=4096,
+                                                      return_stats=True)
+            assert stats['complete']
+            assert stats['bytes_transferred'] == server.bytes_sent
+            assert stats['bytes_transferred'] < len(volume) / 3
+
+            with urllib.request.urlopen(f"{server.url}/{key}") as response:
+                full_radar = pyart.io.read_nexrad_archive(io.BytesIO(response.read()))
+    assert radar.nsweeps == 1
+    np.testing.assert_array_equal(radar.azimuth['data'], full_radar.get_azimuth(0))
+    np.testing.assert_array_equal(
+        radar.fields['reflectivity']['data'], full_radar.get_field(0, 'reflectivity'))
+    assert radar.time['units'] == full_radar.time['units']
@@ -0,0 +1,139 @@
+import os
+import json
+import adam
+import pytest
+import tempfile
+import torch
+
+from datetime import datetime, timedelta, timezone
+
+
+class _FailingSource:
+    def __init__(self):
+        self.polls = 0
+
+    def poll(self):
+        self.polls += 1
+        if self.polls == 1:
+            raise ConnectionError("S3 is unreachable")
+        return ["bad_scan"]
+
+    def read(self, path):
+        raise OSError(f"Cannot read {path}")
+
+
+class _VolumeSource:
+    def __init__(self, volumes):
+        self.volumes = volumes
+        self.polled = False
+
+    def poll(self):
+        if self.polled:
+            return []
+        self.polled = True
+        return list(self.volumes)
+
+    def read(self, path):
+        return self.volumes[path]
+
+
+@pytest.fixture
+def lake_breeze_weights(tmp_path, monkeypatch):
+    # Serve weights files of the model architectures with random weights, and a classifier that
+    # marks every pixel as lake breeze, so that the monitor triggers without the trained models
+    from safetensors.torch import save_model
+    from adam.model import predict_lake_breeze
+
+    def download(repo_id, filename):
+        path = tmp_path / filename
+        if not path.exists():
+            torch.manual_seed(0)
+            model = predict_lake_breeze._build_model(filename[:-len('.safetensors')])
+            last_layer = model.network.classifier[-1]
+            with torch.no_grad():
+                last_layer.weight.zero_()
+                last_layer.bias.copy_(torch.tensor([-10., 10.]))
+            save_model(model.network, str(path))
+        return str(path)
+    monkeypatch.setattr(predict_lake_breeze, 'hf_hub_download', download)
+    predict_lake_breeze._load_model.cache_clear()
+    yield
+    predict_lake_breeze._load_model.cache_clear()
+
+
+def test_directory_scan_source():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in ['KLOT20250715_175500_V06', 'KLOT20250715_180000_V06']:
+            open(os.path.join(tmpdir, name), 'w').close()
+        source = adam.realtime.DirectoryScanSource(tmpdir)
+        assert source.poll() == [os.path.join(tmpdir, 'KLOT20250715_180000_V06')]
+        assert source.poll() == []
+        open(os.path.join(tmpdir, 'KLOT20250715_180500_V06'), 'w').close()
+        assert source.poll() == [os.path.join(tmpdir, 'KLOT20250715_180500_V06')]
+
+        source = adam.realtime.DirectoryScanSource(tmpdir, backfill=True)
+        assert len(source.poll()) == 3
+
+
+def test_monitor_survives_failures():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        status_file = os.path.join(tmpdir, 'status.json')
+        monitor = adam.realtime.LakeBreezeMonitor(_FailingSource(), poll_interval=0, status_file=status_file)
+        monitor.run_once()
+        monitor.run_once()
+        status = monitor.status()
+        assert status['scans_failed'] == 2
+        assert status['scans_processed'] == 0
+        assert status['consecutive_failures'] == 2
+        assert status['healthy'] is True
+        assert "bad_scan" in status['last_error']
+        assert os.path.exists(status_file)
+
+
+def test_monitor_process_scan(lake_breeze_weights):
+    from adam.testing import FakeSSHClient, make_radar_volume
+    adam.metrics.METRICS.reset()
+    site = adam.io.get_site('KLOT')
+    recent = (datetime.now(timezone.utc) - timedelta(seconds=60)).strftime('%Y-%m-%dT%H:%M:%S')
+    source = _VolumeSource({'recent': make_radar_volume(start_time=recent),
+                            'old': make_radar_volume(start_time='2025-07-15T18:00:00')})
+    lidar = dict(name='halo', host='lidar', username='user', password='pwd', elevations=[0, 5],
+                 lat=sum(site.lat_range) / 2, lon=sum(site.lon_range) / 2, out_file_name='test_monitor.txt')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        status_file = os.path.join(tmpdir, 'status.json')
+        metrics_file = os.path.join(tmpdir, 'metrics.prom')
+        monitor = adam.realtime.LakeBreezeMonitor(
+            source, site=site, lidars=[lidar], latency_budget=3600., poll_interval=0,
+            status_file=status_file, metrics_file=metrics_file, client_factory=FakeSSHClient)
+        try:
+            results = monitor.run_once()
+            # The scan is made into a lidar scan and uploaded
+            assert [result['triggered'] for result in results] == [{'halo': True}] * 2
+            assert monitor.pool.connected() == [('lidar', 'user')]
+        finally:
+            monitor.close()
+        recent_latency, old_latency = [result['latency'] for result in results]
+        assert 30 < recent_latency < 3600
+        assert old_latency > 3600
+
+        # Only the old scan is over the latency budget
+        status = monitor.status()
+        assert status['scans_processed'] == 2 and status['scans_failed'] == 0
+        assert status['triggers'] == 2
+        assert status['budget_exceeded'] == 1
+        assert status['last_scan'] == 'old' and status['last_latency'] == old_latency
+        assert status['max_latency'] == old_latency
+        assert status['last_error'] is None
+
+        with open(status_file) as f:
+            written = json.load(f)
+        assert written['scans_processed'] == 2 and written['budget_exceeded'] == 1
+        assert written['lidars_connected'] == ['halo']
+        with open(metrics_file) as f:
+            text = f.read()
+        for stage in ['fetch', 'preprocess', 'inference', 'dispatch', 'scan_latency']:
+            assert f'adam_stage_seconds_count{{stage="{stage}"' in text, stage
+        assert 'adam_budget_exceeded_total 1\n' in text
+        assert 'adam_triggers_total{status="triggered"} 2\n' in text
+    adam.metrics.METRICS.enabled = False
+    adam.metrics.METRICS.reset()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pyart
+import adam
+
+
+def test_make_radar_volume():
+    echo = adam.testing.combine_echoes(
+        adam.testing.clear_air_echo(),
+        adam.testing.fine_line_echo(distance=20000., normal_azimuth=90.),
+        adam.testing.cell_echo(50000., 180., reflectivity=50.))
+    radar = adam.testing.make_radar_volume(elevations=(0.5, 1.5), reflectivity=echo)
+    assert radar.nsweeps == 2
+    assert radar.nrays == 720
+    assert radar.latitude['data'][0] == adam.testing.synthetic_radar.RADAR_LOCATIONS['KLOT'][0]
+    data = radar.get_field(0, 'reflectivity')
+    azimuths = radar.get_azimuth(0)
+    ranges = radar.range['data']
+    # The fine line is 20 km due east, so it crosses the 90 degree ray at 20 km
+    east = np.argmin(np.abs(azimuths - 90.))
+    gate = np.argmin(np.abs(ranges - 20000.))
+    assert data[east, gate] == 20.
+    south = np.argmin(np.abs(azimuths - 180.))
+    gate = np.argmin(np.abs(ranges - 50000.))
+    assert data[south, gate] > 45.
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        level2 = adam.testing.write_radar_volume(radar, os.path.join(tmpdir, 'KLOT20250715_180000_V06'))
+        cfradial = adam.testing.write_radar_volume(radar, os.path.join(tmpdir, 'volume.nc'), format='cfradial')
+        # Level II stores the reflectivity in 0.5 dBZ steps from -32 dBZ
+        expected = radar.fields['reflectivity']['data']
+        for path, expected, atol in [(level2, np.clip(expected, -32, None), 0.26), (cfradial, expected, 1e-5)]:
+            read = pyart.io.read(path)
+            assert read.nsweeps == 2
+            assert read.time['units'] == radar.time['units']
+            np.testing.assert_allclose(read.fields['reflectivity']['data'], expected, atol=atol)
+
+
+def test_local_s3_server():
+    import boto3
+    from botocore import UNSIGNED
+    from botocore.config import Config
+    with tempfile.TemporaryDirectory() as tmpdir:
+        keys = adam.testing.write_synthetic_archive(tmpdir, n_volumes=3)
+        assert keys[1] == adam.testing.nexrad_key('KLOT', '2025-07-15T18:05:00')
+        with adam.testing.LocalS3Server(tmpdir, latency=0.05) as server, server.endpoint():
+            s3 = boto3.session.Session().client('s3', config=Config(signature_version=UNSIGNED))
+            response = s3.list_objects_v2(Bucket='unidata-nexrad-level2', Prefix='2025/07/15/KLOT', MaxKeys=2)
+            assert [x['Key'] for x in response['Contents']] == keys[:2]
+            assert response['IsTruncated']
+            paginator = s3.get_paginator('list_objects_v2')
+            pages = list(paginator.paginate(Bucket='unidata-nexrad-level2', Prefix='2025/07/15/KLOT',
+                                            PaginationConfig={'PageSize': 1}))
+            assert [page['Contents'][0]['Key'] for page in pages] == keys
+            start = time.perf_counter()
+            assert s3.get_object(Bucket='unidata-nexrad-level2', Key=keys[0])['Body'].read()[:4] == b'AR2V'
+            assert time.perf_counter() - start >= 0.05
+
+            rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:06:00')
+            assert rad_scan.times[0] == np.datetime64('2025-07-15T18:05:00')
+            assert rad_scan.pytorch_image.shape == (1, 3, 256, 256)
+        assert 'AWS_ENDPOINT_URL_S3' not in os.environ
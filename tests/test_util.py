@@ -1,10 +1,8 @@
 import pytest 
 import adam
-import torch
 import numpy as np
 
 def test_instrument_steering():
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-04-24T20:03:23')
     rad_scan = adam.model.infer_lake_breeze(
         rad_scan, model_name='lakebreeze_model_fcn_resnet50_no_augmentation')
@@ -12,4 +10,164 @@ def test_instrument_steering():
     np.testing.assert_almost_equal(angle, 224.61, decimal=0)
     np.testing.assert_almost_equal(lat, 41.68, decimal=2)
     np.testing.assert_almost_equal(lon, -88.01, decimal=2)
-    np.testing.assert_almost_equal(dist, 0, decimal=2)
\ No newline at end of file
+    np.testing.assert_almost_equal(dist, 0, decimal=2)
+
+def _synthetic_radar_image(masks):
+    from adam.io.get_radar_scan import _latlon_to_xy
+    rad_image = adam.io.RadarImage()
+    rad_image.lat_range = (41.1280, 42.5680)
+    rad_image.lon_range = (-88.7176, -87.2873)
+    rad_image.grid_lat = np.linspace(rad_image.lat_range[1], rad_image.lat_range[0], 256)
+    rad_image.grid_lon = np.linspace(rad_image.lon_range[0], rad_image.lon_range[1], 256)
+    rad_image.grid_x, rad_image.grid_y = _latlon_to_xy(
+        rad_image.grid_lat, rad_image.grid_lon, 41.848, -88.00245)
+    rad_image.lakebreeze_mask = masks
+    rad_image.times = np.array(['2025-07-15T18:00:00'] * len(masks), dtype='datetime64[s]')
+    return rad_image
+
+
+def test_azimuth_point_batch():
+    masks = np.zeros((4, 256, 256), dtype=np.int64)
+    masks[0, 100:120, 100:120] = 1
+    masks[1, 150:170, 150:170] = 1
+    # A lake breeze with a speckle next to it, and a frame with only a speckle
+    masks[2, 30:60, 180:200] = 1
+    masks[2, 200:203, 20:23] = 1
+    masks[3, 10:13, 10:13] = 1
+    rad_image = _synthetic_radar_image(masks)
+    angles, lats, lons, dists = adam.util.azimuth_point_batch(-87.99577278662817, 41.70101404798476, rad_image)
+    assert angles.shape == (4,)
+    for i in range(3):
+        frame = _synthetic_radar_image(masks[i])
+        angle, lat, lon, dist = adam.util.azimuth_point(-87.99577278662817, 41.70101404798476, frame)
+        np.testing.assert_almost_equal(angles[i], angle)
+        np.testing.assert_almost_equal(lats[i], lat)
+        np.testing.assert_almost_equal(lons[i], lon)
+        np.testing.assert_almost_equal(dists[i], dist)
+    assert np.all(np.isnan([angles[3], lats[3], lons[3], dists[3]]))
+    # The speckle does not pull the center, and neither function changes the masks
+    speckle_free = masks[2].copy()
+    speckle_free[200:203, 20:23] = 0
+    np.testing.assert_allclose(adam.util.azimuth_point(-87.99577278662817, 41.70101404798476,
+                                                       _synthetic_radar_image(speckle_free)),
+                               [angles[2], lats[2], lons[2], dists[2]])
+    assert masks[2].sum() == 30 * 20 + 9 and rad_image.lakebreeze_mask[3].sum() == 9
+    # A threshold above the area of the lake breeze removes it too
+    angles, _, _, _ = adam.util.azimuth_point_batch(-87.99577278662817, 41.70101404798476, rad_image,
+                                                    area_threshold=1000)
+    assert np.all(np.isnan(angles))
+
+
+def test_instrument_registry(tmp_path):
+    rad_image = _synthetic_radar_image(np.zeros((1, 256, 256), dtype=np.int64))
+    registry = adam.util.InstrumentRegistry(cache_dir=str(tmp_path))
+    registry.register('atmos_lidar', -87.99577278662817, 41.70101404798476)
+    geometry = registry.geometry('atmos_lidar', rad_image)
+    assert registry.geometry((-87.99577278662817, 41.70101404798476), rad_image) is geometry
+    assert geometry.distance.shape == (256, 256)
+    assert geometry.distance[geometry.lat_index, geometry.lon_index] == 0
+    x, y = np.meshgrid(rad_image.grid_x, rad_image.grid_y)
+    np.testing.assert_array_equal(geometry.distance, np.sqrt((x - geometry.x)**2 + (y - geometry.y)**2))
+    # A new registry memory-maps the rasters saved by the first one
+    reloaded = adam.util.InstrumentRegistry(cache_dir=str(tmp_path)).geometry(
+        (-87.99577278662817, 41.70101404798476), rad_image)
+    assert isinstance(reloaded.bearing, np.memmap)
+    np.testing.assert_array_equal(reloaded.bearing, geometry.bearing)
+    assert (reloaded.lat_index, reloaded.lon_index) == (geometry.lat_index, geometry.lon_index)
+
+
+def test_steering_engine():
+    masks = np.zeros((2, 256, 256), dtype=np.int64)
+    masks[0, 100:120, 100:120] = 1
+    masks[0, 200:230, 30:60] = 1
+    masks[0, 10:13, 10:13] = 1  # A speckle that is filtered out
+    rad_image = _synthetic_radar_image(masks)
+    lons = np.array([-87.99577278662817, -87.5, -88.5])
+    lats = np.array([41.70101404798476, 42.3, 41.3])
+    engine = adam.util.SteeringEngine(rad_image, index=0)
+    solution = engine.query(lons, lats, extent_range=20000.)
+    assert solution['distance'].shape == (3,)
+
+    # Brute force over every pixel gives the same nearest distance and azimuth
+    filtered = adam.util.filter_speckles(masks[0].T.copy())
+    for i in range(3):
+        geometry = adam.util.InstrumentRegistry().geometry((lons[i], lats[i]), rad_image)
+        dist = np.where(filtered == 1, geometry.distance, np.inf)
+        np.testing.assert_allclose(solution['distance'][i], dist.min())
+        nearest = np.unravel_index(np.argmin(dist), dist.shape)
+        np.testing.assert_allclose(solution['nearest_azimuth'][i], geometry.bearing[nearest])
+    assert np.all(np.nanmax(solution['extent_width']) <= 360)
+
+    empty = adam.util.SteeringEngine(rad_image, index=1).query(lons, lats)
+    assert np.all(np.isnan(empty['distance']))
+
+
+def test_angular_extent():
+    start, end, width = adam.util.angular_extent([350., 10., 0.])
+    assert (start, end, width) == (350., 10., 20.)
+    start, end, width = adam.util.angular_extent([90., 120.])
+    assert (start, end, width) == (90., 120., 30.)
+
+
+def test_extract_front_lines():
+    masks = np.zeros((3, 256, 256), dtype=np.int64)
+    lat_index, lon_index = np.mgrid[0:256, 0:256]
+    for i in range(2):
+        band = np.abs(lon_index - (60 + 10 * i + 20 * np.sin(lat_index / 40.))) < 3
+        masks[i][band.T] = 1
+    rad_image = _synthetic_radar_image(masks)
+    front_lines = adam.util.extract_front_lines(rad_image, tolerance=1.)
+    assert len(front_lines) == 3
+    assert len(front_lines[2]) == 0
+    assert front_lines[2].bbox is None
+    for frame in front_lines[:2]:
+        assert len(frame) == 1
+        lat_min, lat_max, lon_min, lon_max = frame.bbox
+        assert lat_max - lat_min > 1.3
+        assert lon_max - lon_min < 0.3
+        data = adam.util.encode_front_lines(frame)
+        assert len(data) < 300
+        decoded = adam.util.decode_front_lines(data)
+        assert decoded.time == frame.time
+        for expected, polyline in zip(frame.polylines, decoded.polylines):
+            np.testing.assert_allclose(polyline, expected)
+
+
+def test_skeletonize():
+    square = np.zeros((40, 40), dtype=bool)
+    square[5:35, 5:35] = True
+    square[8:32, 8:32] = False
+    skeleton = adam.util.skeletonize(square)
+    assert skeleton.sum() < square.sum()
+    assert not skeleton[:5].any() and not skeleton[35:].any()
+
+
+def test_front_tracker():
+    masks = np.zeros((4, 256, 256), dtype=np.int64)
+    for i in range(4):
+        masks[i, 60 + 4 * i:70 + 4 * i, 50:200] = 1
+    rad_image = _synthetic_radar_image(masks)
+    rad_image.times = np.datetime64('2025-07-15T18:00:00') + np.arange(4) * np.timedelta64(300, 's')
+    tracker = adam.util.FrontTracker()
+    for i in range(3):
+        tracks = tracker.update(rad_image, index=i)
+    assert len(tracks) == 1
+    assert tracks[0].age == 3
+    assert tracks[0].u > 0
+    assert abs(tracks[0].v) < abs(tracks[0].u) / 10
+
+    # The mask predicted 5 minutes ahead matches the next frame
+    np.testing.assert_array_equal(tracker.predict_mask(300), masks[3])
+    prediction = tracker.predict(300)[0]
+    np.testing.assert_allclose(prediction['lon'], rad_image.grid_lon[round(64.5 + 4 * 3)], atol=0.01)
+
+    lon, lat = rad_image.grid_lon[120], rad_image.grid_lat[128]
+    expected = adam.util.azimuth_point(lon, lat, _synthetic_radar_image(masks[3].copy()))
+    predicted = adam.util.azimuth_point(lon, lat, rad_image, tracker=tracker, lead_time=300)
+    np.testing.assert_allclose(predicted, expected)
+    predicted = adam.util.azimuth_point_batch(lon, lat, rad_image, tracker=tracker, lead_time=300)
+    np.testing.assert_allclose([x[-1] for x in predicted], expected)
+    np.testing.assert_allclose([x[0] for x in predicted], adam.util.azimuth_point(lon, lat, rad_image, index=0))
+
+    with pytest.raises(ValueError):
+        tracker.update(rad_image, index=1)
@@ -1,3 +1,4 @@
+import os
 import pytest
 import adam
 import torch
@@ -6,7 +7,6 @@ import matplotlib.pyplot as plt
 
 @pytest.mark.mpl_image_compare(tolerance=50)
 def test_visualize_lake_breeze():
-    torch.manual_seed(42)
     rad_scan = adam.io.preprocess_radar_image('KLOT', '2025-07-15T18:00:00')
     rad_scan = adam.model.infer_lake_breeze(
         rad_scan, model_name='lakebreeze_best_model_fcn_resnet50')
@@ -14,4 +14,88 @@ def test_visualize_lake_breeze():
     fig, ax = adam.vis.visualize_lake_breeze(rad_scan, bg_field='reflectivity')
     assert fig is not None
     assert ax is not None
-    return fig 
\ No newline at end of file
+    return fig 
+
+def _animation_image(tmp_path, n_frames=3):
+    from adam.io.get_radar_scan import _latlon_to_xy
+    paths = []
+    for i in range(n_frames):
+        path = str(tmp_path / f'KLOT{i}.ar2v')
+        with open(path, 'wb') as f:
+            f.write(adam.testing.make_level2_volume(start_time=f'2025-07-15T18:{i:02d}:00', elevations=(0.5,)))
+        paths.append(path)
+    rad_image = adam.io.RadarImage()
+    rad_image.lat_range = (41.1280, 42.5680)
+    rad_image.lon_range = (-88.7176, -87.2873)
+    rad_image.grid_lat = np.linspace(rad_image.lat_range[1], rad_image.lat_range[0], 256)
+    rad_image.grid_lon = np.linspace(rad_image.lon_range[0], rad_image.lon_range[1], 256)
+    rad_image.grid_x, rad_image.grid_y = _latlon_to_xy(
+        rad_image.grid_lat, rad_image.grid_lon, 41.848, -88.00245)
+    masks = np.zeros((n_frames, 256, 256), dtype=np.int64)
+    for i in range(n_frames):
+        masks[i, 100 + 10 * i:130 + 10 * i, 50:200] = 1
+    rad_image.lakebreeze_mask = masks
+    rad_image.pyart_object = paths
+    rad_image.times = np.array([f'2025-07-15T18:{i:02d}:00' for i in range(n_frames)], dtype='datetime64[s]')
+    return rad_image
+
+
+def test_grid_radar_field():
+    import pyart
+    import io
+    volume = adam.testing.make_level2_volume(elevations=(0.5,))
+    radar = pyart.io.read_nexrad_archive(io.BytesIO(volume))
+    grid_lat = np.linspace(42.5680, 41.1280, 256)
+    grid_lon = np.linspace(-88.7176, -87.2873, 256)
+    data = adam.vis.grid_radar_field(radar, grid_lat, grid_lon)
+    assert data.shape == (256, 256)
+    # The default reflectivity increases with range, about 1 dBZ per 5 km
+    col = np.argmin(np.abs(grid_lon - radar.longitude['data'][0]))
+    near = np.argmin(np.abs(grid_lat - (radar.latitude['data'][0] + 0.09)))
+    far = np.argmin(np.abs(grid_lat - (radar.latitude['data'][0] + 0.45)))
+    assert abs(data[near, col] - 2.) < 0.5
+    assert abs(data[far, col] - 10.) < 0.5
+    assert np.ma.is_masked(data[0, 0])
+
+
+def test_animate_lake_breeze(tmp_path):
+    from PIL import Image
+    rad_image = _animation_image(tmp_path)
+    gif = adam.vis.animate_lake_breeze(rad_image, str(tmp_path / 'lake_breeze.gif'), n_jobs=1,
+                                       features=False, dpi=50)
+    with Image.open(gif) as image:
+        assert image.n_frames == 3
+    frame_dir = adam.vis.animate_lake_breeze(rad_image, str(tmp_path / 'frames'), n_jobs=2,
+                                             features=False, dpi=50)
+    assert sorted(os.listdir(frame_dir)) == ['frame_00000.png', 'frame_00001.png', 'frame_00002.png']
+
+
+def test_quick_look():
+    from PIL import Image
+    from adam.io.get_radar_scan import _latlon_to_xy
+    rad_image = adam.io.RadarImage()
+    rad_image.lat_range = (41.1280, 42.5680)
+    rad_image.lon_range = (-88.7176, -87.2873)
+    rad_image.grid_lat = np.linspace(rad_image.lat_range[1], rad_image.lat_range[0], 256)
+    rad_image.grid_lon = np.linspace(rad_image.lon_range[0], rad_image.lon_range[1], 256)
+    rad_image.grid_x, rad_image.grid_y = _latlon_to_xy(
+        rad_image.grid_lat, rad_image.grid_lon, 41.848, -88.00245)
+    # Two frames with the same image and time, with and without a lake breeze
+    rad_image.pytorch_image = torch.randn(1, 3, 256, 256).repeat(2, 1, 1, 1)
+    masks = np.zeros((2, 256, 256), dtype=np.int64)
+    masks[1, 100:140, 50:200] = 1
+    rad_image.lakebreeze_mask = masks
+    rad_image.times = np.array(['2025-07-15T18:00:00'] * 2, dtype='datetime64[s]')
+
+    renderer = adam.vis.QuickLookRenderer()
+    empty = renderer.render(rad_image, index=0)
+    with_mask = renderer.render(rad_image, index=1)
+    assert empty.shape == (300, 300, 4)
+    assert np.array_equal(empty, renderer.render(rad_image, index=0))
+    assert not np.array_equal(empty, with_mask)
+    buffer = renderer.to_png(rad_image)
+    with Image.open(buffer) as image:
+        assert image.size == (300, 300)
+    field = np.full((256, 256), 30.)
+    buffer = adam.vis.quick_look(rad_image, field=field)
+    assert buffer.read(8) == b'\x89PNG\r\n\x1a\n'